@@ -3,7 +3,6 @@ Main application routes
 """
 from flask import render_template, request, redirect, url_for, flash
 from flask_login import login_user, logout_user, login_required, current_user
-from datetime import datetime, timedelta
 
 def register_main_routes(app, db):
     """Register main application routes"""
@@ -42,19 +41,13 @@ def register_main_routes(app, db):
     @app.route('/dashboard')
     @login_required
     def dashboard():
-        from models import Medicine, Sale, get_expiring_medicines, get_low_stock_medicines
+        from summary_service import summary_service
         
-        # Get dashboard statistics
-        total_medicines = Medicine.query.count()
-        expiring_soon = len(get_expiring_medicines())
-        low_stock = len(get_low_stock_medicines())
-        
-        # Get recent sales (last 7 days)
-        week_ago = datetime.now() - timedelta(days=7)
-        recent_sales = Sale.query.filter(Sale.created_at >= week_ago).count()
+        # Statistik dashboard dari summary service (satu query, di-cache singkat)
+        summary = summary_service.get_summary()
         
         return render_template('dashboard.html', 
-                             total_medicines=total_medicines,
-                             expiring_soon=expiring_soon,
-                             low_stock=low_stock,
-                             recent_sales=recent_sales)
\ No newline at end of file
+                             total_medicines=summary['total_medicines'],
+                             expiring_soon=summary['expiring_soon'],
+                             low_stock=summary['low_stock'],
+                             recent_sales=summary['recent_sales'])
\ No newline at end of file
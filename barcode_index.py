@@ -0,0 +1,189 @@
+"""
+Indeks barcode in-memory untuk scan barcode di kasir (POS)
+"""
+import threading
+import time
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+from database import db
+
+# Penanda di session.info bahwa seluruh indeks perlu dibangun ulang
+REBUILD_ALL = 'all'
+
+class BarcodeIndex:
+    """Peta barcode_id dan barcode legacy ke data obat (termasuk stok) yang dipakai kasir.
+
+    Indeks dibangun saat aplikasi start. Obat yang berubah di proses ini
+    (objek Medicine yang di-flush, atau stok yang diubah lewat UPDATE bulk dan
+    dicatat dengan mark_changed) diperbarui per obat setelah commit, sehingga
+    lookup tidak pernah menyentuh database. Perubahan dari worker lain
+    terbaca saat refresh_if_stale() membangun ulang indeks yang lebih tua
+    dari max_age (dipanggil job scheduler, bukan request kasir).
+    """
+
+    def __init__(self, max_age=60):
+        self.max_age = max_age
+        self._entries = {}
+        self._codes_by_id = {}
+        self._built_at = None
+        self._stale = True
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        """Pasang listener perubahan dan bangun indeks pertama kali"""
+        event.listen(Session, 'after_flush', self._on_after_flush)
+        event.listen(Session, 'after_commit', self._on_after_commit)
+        event.listen(Session, 'after_rollback', self._on_after_rollback)
+
+        with app.app_context():
+            try:
+                self.build()
+            except Exception as e:
+                # Misal skema belum dimigrasi; dibangun oleh job cache_warmup
+                db.session.rollback()
+                print(f"Barcode index build skipped: {str(e)}")
+
+    @staticmethod
+    def normalize(code):
+        return (code or '').strip().upper()
+
+    @staticmethod
+    def _select():
+        from models import Medicine, Category
+
+        return select(
+            Medicine.id,
+            Medicine.barcode_id,
+            Medicine.barcode,
+            Medicine.name,
+            Medicine.generic_name,
+            Medicine.capacity,
+            Medicine.selling_price,
+            Medicine.stock_quantity,
+            Medicine.unit,
+            Medicine.storage_location,
+            Medicine.image_url,
+            Category.name.label('category')
+        ).outerjoin(
+            Category, Medicine.category_id == Category.id
+        ).where(Medicine.active == True)
+
+    @staticmethod
+    def _entry(row):
+        return {
+            'id': row.id,
+            'barcode_id': row.barcode_id,
+            'name': row.name,
+            'generic_name': row.generic_name,
+            'capacity': row.capacity,
+            'stock': row.stock_quantity or 0,
+            'price': float(row.selling_price),
+            'unit': row.unit,
+            'storage_location': row.storage_location,
+            'image_url': row.image_url,
+            'category': row.category
+        }
+
+    def _codes(self, row):
+        return [self.normalize(code) for code in (row.barcode_id, row.barcode) if code]
+
+    def build(self, connection=None):
+        """Bangun ulang indeks dari semua obat aktif (satu query, tanpa objek ORM)"""
+        rows = (connection or db.session).execute(self._select()).all()
+
+        entries = {}
+        codes_by_id = {}
+        for row in rows:
+            entry = self._entry(row)
+            codes_by_id[row.id] = self._codes(row)
+            for code in codes_by_id[row.id]:
+                entries[code] = entry
+
+        with self._lock:
+            self._entries = entries
+            self._codes_by_id = codes_by_id
+            self._built_at = time.monotonic()
+            self._stale = False
+        return len(entries)
+
+    def refresh(self, medicine_ids, connection):
+        """Perbarui entri beberapa obat saja; obat yang hilang/nonaktif dibuang dari indeks"""
+        from models import Medicine
+
+        medicine_ids = list(medicine_ids)
+        rows = connection.execute(self._select().where(Medicine.id.in_(medicine_ids))).all()
+
+        with self._lock:
+            for medicine_id in medicine_ids:
+                for code in self._codes_by_id.pop(medicine_id, []):
+                    self._entries.pop(code, None)
+            for row in rows:
+                entry = self._entry(row)
+                self._codes_by_id[row.id] = self._codes(row)
+                for code in self._codes_by_id[row.id]:
+                    self._entries[code] = entry
+        return len(rows)
+
+    def invalidate(self):
+        self._stale = True
+
+    def needs_rebuild(self):
+        """True jika indeks belum dibangun, ditandai basi atau lebih tua dari max_age"""
+        return (self._stale or self._built_at is None or
+                time.monotonic() - self._built_at > self.max_age)
+
+    def refresh_if_stale(self):
+        """Bangun ulang jika basi atau lebih tua dari max_age; True jika dibangun ulang"""
+        if not self.needs_rebuild():
+            return False
+        self.build()
+        return True
+
+    def lookup(self, code):
+        """Cari obat berdasarkan barcode persis, None jika tidak ditemukan (tanpa query)"""
+        return self._entries.get(self.normalize(code))
+
+    def mark_changed(self, session, medicine_ids=None):
+        """Catat obat yang diubah lewat UPDATE bulk (mis. stock_quantity).
+
+        Entri diperbarui setelah session commit; None berarti semua obat.
+        """
+        changed = session.info.setdefault('barcode_index_changed', set())
+        if medicine_ids is None:
+            changed.add(REBUILD_ALL)
+        else:
+            changed.update(medicine_ids)
+
+    # Session event handlers
+    def _on_after_flush(self, session, flush_context):
+        from models import Medicine, Category
+
+        changed = session.new | session.dirty | session.deleted
+        medicine_ids = {obj.id for obj in changed if isinstance(obj, Medicine)}
+        if any(isinstance(obj, Category) for obj in changed):
+            self.mark_changed(session)
+        elif medicine_ids:
+            self.mark_changed(session, medicine_ids)
+
+    def _on_after_commit(self, session):
+        changed = session.info.pop('barcode_index_changed', None)
+        if not changed or self._built_at is None:
+            return
+        # Session tidak bisa menjalankan SQL di after_commit, pakai koneksi terpisah
+        try:
+            with session.get_bind().connect() as connection:
+                if REBUILD_ALL in changed:
+                    self.build(connection)
+                else:
+                    self.refresh(changed, connection)
+        except Exception as e:
+            self.invalidate()
+            print(f"Barcode index refresh error: {str(e)}")
+
+    def _on_after_rollback(self, session):
+        session.info.pop('barcode_index_changed', None)
+
+# Instance global untuk digunakan di seluruh aplikasi
+barcode_index = BarcodeIndex()
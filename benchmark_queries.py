@@ -0,0 +1,233 @@
+"""
+Benchmark jumlah query dan waktu eksekusi fungsi-fungsi query di models.py
+
+Usage:
+    python benchmark_queries.py [jumlah_obat] [jumlah_pelanggan]
+
+Secara default memakai SQLite in-memory. Set BENCHMARK_DATABASE_URL untuk
+menjalankan terhadap database PostgreSQL kosong (tabel akan dibuat dan diisi).
+"""
+import os
+import sys
+import time
+import random
+from datetime import datetime, timedelta
+
+from flask import Flask
+from sqlalchemy import event, insert
+
+from database import db
+
+
+def create_benchmark_app():
+    """Buat Flask app terpisah agar benchmark tidak menyentuh database utama"""
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("BENCHMARK_DATABASE_URL", "sqlite://")
+    db.init_app(app)
+    return app
+
+
+class QueryCounter:
+    """Hitung jumlah statement SQL yang dieksekusi selama blok with"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+    def __enter__(self):
+        event.listen(self.engine, "before_cursor_execute", self._on_execute)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, "before_cursor_execute", self._on_execute)
+
+
+def seed_medicines(total_medicines, batches_per_medicine=6):
+    """Isi katalog obat dan batch secara bulk"""
+    from models import Category, Medicine, MedicineBatch, refresh_medicine_stock, refresh_expiry_buckets
+
+    category = Category(name="Benchmark")
+    db.session.add(category)
+    db.session.flush()
+
+    today = datetime.now().date()
+    medicine_rows = [{
+        "barcode_id": f"BM{i:08d}",
+        "name": f"Obat Benchmark {i}",
+        "generic_name": f"generik-{i % 500}",
+        "category_id": category.id,
+        "manufacturer": f"Pabrik {i % 50}",
+        "unit": "tablet",
+        "capacity": f"{(i % 10 + 1) * 50}mg",
+        "capacity_numeric": float((i % 10 + 1) * 50),
+        "capacity_unit": "mg",
+        "minimum_stock": 20,
+        "purchase_price": 1000,
+        "selling_price": 1500,
+        "active": True,
+        "stock_quantity": 0,
+    } for i in range(total_medicines)]
+    db.session.execute(insert(Medicine), medicine_rows)
+
+    medicine_ids = db.session.execute(db.select(Medicine.id)).scalars().all()
+    batch_rows = [{
+        "medicine_id": medicine_id,
+        "batch_number": f"B{medicine_id}-{n}",
+        "expiry_date": today + timedelta(days=random.randint(-30, 720)),
+        "quantity": random.randint(0, 15),
+        "purchase_price": 1000,
+        "received_date": today,
+    } for medicine_id in medicine_ids for n in range(batches_per_medicine)]
+    db.session.execute(insert(MedicineBatch), batch_rows)
+
+    refresh_medicine_stock()
+    refresh_expiry_buckets()
+    db.session.commit()
+
+
+def legacy_low_stock_medicines():
+    """Implementasi lama: load semua obat lalu jumlahkan batch per obat di Python"""
+    from models import Medicine
+
+    today = datetime.now().date()
+    low_stock = []
+    for medicine in Medicine.query.filter(Medicine.active == True).all():
+        total = sum(batch.quantity for batch in medicine.batches
+                    if batch.expiry_date > today and batch.quantity > 0)
+        if total <= medicine.minimum_stock:
+            low_stock.append(medicine)
+    return low_stock
+
+
+def seed_staff(total_users=20):
+    """Isi user admin/restoker penerima notifikasi stok rendah"""
+    from models import User
+
+    db.session.execute(insert(User), [{
+        "username": f"staff{i}",
+        "email": f"staff{i}@benchmark.local",
+        "password_hash": "-",
+        "full_name": f"Staff {i}",
+        "role": "admin" if i % 2 else "restoker",
+    } for i in range(total_users)])
+    db.session.commit()
+
+
+def seed_customers(total_customers):
+    """Isi pelanggan dengan NIK 16 digit untuk benchmark pencarian kasir"""
+    from models import Customer
+
+    first_names = ["Budi", "Siti", "Agus", "Dewi", "Rudi", "Ayu", "Joko", "Rina", "Eko", "Wati"]
+    for offset in range(0, total_customers, 10000):
+        db.session.execute(insert(Customer), [{
+            "name": f"{first_names[i % len(first_names)]} Santoso {i}",
+            "nik": f"{3201000000000000 + i:016d}",
+        } for i in range(offset, min(offset + 10000, total_customers))])
+    db.session.commit()
+
+
+def legacy_search_customers(query):
+    """Implementasi lama: ILIKE '%q%' pada nama dan NIK tanpa indeks pendukung"""
+    from sqlalchemy import or_
+    from models import Customer
+
+    return Customer.query.filter(or_(
+        Customer.name.ilike(f'%{query}%'),
+        Customer.nik.ilike(f'%{query}%')
+    )).limit(10).all()
+
+
+def legacy_low_stock_notifications():
+    """Implementasi lama: cek 24 jam dan satu objek Notification per obat per user"""
+    from models import Medicine, Notification, User, get_low_stock_medicines
+
+    notified = []
+    for medicine in get_low_stock_medicines():
+        existing_notification = Notification.query.filter(
+            Notification.medicine_id == medicine.id,
+            Notification.type == 'low_stock',
+            Notification.created_at >= datetime.utcnow() - timedelta(hours=24)
+        ).first()
+        if existing_notification:
+            continue
+        medicine = db.session.get(Medicine, medicine.id)
+        for user in User.query.filter(User.role.in_(['admin', 'restoker'])).all():
+            db.session.add(Notification(
+                title=f'Perlu Restock: {medicine.name}',
+                message=f'Obat {medicine.name} stok rendah (sisa: {medicine.total_quantity}). Minimum stok: {medicine.minimum_stock}',
+                type='low_stock',
+                user_id=user.id,
+                medicine_id=medicine.id,
+                priority='high'
+            ))
+        db.session.commit()
+        notified.append(medicine.id)
+    return notified
+
+
+def reset_notifications():
+    from models import Notification
+
+    db.session.execute(db.delete(Notification))
+    db.session.commit()
+
+
+def run_case(label, func, repeat=1):
+    """Jalankan satu kasus benchmark dengan session bersih (waktu rata-rata per panggilan)"""
+    db.session.expunge_all()
+    with QueryCounter(db.engine) as counter:
+        start = time.perf_counter()
+        for _ in range(repeat):
+            result = func()
+        elapsed = (time.perf_counter() - start) * 1000 / repeat
+    queries = counter.count // repeat
+    print(f"{label:<48} {queries:>8} queries {elapsed:>10.1f} ms   ({len(result)} rows)")
+
+
+def main():
+    total_medicines = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    total_customers = int(sys.argv[2]) if len(sys.argv) > 2 else 100000
+    app = create_benchmark_app()
+
+    with app.app_context():
+        import models
+
+        db.create_all()
+        print(f"Seeding {total_medicines} medicines...")
+        seed_medicines(total_medicines)
+        seed_staff()
+
+        print(f"\n{'case':<48} {'queries':>16} {'time':>13}")
+        # Implementasi lama bersifat N+1, hanya dijalankan untuk katalog kecil
+        if total_medicines <= 10000:
+            run_case("legacy low stock (per-medicine batches)", legacy_low_stock_medicines)
+        run_case("get_low_stock_medicines", models.get_low_stock_medicines)
+        run_case("get_out_of_stock_medicines", models.get_out_of_stock_medicines)
+        run_case("get_expiring_medicines (buckets)", models.get_expiring_medicines)
+        run_case("refresh_expiry_buckets", lambda: [models.refresh_expiry_buckets()])
+
+        if total_medicines <= 10000:
+            run_case("legacy low stock notifications", legacy_low_stock_notifications)
+            reset_notifications()
+        run_case("check_and_create_low_stock_notifications", models.check_and_create_low_stock_notifications)
+        reset_notifications()
+
+        for query in ["Obat Benchmark 4242", "generik-42", "Pabrik 7", "BM0000", "250mg"]:
+            run_case(f"search_medicines_advanced({query!r})",
+                     lambda: models.search_medicines_advanced(query), repeat=20)
+
+        print(f"\nSeeding {total_customers} customers...")
+        seed_customers(total_customers)
+        nik = f"{3201000000000000 + total_customers // 2:016d}"
+        for query in [nik, nik[:12], "Budi Santoso 4242", "Bdi Santoso"]:
+            run_case(f"legacy search_customers({query!r})",
+                     lambda: legacy_search_customers(query), repeat=5)
+            run_case(f"search_customers({query!r})",
+                     lambda: models.search_customers(query), repeat=20)
+
+
+if __name__ == '__main__':
+    main()
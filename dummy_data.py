@@ -12,7 +12,8 @@ def create_dummy_data():
     
     with app.app_context():
         from models import (User, Category, Medicine, MedicineBatch, Customer, Doctor, 
-                           Notification, CustomerWaitlist, PharmacyProfile)
+                           Notification, CustomerWaitlist, PharmacyProfile, refresh_medicine_stock,
+                           refresh_expiry_buckets)
         
         print("Creating dummy data for testing...")
         
@@ -352,6 +353,9 @@ def create_dummy_data():
                 db.session.add(waitlist2)
                 print("✅ Added customer to waitlist: Ibuprofen for Bapak Joko")
             
+            db.session.flush()
+            refresh_medicine_stock()
+            refresh_expiry_buckets()
             db.session.commit()
             
             print("\\n🎉 Dummy data creation completed successfully!")
@@ -0,0 +1,229 @@
+"""
+Antrian job export di background (Excel/CSV/PDF) dengan worker pool terbatas
+"""
+import json
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from database import db
+
+# Registry jenis export: kind -> fungsi(params, fileobj) yang mengembalikan nama file unduhan
+EXPORT_HANDLERS = {}
+
+def export_handler(kind, extension):
+    """Daftarkan fungsi penulis artifact untuk satu jenis export"""
+    def decorator(func):
+        EXPORT_HANDLERS[kind] = (func, extension)
+        return func
+    return decorator
+
+@export_handler('inventory_xlsx', '.xlsx')
+def _export_inventory_xlsx(params, fileobj):
+    import exports
+    exports.write_xlsx(fileobj, "Inventory Report", exports.INVENTORY_HEADERS, exports.iter_inventory_rows())
+    return f'inventory_report_{datetime.now().strftime("%Y%m%d")}.xlsx'
+
+@export_handler('inventory_csv', '.csv')
+def _export_inventory_csv(params, fileobj):
+    import exports
+    for chunk in exports.stream_csv(exports.INVENTORY_HEADERS, exports.iter_inventory_rows()):
+        fileobj.write(chunk.encode('utf-8'))
+    return f'inventory_report_{datetime.now().strftime("%Y%m%d")}.csv'
+
+def _sales_export_range(params):
+    start = datetime.fromisoformat(params['start'])
+    end = datetime.fromisoformat(params['end'])
+    filename = f'sales_{start.strftime("%Y%m%d")}_{(end - timedelta(days=1)).strftime("%Y%m%d")}'
+    return start, end, filename
+
+@export_handler('sales_csv', '.csv')
+def _export_sales_csv(params, fileobj):
+    import exports
+    start, end, filename = _sales_export_range(params)
+    for chunk in exports.stream_csv(exports.SALES_HEADERS, exports.iter_sales_rows(start, end)):
+        fileobj.write(chunk.encode('utf-8'))
+    return f'{filename}.csv'
+
+@export_handler('sales_xlsx', '.xlsx')
+def _export_sales_xlsx(params, fileobj):
+    import exports
+    start, end, filename = _sales_export_range(params)
+    exports.write_xlsx(fileobj, "Sales Report", exports.SALES_HEADERS, exports.iter_sales_rows(start, end))
+    return f'{filename}.xlsx'
+
+@export_handler('sales_parquet', '.parquet')
+def _export_sales_parquet(params, fileobj):
+    import exports
+    start, end, filename = _sales_export_range(params)
+    exports.write_sales_parquet(fileobj, exports.iter_sales_rows(start, end))
+    return f'{filename}.parquet'
+
+@export_handler('shortage_report', '.pdf')
+def _export_shortage_report(params, fileobj):
+    from models import Prescription, PharmacyProfile, loader_options
+    from pdf_reports import build_shortage_report_pdf
+
+    prescription = db.session.get(Prescription, int(params['prescription_id']),
+                                  options=loader_options('shortage_report'))
+    if not prescription:
+        raise ValueError('Resep tidak ditemukan')
+    build_shortage_report_pdf(fileobj, prescription, PharmacyProfile.query.first())
+    return f'shortage_report_{prescription.prescription_number}.pdf'
+
+class ExportJobManager:
+    """Menjalankan job export di thread pool terpisah dari worker request.
+
+    Status job disimpan di tabel export_jobs sehingga bisa di-poll dari
+    worker gunicorn mana pun; artifact ditulis ke direktori storage lokal
+    dan dihapus oleh cleanup() setelah melewati masa retensi. Job yang
+    tertinggal queued/running karena proses restart ditandai gagal oleh
+    fail_stale_jobs() setelah stale_minutes.
+    """
+
+    def __init__(self, max_workers=2, max_pending=20, retention_hours=24, stale_minutes=30):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.retention_hours = retention_hours
+        self.stale_minutes = stale_minutes
+        self.app = None
+        self.storage_dir = None
+        self._executor = None
+
+    def init_app(self, app):
+        self.app = app
+        self.max_workers = int(os.environ.get('EXPORT_WORKERS', self.max_workers))
+        self.retention_hours = int(os.environ.get('EXPORT_RETENTION_HOURS', self.retention_hours))
+        self.stale_minutes = int(os.environ.get('EXPORT_STALE_MINUTES', self.stale_minutes))
+        self.storage_dir = os.environ.get('EXPORT_STORAGE_DIR') or os.path.join(app.root_path, 'export_files')
+        os.makedirs(self.storage_dir, exist_ok=True)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='export')
+
+        with app.app_context():
+            self.fail_stale_jobs()
+
+    def submit(self, kind, params, user_id):
+        """Buat job baru dan masukkan ke antrian; ValueError jika ditolak"""
+        from models import ExportJob
+
+        if kind not in EXPORT_HANDLERS:
+            raise ValueError(f'Jenis export tidak dikenal: {kind}')
+
+        self.fail_stale_jobs()
+        pending = ExportJob.query.filter(ExportJob.status.in_(['queued', 'running'])).count()
+        if pending >= self.max_pending:
+            raise ValueError('Antrian export sedang penuh, coba lagi beberapa saat lagi')
+
+        job = ExportJob(
+            id=uuid.uuid4().hex,
+            kind=kind,
+            params=json.dumps(params or {}),
+            status='queued',
+            created_by=user_id
+        )
+        db.session.add(job)
+        db.session.commit()
+
+        self._executor.submit(self._run, job.id)
+        return job
+
+    def fail_stale_jobs(self):
+        """Tandai gagal job queued/running yang lebih tua dari stale_minutes.
+
+        Thread pool tidak bertahan saat proses restart, sehingga job seperti ini
+        tidak akan pernah selesai dan hanya memenuhi kuota max_pending.
+        """
+        from sqlalchemy import func
+        from models import ExportJob
+
+        cutoff = datetime.utcnow() - timedelta(minutes=self.stale_minutes)
+        stale_jobs = ExportJob.query.filter(
+            ExportJob.status.in_(['queued', 'running']),
+            func.coalesce(ExportJob.started_at, ExportJob.created_at) < cutoff
+        ).all()
+
+        for job in stale_jobs:
+            handler, extension = EXPORT_HANDLERS.get(job.kind, (None, ''))
+            temp_path = os.path.join(self.storage_dir, f'{job.id}{extension}.part')
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            job.status = 'failed'
+            job.error_message = 'Job terhenti (proses restart atau melewati batas waktu)'
+            job.finished_at = datetime.utcnow()
+
+        if stale_jobs:
+            db.session.commit()
+        return len(stale_jobs)
+
+    def _run(self, job_id):
+        from models import ExportJob
+
+        with self.app.app_context():
+            job = db.session.get(ExportJob, job_id)
+            if not job or job.status != 'queued':
+                return
+
+            job.status = 'running'
+            job.started_at = datetime.utcnow()
+            db.session.commit()
+
+            handler, extension = EXPORT_HANDLERS[job.kind]
+            file_path = os.path.join(self.storage_dir, f'{job.id}{extension}')
+            temp_path = f'{file_path}.part'
+
+            try:
+                with open(temp_path, 'wb') as fileobj:
+                    filename = handler(json.loads(job.params or '{}'), fileobj)
+                os.replace(temp_path, file_path)
+
+                job.status = 'done'
+                job.filename = filename
+                job.file_path = file_path
+            except Exception as e:
+                db.session.rollback()
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+                job = db.session.get(ExportJob, job_id)
+                job.status = 'failed'
+                job.error_message = str(e)
+                print(f"Export job {job_id} gagal: {str(e)}")
+
+            job.finished_at = datetime.utcnow()
+            db.session.commit()
+
+    def to_dict(self, job):
+        from flask import url_for
+
+        data = {
+            'id': job.id,
+            'kind': job.kind,
+            'status': job.status,
+            'filename': job.filename,
+            'error': job.error_message,
+            'created_at': job.created_at.isoformat() if job.created_at else None,
+            'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+            'status_url': url_for('api_export_job_status', job_id=job.id),
+            'download_url': None
+        }
+        if job.status == 'done':
+            data['download_url'] = url_for('download_export_job', job_id=job.id)
+        return data
+
+    def cleanup(self):
+        """Hapus job dan artifact yang lebih tua dari masa retensi"""
+        from models import ExportJob
+
+        cutoff = datetime.utcnow() - timedelta(hours=self.retention_hours)
+        expired_jobs = ExportJob.query.filter(ExportJob.created_at < cutoff).all()
+
+        for job in expired_jobs:
+            if job.file_path and os.path.exists(job.file_path):
+                os.remove(job.file_path)
+            db.session.delete(job)
+
+        db.session.commit()
+        return len(expired_jobs)
+
+# Instance global untuk digunakan di seluruh aplikasi
+export_job_manager = ExportJobManager()
@@ -0,0 +1,173 @@
+"""
+Export data apotek (Excel/CSV/Parquet) secara streaming dengan memori konstan
+"""
+import csv
+import io
+from datetime import datetime, timedelta
+
+from database import db
+
+# Jumlah baris yang diambil per batch dari server-side cursor
+EXPORT_YIELD_PER = 1000
+
+INVENTORY_HEADERS = ['Nama Obat', 'Kategori', 'Stok', 'Stok Minimum', 'Harga Beli', 'Harga Jual', 'Status']
+
+def iter_inventory_rows():
+    """Baris inventory (obat aktif) lengkap dengan stok dan status dari satu query.
+
+    Memakai server-side cursor (yield_per) sehingga baris tidak dimuat sekaligus.
+    """
+    from sqlalchemy import select, case
+    from models import Medicine, Category
+
+    stmt = select(
+        Medicine.name,
+        Category.name,
+        Medicine.stock_quantity,
+        Medicine.minimum_stock,
+        Medicine.purchase_price,
+        Medicine.selling_price,
+        case((Medicine.is_low_stock, 'Stok Rendah'), else_='Normal')
+    ).outerjoin(
+        Category, Medicine.category_id == Category.id
+    ).where(
+        Medicine.active == True
+    ).order_by(Medicine.name, Medicine.id).execution_options(yield_per=EXPORT_YIELD_PER)
+
+    for name, category, stock, minimum_stock, purchase_price, selling_price, status in db.session.execute(stmt):
+        yield [
+            name,
+            category or '',
+            stock or 0,
+            minimum_stock,
+            float(purchase_price),
+            float(selling_price),
+            status
+        ]
+
+SALES_HEADERS = ['Tanggal', 'No. Invoice', 'Pelanggan', 'Metode Pembayaran', 'Kasir', 'Nama Obat',
+                 'No. Batch', 'Kadaluwarsa', 'Qty', 'Harga Satuan', 'Total']
+
+# Nama kolom Parquet (untuk tim analitik) sesuai urutan SALES_HEADERS
+SALES_PARQUET_COLUMNS = ['sold_at', 'invoice_number', 'customer_name', 'payment_method', 'cashier', 'medicine_name',
+                         'batch_number', 'expiry_date', 'quantity', 'unit_price', 'total_price']
+
+def parse_date_range(start, end):
+    """Rentang [start, end + 1 hari) dari string YYYY-MM-DD; default bulan berjalan"""
+    from reporting import month_range
+
+    if not start or not end:
+        return month_range()
+
+    try:
+        start_date = datetime.strptime(start, '%Y-%m-%d')
+        end_date = datetime.strptime(end, '%Y-%m-%d') + timedelta(days=1)
+    except ValueError:
+        raise ValueError('Format tanggal harus YYYY-MM-DD')
+
+    if end_date <= start_date:
+        raise ValueError('Tanggal akhir harus setelah tanggal mulai')
+    return start_date, end_date
+
+def iter_sales_rows(start, end):
+    """Baris item penjualan dalam rentang [start, end) beserta data obat dan batch.
+
+    Satu query join sales, sale_items, medicines dan medicine_batches yang dibaca
+    lewat server-side cursor (yield_per).
+    """
+    from sqlalchemy import select
+    from models import Sale, SaleItem, Medicine, MedicineBatch, User
+
+    stmt = select(
+        Sale.created_at,
+        Sale.invoice_number,
+        Sale.customer_name,
+        Sale.payment_method,
+        User.full_name,
+        Medicine.name,
+        MedicineBatch.batch_number,
+        MedicineBatch.expiry_date,
+        SaleItem.quantity,
+        SaleItem.unit_price,
+        SaleItem.total_price
+    ).select_from(SaleItem).join(
+        Sale, SaleItem.sale_id == Sale.id
+    ).join(
+        Medicine, SaleItem.medicine_id == Medicine.id
+    ).join(
+        MedicineBatch, SaleItem.batch_id == MedicineBatch.id
+    ).outerjoin(
+        User, Sale.cashier_id == User.id
+    ).where(
+        Sale.created_at >= start,
+        Sale.created_at < end
+    ).order_by(Sale.created_at, Sale.id, SaleItem.id).execution_options(yield_per=EXPORT_YIELD_PER)
+
+    for row in db.session.execute(stmt):
+        (created_at, invoice_number, customer_name, payment_method, cashier, medicine_name,
+         batch_number, expiry_date, quantity, unit_price, total_price) = row
+        yield [
+            created_at,
+            invoice_number,
+            customer_name or 'Umum',
+            payment_method or 'cash',
+            cashier or '',
+            medicine_name,
+            batch_number,
+            expiry_date,
+            quantity,
+            float(unit_price),
+            float(total_price)
+        ]
+
+def stream_csv(headers, rows, chunk_rows=500):
+    """Generator CSV: header lalu baris-baris data, dikirim per potongan"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(headers)
+
+    for index, row in enumerate(rows, start=1):
+        writer.writerow(row)
+        if index % chunk_rows == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+
+    yield buffer.getvalue()
+
+def write_xlsx(fileobj, title, headers, rows):
+    """Tulis workbook Excel mode write-only (baris tidak disimpan di memori)"""
+    import openpyxl
+
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet(title=title)
+    ws.append(headers)
+    for row in rows:
+        ws.append(row)
+    wb.save(fileobj)
+
+def write_sales_parquet(fileobj, rows, batch_size=EXPORT_YIELD_PER):
+    """Tulis item penjualan ke Parquet, satu row group per batch (butuh paket pyarrow)"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    column_types = [pa.timestamp('us'), pa.string(), pa.string(), pa.string(), pa.string(), pa.string(),
+                    pa.string(), pa.date32(), pa.int64(), pa.float64(), pa.float64()]
+    schema = pa.schema(list(zip(SALES_PARQUET_COLUMNS, column_types)))
+
+    def to_table(batch):
+        columns = zip(*batch)
+        return pa.Table.from_arrays(
+            [pa.array(column, type=column_type) for column, column_type in zip(columns, column_types)],
+            schema=schema
+        )
+
+    with pq.ParquetWriter(fileobj, schema) as writer:
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= batch_size:
+                writer.write_table(to_table(batch))
+                batch = []
+        if batch:
+            writer.write_table(to_table(batch))
@@ -3,7 +3,6 @@ from datetime import datetime, timedelta
 
 from flask import Flask, render_template, request, redirect, url_for, flash, jsonify
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
-from apscheduler.schedulers.background import BackgroundScheduler
 from dotenv import load_dotenv
 from database import db
 
@@ -37,10 +36,6 @@ login_manager.init_app(app)
 login_manager.login_view = 'login'  # type: ignore
 login_manager.login_message = 'Silakan login untuk mengakses halaman ini.'
 
-# Setup background scheduler for notifications
-scheduler = BackgroundScheduler()
-scheduler.start()
-
 with app.app_context():
     # Import models here so tables are created
     import models
@@ -60,6 +55,23 @@ from routes import register_routes
 register_main_routes(app, db)
 register_routes(app)
 
+# Indeks barcode in-memory untuk scan di kasir
+from barcode_index import barcode_index
+barcode_index.init_app(app)
+
+# Worker pool untuk export/laporan besar di background
+from export_jobs import export_job_manager
+export_job_manager.init_app(app)
+
+# Dispatcher antrian pesan WhatsApp
+from whatsapp_dispatcher import whatsapp_dispatcher
+whatsapp_dispatcher.init_app(app)
+
+# Job periodik (scan stok rendah/kadaluwarsa, outbox, WhatsApp, warmup cache);
+# hanya satu proses leader yang menjalankan job bersama
+from scheduler_service import scheduler_service
+scheduler_service.init_app(app)
+
 # Context processor untuk akses global
 @app.context_processor
 def inject_pharmacy_profile():
@@ -0,0 +1,42 @@
+"""
+Database migration script to add the expiry index, write-off ledger and expiry buckets
+"""
+from sqlalchemy import text
+from database import db
+
+def migrate_expiry_buckets():
+    # Import Flask app
+    from main import app
+    
+    with app.app_context():
+        from models import StockWriteOff, MedicineExpiryBucket, rollover_expired_stock
+        
+        print("Starting expiry bucket migration...")
+        
+        try:
+            # Tabel baru (juga dibuat oleh db.create_all saat aplikasi start)
+            StockWriteOff.__table__.create(db.engine, checkfirst=True)
+            MedicineExpiryBucket.__table__.create(db.engine, checkfirst=True)
+            
+            # Dipakai rollover harian dan agregat bucket (expiry_date <= X AND quantity > 0)
+            db.session.execute(text("""
+                CREATE INDEX IF NOT EXISTS ix_medicine_batches_expiry_quantity 
+                ON medicine_batches (expiry_date, quantity)
+            """))
+            db.session.commit()
+            print("Created index: ix_medicine_batches_expiry_quantity")
+            
+            # Write-off batch yang sudah kadaluwarsa dan isi bucket pertama kali
+            print("Writing off expired batches and building expiry buckets...")
+            written_off = rollover_expired_stock()
+            print(f"Batch written off: {written_off}")
+            
+            print("Expiry bucket migration completed successfully!")
+            
+        except Exception as e:
+            db.session.rollback()
+            print(f"Migration failed: {e}")
+            raise e
+
+if __name__ == '__main__':
+    migrate_expiry_buckets()
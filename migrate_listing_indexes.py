@@ -0,0 +1,56 @@
+"""
+Database migration script to add indexes for paginated listings and date-range reports
+"""
+from sqlalchemy import text
+from database import db
+
+# (nama indeks, tabel, kolom) untuk keyset pagination dan filter rentang tanggal
+LISTING_INDEXES = [
+    ("ix_medicines_active_name_id", "medicines", "active, name, id"),
+    ("ix_sales_created_at", "sales", "created_at"),
+    ("ix_customers_created_at_id", "customers", "created_at, id"),
+    ("ix_doctors_created_at_id", "doctors", "created_at, id"),
+    ("ix_prescriptions_uploaded_at_id", "prescriptions", "uploaded_at, id"),
+    ("ix_prescriptions_status_uploaded_at", "prescriptions", "status, uploaded_at"),
+]
+
+# Baris lama tanpa timestamp tidak bisa dipaginasi dengan keyset (created_at, id)
+TIMESTAMP_BACKFILLS = [
+    ("customers", "created_at"),
+    ("doctors", "created_at"),
+    ("prescriptions", "uploaded_at"),
+]
+
+def migrate_listing_indexes():
+    # Import Flask app
+    from main import app
+    
+    with app.app_context():
+        
+        print("Starting listing index migration...")
+        
+        try:
+            for table_name, column in TIMESTAMP_BACKFILLS:
+                result = db.session.execute(text(f"""
+                    UPDATE {table_name} SET {column} = CURRENT_TIMESTAMP 
+                    WHERE {column} IS NULL
+                """))
+                print(f"Backfilled {result.rowcount} rows: {table_name}.{column}")
+            
+            for index_name, table_name, columns in LISTING_INDEXES:
+                db.session.execute(text(f"""
+                    CREATE INDEX IF NOT EXISTS {index_name} 
+                    ON {table_name} ({columns})
+                """))
+                print(f"Created index: {index_name}")
+            
+            db.session.commit()
+            print("Listing index migration completed successfully!")
+            
+        except Exception as e:
+            db.session.rollback()
+            print(f"Migration failed: {e}")
+            raise e
+
+if __name__ == '__main__':
+    migrate_listing_indexes()
@@ -0,0 +1,73 @@
+"""
+Database migration script to add pg_trgm search indexes (PostgreSQL only)
+"""
+from sqlalchemy import text
+from database import db
+
+# (nama indeks, tabel, ekspresi) untuk pencarian ILIKE/LIKE '%q%' via GIN trigram;
+# ekspresi harus sama persis dengan yang dipakai query agar indeks terpakai
+TRIGRAM_INDEXES = [
+    ("ix_medicines_name_trgm", "medicines", "name"),
+    ("ix_medicines_generic_name_trgm", "medicines", "generic_name"),
+    ("ix_medicines_barcode_id_trgm", "medicines", "barcode_id"),
+    ("ix_medicines_barcode_trgm", "medicines", "barcode"),
+    ("ix_medicines_capacity_trgm", "medicines", "capacity"),
+    ("ix_medicines_manufacturer_trgm", "medicines", "manufacturer"),
+    ("ix_customers_name_trgm", "customers", "name"),
+    ("ix_doctors_name_trgm", "doctors", "name"),
+    ("ix_doctors_specialization_trgm", "doctors", "specialization"),
+    ("ix_doctors_str_number_trgm", "doctors", "str_number"),
+    ("ix_doctors_str_number_upper_trgm", "doctors", "upper(str_number)"),
+]
+
+# (nama indeks, tabel, ekspresi) untuk typeahead awalan LIKE 'q%'; text_pattern_ops
+# diperlukan agar btree dipakai untuk LIKE pada collation selain "C"
+PREFIX_INDEXES = [
+    ("ix_customers_name_lower_prefix", "customers", "lower(name)"),
+    ("ix_customers_nik_prefix", "customers", "nik"),
+    ("ix_doctors_name_lower_prefix", "doctors", "lower(name)"),
+    ("ix_doctors_nik_prefix", "doctors", "nik"),
+    ("ix_doctors_str_number_upper_prefix", "doctors", "upper(str_number)"),
+    ("ix_prescriptions_number_prefix", "prescriptions", "prescription_number"),
+]
+
+def migrate_search_indexes():
+    # Import Flask app
+    from main import app
+
+    with app.app_context():
+
+        if db.engine.dialect.name != 'postgresql':
+            print("Search indexes require PostgreSQL, skipping...")
+            return
+
+        print("Starting search index migration...")
+
+        try:
+            db.session.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+            print("Enabled extension: pg_trgm")
+
+            for index_name, table_name, expression in TRIGRAM_INDEXES:
+                db.session.execute(text(f"""
+                    CREATE INDEX IF NOT EXISTS {index_name}
+                    ON {table_name} USING gin (({expression}) gin_trgm_ops)
+                """))
+                print(f"Created index: {index_name}")
+
+            for index_name, table_name, expression in PREFIX_INDEXES:
+                db.session.execute(text(f"""
+                    CREATE INDEX IF NOT EXISTS {index_name}
+                    ON {table_name} (({expression}) text_pattern_ops)
+                """))
+                print(f"Created index: {index_name}")
+
+            db.session.commit()
+            print("Search index migration completed successfully!")
+
+        except Exception as e:
+            db.session.rollback()
+            print(f"Migration failed: {e}")
+            raise e
+
+if __name__ == '__main__':
+    migrate_search_indexes()
@@ -0,0 +1,61 @@
+"""
+Database migration script to add the materialized stock columns to medicines
+"""
+from sqlalchemy import text
+from database import db
+
+def migrate_stock_ledger():
+    # Import Flask app
+    from main import app
+    
+    with app.app_context():
+        from models import refresh_medicine_stock
+        
+        print("Starting stock ledger migration...")
+        
+        try:
+            # Check if columns exist before adding
+            result = db.session.execute(text("""
+                SELECT column_name 
+                FROM information_schema.columns 
+                WHERE table_name='medicines' AND column_name IN ('stock_quantity', 'stock_updated_at')
+            """))
+            existing_columns = [row[0] for row in result]
+            
+            medicine_columns = [
+                ("stock_quantity", "INTEGER NOT NULL DEFAULT 0"),
+                ("stock_updated_at", "TIMESTAMP")
+            ]
+            
+            for col_name, col_type in medicine_columns:
+                if col_name not in existing_columns:
+                    db.session.execute(text(f"ALTER TABLE medicines ADD COLUMN {col_name} {col_type}"))
+                    print(f"Added column: medicines.{col_name}")
+                else:
+                    print(f"Column medicines.{col_name} already exists, skipping...")
+            
+            db.session.execute(text("""
+                CREATE INDEX IF NOT EXISTS ix_medicines_stock_quantity 
+                ON medicines(stock_quantity)
+            """))
+            
+            # Dibutuhkan oleh subquery per obat di refresh_medicine_stock()
+            db.session.execute(text("""
+                CREATE INDEX IF NOT EXISTS ix_medicine_batches_medicine_id 
+                ON medicine_batches(medicine_id)
+            """))
+            
+            # Backfill stok dari batch yang belum kadaluwarsa
+            print("Recalculating stock_quantity from medicine_batches...")
+            refresh_medicine_stock()
+            
+            db.session.commit()
+            print("Stock ledger migration completed successfully!")
+            
+        except Exception as e:
+            db.session.rollback()
+            print(f"Migration failed: {e}")
+            raise e
+
+if __name__ == '__main__':
+    migrate_stock_ledger()
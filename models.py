@@ -1,5 +1,7 @@
 from datetime import datetime, timedelta
+from collections import namedtuple
 from flask_login import UserMixin
+from sqlalchemy.ext.hybrid import hybrid_property
 from werkzeug.security import generate_password_hash, check_password_hash
 from database import db
 
@@ -88,25 +90,36 @@ class Medicine(db.Model):
     storage_location = db.Column(db.String(100))
     image_url = db.Column(db.String(500))  # URL atau path gambar kemasan
     active = db.Column(db.Boolean, default=True)
+    stock_quantity = db.Column(db.Integer, default=0, nullable=False, index=True)  # Stok siap jual dari batch yang belum kadaluwarsa
+    stock_updated_at = db.Column(db.DateTime)  # Kapan stock_quantity terakhir diperbarui
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    # Indeks untuk keyset pagination halaman inventory
+    __table_args__ = (db.Index('ix_medicines_active_name_id', 'active', 'name', 'id'),)
+    
     # Relationships
     batches = db.relationship('MedicineBatch', backref='medicine_ref', lazy=True, cascade='all, delete-orphan')
     sale_items = db.relationship('SaleItem', backref='medicine_ref', lazy=True)
     
-    @property
+    @hybrid_property
     def total_quantity(self):
-        """Total stok dari semua batch yang belum kadaluwarsa"""
-        today = datetime.now().date()
-        return sum(batch.quantity for batch in self.batches 
-                  if batch.expiry_date > today and batch.quantity > 0)
+        """Total stok dari semua batch yang belum kadaluwarsa (dibaca dari stock_quantity)"""
+        return self.stock_quantity or 0
     
-    @property
+    @total_quantity.expression
+    def total_quantity(cls):
+        return cls.stock_quantity
+    
+    @hybrid_property
     def is_low_stock(self):
         """Cek apakah stok rendah"""
         return self.total_quantity <= self.minimum_stock
     
+    @is_low_stock.expression
+    def is_low_stock(cls):
+        return cls.stock_quantity <= cls.minimum_stock
+    
     def expiring_batches(self, days_ahead=14):
         """Batch yang akan kadaluwarsa dalam waktu tertentu"""
         cutoff_date = datetime.now().date() + timedelta(days=days_ahead)
@@ -156,7 +169,7 @@ class MedicineBatch(db.Model):
     __tablename__ = 'medicine_batches'
     
     id = db.Column(db.Integer, primary_key=True)
-    medicine_id = db.Column(db.Integer, db.ForeignKey('medicines.id'), nullable=False)
+    medicine_id = db.Column(db.Integer, db.ForeignKey('medicines.id'), nullable=False, index=True)
     batch_number = db.Column(db.String(50), nullable=False)
     expiry_date = db.Column(db.Date, nullable=False)
     quantity = db.Column(db.Integer, nullable=False)
@@ -172,6 +185,56 @@ class MedicineBatch(db.Model):
     @property
     def days_to_expiry(self):
         return (self.expiry_date - datetime.now().date()).days
+    
+    # Dipakai rollover kadaluwarsa, bucket kadaluwarsa dan filter "akan kadaluwarsa"
+    __table_args__ = (db.Index('ix_medicine_batches_expiry_quantity', 'expiry_date', 'quantity'),)
+
+# Batas hari bucket kadaluwarsa yang dihitung per obat
+EXPIRY_BUCKET_DAYS = (7, 14, 30, 90)
+
+class StockWriteOff(db.Model):
+    """Ledger stok yang dikeluarkan dari batch (kadaluwarsa atau rusak)"""
+    __tablename__ = 'stock_write_offs'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    medicine_id = db.Column(db.Integer, db.ForeignKey('medicines.id'), nullable=False, index=True)
+    batch_id = db.Column(db.Integer, db.ForeignKey('medicine_batches.id', ondelete='SET NULL'))
+    batch_number = db.Column(db.String(50), nullable=False)
+    expiry_date = db.Column(db.Date, nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)
+    purchase_price = db.Column(db.Numeric(10, 2), nullable=False)
+    reason = db.Column(db.String(20), default='expired')  # expired, damaged
+    created_by = db.Column(db.Integer, db.ForeignKey('users.id'))  # Kosong jika dari job harian
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    
+    medicine = db.relationship('Medicine', lazy=True)
+
+class MedicineExpiryBucket(db.Model):
+    """Ringkasan stok per obat yang akan kadaluwarsa dalam 7/14/30/90 hari.
+    
+    Dihitung ulang oleh job rollover harian dan diperbarui per obat saat batch
+    ditambah atau terjual, sehingga halaman notifikasi tidak memindai batch.
+    Jumlah bersifat kumulatif (expiring_30d sudah termasuk expiring_14d).
+    """
+    __tablename__ = 'medicine_expiry_buckets'
+    
+    medicine_id = db.Column(db.Integer, db.ForeignKey('medicines.id', ondelete='CASCADE'), primary_key=True)
+    earliest_expiry = db.Column(db.Date, nullable=False)
+    expiring_7d = db.Column(db.Integer, default=0, nullable=False)
+    expiring_14d = db.Column(db.Integer, default=0, nullable=False, index=True)
+    expiring_30d = db.Column(db.Integer, default=0, nullable=False)
+    expiring_90d = db.Column(db.Integer, default=0, nullable=False)
+    refreshed_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    medicine = db.relationship('Medicine', lazy=True)
+    
+    @property
+    def days_to_expiry(self):
+        return (self.earliest_expiry - datetime.now().date()).days
+
+
+# Satu baris struk (gabungan SaleItem per obat dan harga satuan)
+ReceiptLine = namedtuple('ReceiptLine', ['medicine_ref', 'quantity', 'unit_price', 'total_price'])
 
 class Sale(db.Model):
     """Model untuk transaksi penjualan"""
@@ -194,11 +257,25 @@ class Sale(db.Model):
     change_amount = db.Column(db.Numeric(10, 2))  # Kembalian
     notes = db.Column(db.Text)
     cashier_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     
     # Relationships
     sale_items = db.relationship('SaleItem', backref='sale_ref', lazy=True, cascade='all, delete-orphan')
     cashier = db.relationship('User', backref='sales', lazy=True)
+    
+    @property
+    def receipt_items(self):
+        """Baris struk: potongan batch dari satu baris keranjang digabung per obat dan harga satuan"""
+        lines = {}
+        for item in self.sale_items:
+            key = (item.medicine_id, item.unit_price)
+            if key in lines:
+                line = lines[key]
+                lines[key] = line._replace(quantity=line.quantity + item.quantity,
+                                           total_price=line.total_price + item.total_price)
+            else:
+                lines[key] = ReceiptLine(item.medicine_ref, item.quantity, item.unit_price, item.total_price)
+        return list(lines.values())
 
 class SaleItem(db.Model):
     """Model untuk item dalam transaksi penjualan"""
@@ -234,6 +311,9 @@ class Customer(db.Model):
     medical_notes = db.Column(db.Text)  # Catatan medis (alergi, dll)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    # Indeks untuk keyset pagination daftar pelanggan (terbaru dulu)
+    __table_args__ = (db.Index('ix_customers_created_at_id', 'created_at', 'id'),)
 
 class Doctor(db.Model):
     """Model untuk data dokter"""
@@ -255,6 +335,9 @@ class Doctor(db.Model):
     license_expiry_date = db.Column(db.Date)  # Tanggal kadaluwarsa STR
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    # Indeks untuk keyset pagination daftar dokter (terbaru dulu)
+    __table_args__ = (db.Index('ix_doctors_created_at_id', 'created_at', 'id'),)
 
 class Notification(db.Model):
     """Model untuk notifikasi sistem"""
@@ -322,6 +405,12 @@ class Prescription(db.Model):
     processed_at = db.Column(db.DateTime)  # Kapan resep diproses
     processed_by = db.Column(db.Integer, db.ForeignKey('users.id'))  # User yang memproses
     
+    # Indeks untuk keyset pagination daftar resep (terbaru dulu)
+    __table_args__ = (
+        db.Index('ix_prescriptions_uploaded_at_id', 'uploaded_at', 'id'),
+        db.Index('ix_prescriptions_status_uploaded_at', 'status', 'uploaded_at'),
+    )
+    
     # Relationships
     customer = db.relationship('Customer', backref='prescriptions', lazy=True)
     doctor = db.relationship('Doctor', backref='prescriptions', lazy=True) 
@@ -353,15 +442,486 @@ class PrescriptionItem(db.Model):
     medicine = db.relationship('Medicine', foreign_keys=[medicine_id], backref='prescribed_items', lazy=True)
     substitution_medicine = db.relationship('Medicine', foreign_keys=[substitution_medicine_id], lazy=True)
 
+class OutboundMessage(db.Model):
+    """Model untuk antrian pesan WhatsApp keluar"""
+    __tablename__ = 'outbound_messages'
+
+    id = db.Column(db.Integer, primary_key=True)
+    provider = db.Column(db.String(50), default='whatsapp', nullable=False)
+    phone = db.Column(db.String(20), nullable=False)  # Nomor tujuan (format internasional)
+    body = db.Column(db.Text, nullable=False)
+    customer_id = db.Column(db.Integer, db.ForeignKey('customers.id'))
+    medicine_id = db.Column(db.Integer, db.ForeignKey('medicines.id'))
+    waitlist_id = db.Column(db.Integer, db.ForeignKey('customer_waitlist.id'))  # Waitlist yang ditandai setelah terkirim
+    status = db.Column(db.String(20), default='pending', nullable=False)  # pending, sending, sent, failed
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)  # Jadwal kirim/retry berikutnya
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime)
+
+    # Indeks untuk dispatcher yang mengambil pesan jatuh tempo
+    __table_args__ = (db.Index('ix_outbound_messages_status_next_attempt', 'status', 'next_attempt_at'),)
+
+    customer = db.relationship('Customer', lazy=True)
+    medicine = db.relationship('Medicine', lazy=True)
+
+class OutboxEvent(db.Model):
+    """Model untuk outbox event: ditulis dalam transaksi yang sama dengan perubahan data"""
+    __tablename__ = 'outbox_events'
+
+    id = db.Column(db.Integer, primary_key=True)
+    event_type = db.Column(db.String(50), nullable=False)  # medicine_restocked, stock_decreased, waitlist_notify
+    payload = db.Column(db.Text, nullable=False)  # Data event dalam format JSON
+    status = db.Column(db.String(20), default='pending', nullable=False)  # pending, processed, failed
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    available_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)  # Jadwal proses/retry berikutnya
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    processed_at = db.Column(db.DateTime)
+
+    # Indeks untuk worker yang mengambil event jatuh tempo
+    __table_args__ = (db.Index('ix_outbox_events_status_available', 'status', 'available_at'),)
+
+class ExportJob(db.Model):
+    """Model untuk job export/laporan yang dijalankan di background"""
+    __tablename__ = 'export_jobs'
+
+    id = db.Column(db.String(32), primary_key=True)  # uuid4 hex
+    kind = db.Column(db.String(50), nullable=False)  # inventory_xlsx, sales_csv, sales_parquet, shortage_report, ...
+    params = db.Column(db.Text)  # Parameter job dalam format JSON
+    status = db.Column(db.String(20), default='queued', nullable=False, index=True)  # queued, running, done, failed
+    filename = db.Column(db.String(255))  # Nama file saat diunduh
+    file_path = db.Column(db.String(500))  # Lokasi artifact di storage lokal
+    error_message = db.Column(db.Text)
+    created_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    user = db.relationship('User', backref='export_jobs', lazy=True)
+
 # Utility functions
+# Profil eager loading per view: relasi yang disentuh template/renderer dimuat
+# sekaligus agar jumlah query tetap konstan berapa pun jumlah baris/item.
+# Dibungkus lambda karena backref (mis. SaleItem.medicine_ref) baru ada setelah mapper dikonfigurasi.
+LOADER_PROFILES = {
+    # Struk PDF/thermal: kasir dan nama obat setiap item
+    'receipt': lambda orm: (
+        orm.joinedload(Sale.cashier),
+        orm.selectinload(Sale.sale_items).joinedload(SaleItem.medicine_ref)
+    ),
+    # Daftar resep: pelanggan, dokter dan pengunggah per baris
+    'prescription_list': lambda orm: (
+        orm.joinedload(Prescription.customer),
+        orm.joinedload(Prescription.doctor),
+        orm.joinedload(Prescription.uploader)
+    ),
+    # Laporan kekurangan obat: item resep beserta stok obatnya
+    'shortage_report': lambda orm: (
+        orm.joinedload(Prescription.customer),
+        orm.joinedload(Prescription.doctor),
+        orm.selectinload(Prescription.prescription_items).joinedload(PrescriptionItem.medicine)
+    ),
+    # Detail/proses resep: semua relasi resep dan item
+    'prescription_detail': lambda orm: (
+        orm.joinedload(Prescription.customer),
+        orm.joinedload(Prescription.doctor),
+        orm.joinedload(Prescription.uploader),
+        orm.joinedload(Prescription.processor),
+        orm.selectinload(Prescription.prescription_items).options(
+            orm.joinedload(PrescriptionItem.medicine),
+            orm.joinedload(PrescriptionItem.substitution_medicine)
+        )
+    ),
+}
+
+def loader_options(profile):
+    """Opsi loader untuk profil di LOADER_PROFILES, dipakai dengan query.options(*...)"""
+    from sqlalchemy import orm
+    return LOADER_PROFILES[profile](orm)
+
+def _mark_stock_changed(medicine_ids):
+    """UPDATE bulk tidak terlihat di after_flush; catat agar indeks barcode ikut diperbarui setelah commit"""
+    from barcode_index import barcode_index
+    barcode_index.mark_changed(db.session, medicine_ids)
+
+def refresh_medicine_stock(medicine_ids=None):
+    """Hitung ulang stock_quantity dari batch yang belum kadaluwarsa.
+    
+    Dijalankan dalam transaksi yang sedang berjalan, commit dilakukan oleh pemanggil.
+    Jika medicine_ids kosong (None), semua obat dihitung ulang.
+    """
+    from sqlalchemy import func, select, update
+    
+    today = datetime.now().date()
+    on_hand = select(
+        func.coalesce(func.sum(MedicineBatch.quantity), 0)
+    ).where(
+        MedicineBatch.medicine_id == Medicine.id,
+        MedicineBatch.expiry_date > today,
+        MedicineBatch.quantity > 0
+    ).scalar_subquery()
+    
+    stmt = update(Medicine).values(stock_quantity=on_hand, stock_updated_at=datetime.utcnow())
+    if medicine_ids is not None:
+        medicine_ids = list(medicine_ids)
+        if not medicine_ids:
+            return
+        stmt = stmt.where(Medicine.id.in_(medicine_ids))
+    
+    db.session.execute(stmt)
+    _mark_stock_changed(medicine_ids)
+
+def adjust_medicine_stock(medicine_id, delta):
+    """Tambah/kurangi stock_quantity secara atomik di database (tanpa commit)"""
+    from sqlalchemy import update
+    
+    db.session.execute(
+        update(Medicine).where(Medicine.id == medicine_id).values(
+            stock_quantity=Medicine.stock_quantity + delta,
+            stock_updated_at=datetime.utcnow()
+        )
+    )
+    _mark_stock_changed([medicine_id])
+
+def write_off_expired_batches(reason='expired', user_id=None):
+    """Pindahkan sisa stok batch kadaluwarsa ke ledger write-off (tanpa commit).
+    
+    Batch dikunci FOR UPDATE, satu insert executemany ke stock_write_offs lalu
+    quantity batch dinolkan. Mengembalikan id obat yang terdampak.
+    """
+    from sqlalchemy import insert, update
+    
+    today = datetime.now().date()
+    batches = db.session.execute(
+        db.select(
+            MedicineBatch.id, MedicineBatch.medicine_id, MedicineBatch.batch_number,
+            MedicineBatch.expiry_date, MedicineBatch.quantity, MedicineBatch.purchase_price
+        ).where(
+            MedicineBatch.expiry_date <= today,
+            MedicineBatch.quantity > 0
+        ).order_by(MedicineBatch.id).with_for_update()
+    ).all()
+    if not batches:
+        return []
+    
+    now = datetime.utcnow()
+    db.session.execute(insert(StockWriteOff), [{
+        'medicine_id': batch.medicine_id,
+        'batch_id': batch.id,
+        'batch_number': batch.batch_number,
+        'expiry_date': batch.expiry_date,
+        'quantity': batch.quantity,
+        'purchase_price': batch.purchase_price,
+        'reason': reason,
+        'created_by': user_id,
+        'created_at': now
+    } for batch in batches])
+    db.session.execute(
+        update(MedicineBatch).where(
+            MedicineBatch.id.in_([batch.id for batch in batches])
+        ).values(quantity=0),
+        execution_options={'synchronize_session': False}
+    )
+    return sorted({batch.medicine_id for batch in batches})
+
+def refresh_expiry_buckets(medicine_ids=None):
+    """Hitung ulang bucket kadaluwarsa 7/14/30/90 hari (tanpa commit).
+    
+    Satu query agregat dari batch yang belum kadaluwarsa (memakai indeks
+    expiry_date, quantity), lalu bucket lama dihapus dan diganti dengan satu
+    insert executemany. medicine_ids None berarti semua obat.
+    """
+    from sqlalchemy import func, case, insert, delete
+    
+    if medicine_ids is not None:
+        medicine_ids = list(medicine_ids)
+        if not medicine_ids:
+            return 0
+    
+    today = datetime.now().date()
+    columns = [
+        func.sum(case(
+            (MedicineBatch.expiry_date <= today + timedelta(days=days), MedicineBatch.quantity), else_=0
+        )).label(f'expiring_{days}d')
+        for days in EXPIRY_BUCKET_DAYS
+    ]
+    query = db.select(
+        MedicineBatch.medicine_id,
+        func.min(MedicineBatch.expiry_date).label('earliest_expiry'),
+        *columns
+    ).where(
+        MedicineBatch.expiry_date > today,
+        MedicineBatch.expiry_date <= today + timedelta(days=max(EXPIRY_BUCKET_DAYS)),
+        MedicineBatch.quantity > 0
+    ).group_by(MedicineBatch.medicine_id)
+    
+    stmt = delete(MedicineExpiryBucket)
+    if medicine_ids is not None:
+        query = query.where(MedicineBatch.medicine_id.in_(medicine_ids))
+        stmt = stmt.where(MedicineExpiryBucket.medicine_id.in_(medicine_ids))
+    
+    rows = [dict(row._mapping, refreshed_at=datetime.utcnow()) for row in db.session.execute(query)]
+    db.session.execute(stmt, execution_options={'synchronize_session': False})
+    if rows:
+        db.session.execute(insert(MedicineExpiryBucket), rows)
+    return len(rows)
+
+def rollover_expired_stock():
+    """Job harian: write-off batch kadaluwarsa, hitung ulang stok siap jual dan bucket kadaluwarsa"""
+    from sqlalchemy import select
+    
+    today = datetime.now().date()
+    # Batch yang kadaluwarsa hari ini masih terhitung di stock_quantity
+    medicine_ids = set(db.session.execute(
+        select(MedicineBatch.medicine_id).where(
+            MedicineBatch.expiry_date <= today,
+            MedicineBatch.quantity > 0
+        ).distinct()
+    ).scalars())
+    
+    written_off = write_off_expired_batches()
+    refresh_medicine_stock(medicine_ids)
+    refresh_expiry_buckets()
+    db.session.commit()
+    return len(written_off)
+
+def adjust_medicines_stock(deltas):
+    """Versi bulk adjust_medicine_stock: deltas berupa dict {medicine_id: delta}, satu executemany"""
+    from sqlalchemy import bindparam
+    
+    if not deltas:
+        return
+    
+    medicines = Medicine.__table__
+    db.session.execute(
+        medicines.update().where(
+            medicines.c.id == bindparam('b_medicine_id')
+        ).values(
+            stock_quantity=medicines.c.stock_quantity + bindparam('b_delta'),
+            stock_updated_at=datetime.utcnow()
+        ),
+        [{'b_medicine_id': medicine_id, 'b_delta': delta} for medicine_id, delta in deltas.items()]
+    )
+    _mark_stock_changed(deltas.keys())
+
+def _lock_sellable_batches(medicine_ids, skip_locked=False):
+    """Batch yang bisa dijual (belum kadaluwarsa, stok > 0) untuk beberapa obat sekaligus.
+    
+    Satu query FOR UPDATE, diurutkan per obat lalu FEFO sehingga urutan penguncian
+    selalu konsisten. Mengembalikan dict {medicine_id: [batch, ...]}.
+    """
+    today = datetime.now().date()
+    batches = MedicineBatch.query.filter(
+        MedicineBatch.medicine_id.in_(medicine_ids),
+        MedicineBatch.quantity > 0,
+        MedicineBatch.expiry_date > today
+    ).order_by(
+        MedicineBatch.medicine_id.asc(),
+        MedicineBatch.expiry_date.asc(),
+        MedicineBatch.id.asc()
+    ).with_for_update(skip_locked=skip_locked).populate_existing().all()
+    
+    batches_by_medicine = {medicine_id: [] for medicine_id in medicine_ids}
+    for batch in batches:
+        batches_by_medicine[batch.medicine_id].append(batch)
+    return batches_by_medicine
+
+def split_quantity_fefo(batches, quantity):
+    """Bagi quantity ke batch yang sudah terurut FEFO.
+    
+    Mengembalikan (list (batch, jumlah), sisa yang tidak terpenuhi).
+    """
+    slices = []
+    remaining = quantity
+    for batch in batches:
+        if remaining <= 0:
+            break
+        take = min(batch.quantity, remaining)
+        if take > 0:
+            slices.append((batch, take))
+            remaining -= take
+    return slices, remaining
+
+def split_line_total(total_price, slices):
+    """Bagi total harga satu baris keranjang ke potongan batch sebanding jumlahnya.
+    
+    slices berupa list (batch, jumlah) dari allocate_sale_lines. Bagian tiap
+    potongan dibulatkan ke bawah ke sen dan sisanya masuk potongan terakhir,
+    sehingga jumlahnya tepat total_price dan tidak ada yang negatif (termasuk
+    saat total_price lebih kecil dari unit_price * jumlah karena diskon).
+    """
+    from decimal import Decimal, ROUND_DOWN
+    
+    total_price = Decimal(total_price)
+    quantity = sum(slice_quantity for _, slice_quantity in slices)
+    cent = Decimal('0.01')
+    
+    totals = []
+    for batch, slice_quantity in slices[:-1]:
+        totals.append((total_price * slice_quantity / quantity).quantize(cent, rounding=ROUND_DOWN))
+    totals.append(total_price - sum(totals, Decimal('0')))
+    
+    assert all(slice_total >= 0 for slice_total in totals), totals
+    return totals
+
+def parse_sale_items(items):
+    """Validasi item keranjang dari request kasir sebelum stok dialokasikan.
+    
+    Setiap item wajib punya medicine_id dan quantity bilangan bulat positif serta
+    unit_price dan total_price berupa angka tidak negatif. Mengembalikan list dict
+    {medicine_id, quantity, unit_price, total_price} (harga sebagai Decimal).
+    Raise ValueError dengan pesan untuk kasir jika ada yang tidak valid.
+    """
+    from decimal import Decimal, InvalidOperation
+    
+    def to_int(value):
+        if isinstance(value, bool):
+            raise ValueError
+        if isinstance(value, int):
+            return value
+        if isinstance(value, float) and value.is_integer():
+            return int(value)
+        if isinstance(value, str) and value.strip().isdigit():
+            return int(value)
+        raise ValueError
+    
+    def to_price(value):
+        if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+            raise ValueError
+        try:
+            price = Decimal(str(value).strip())
+        except InvalidOperation:
+            raise ValueError
+        if not price.is_finite() or price < 0:
+            raise ValueError
+        return price
+    
+    if not isinstance(items, list) or not items:
+        raise ValueError("Keranjang belanja kosong")
+    
+    parsed = []
+    for number, item in enumerate(items, start=1):
+        if not isinstance(item, dict):
+            raise ValueError(f"Item ke-{number} tidak valid")
+        try:
+            medicine_id = to_int(item.get('medicine_id'))
+        except ValueError:
+            raise ValueError(f"Item ke-{number}: medicine_id tidak valid")
+        try:
+            quantity = to_int(item.get('quantity'))
+        except ValueError:
+            raise ValueError(f"Item ke-{number}: jumlah harus bilangan bulat")
+        if quantity <= 0:
+            raise ValueError(f"Item ke-{number}: jumlah harus lebih dari 0")
+        try:
+            unit_price = to_price(item.get('unit_price'))
+            total_price = to_price(item.get('total_price'))
+        except ValueError:
+            raise ValueError(f"Item ke-{number}: harga harus berupa angka")
+        parsed.append({
+            'medicine_id': medicine_id,
+            'quantity': quantity,
+            'unit_price': unit_price,
+            'total_price': total_price
+        })
+    return parsed
+
+def allocate_sale_lines(lines):
+    """Alokasikan stok untuk semua baris transaksi dengan urutan first-expiry-first-out.
+    
+    lines berupa list (medicine_id, quantity). Obat dimuat dalam satu query dan
+    semua batch yang bisa dijual dikunci dalam satu query FOR UPDATE SKIP LOCKED
+    (di dalam savepoint) agar kasir lain tidak saling menunggu. Jika batch yang
+    tidak terkunci kurang, savepoint di-rollback sehingga kuncinya lepas, lalu
+    semua obat dikunci ulang dengan satu FOR UPDATE biasa berurutan medicine_id
+    (menunggu transaksi lain) agar hasilnya tetap akurat tanpa risiko deadlock.
+    Di SQLite klausa penguncian diabaikan.
+    
+    Mengurangi batch.quantity dan stock_quantity tanpa commit, lalu mengembalikan
+    list (medicine, [(batch, jumlah), ...]) sesuai urutan lines.
+    Raise ValueError jika lines kosong, ada quantity <= 0, obat tidak ditemukan
+    atau stok tidak mencukupi.
+    """
+    if not lines:
+        raise ValueError("Keranjang belanja kosong")
+    if any(quantity <= 0 for _, quantity in lines):
+        raise ValueError("Jumlah obat harus lebih dari 0")
+    
+    medicine_ids = sorted({medicine_id for medicine_id, _ in lines})
+    medicines = {
+        medicine.id: medicine
+        for medicine in Medicine.query.filter(Medicine.id.in_(medicine_ids)).all()
+    }
+    for medicine_id in medicine_ids:
+        if medicine_id not in medicines:
+            raise ValueError(f"Medicine with ID {medicine_id} not found")
+    
+    requested = {}
+    for medicine_id, quantity in lines:
+        requested[medicine_id] = requested.get(medicine_id, 0) + quantity
+    
+    def available(batches):
+        return sum(batch.quantity for batch in batches)
+    
+    def sufficient(batches_by_medicine):
+        return all(available(batches_by_medicine[medicine_id]) >= requested[medicine_id]
+                   for medicine_id in medicine_ids)
+    
+    savepoint = db.session.begin_nested()
+    batches_by_medicine = _lock_sellable_batches(medicine_ids, skip_locked=True)
+    if sufficient(batches_by_medicine):
+        savepoint.commit()
+    else:
+        # Lepas kunci SKIP LOCKED dulu: menunggu sambil memegangnya bisa deadlock
+        # dengan transaksi lain yang mengunci obat yang sama dengan urutan berbeda
+        savepoint.rollback()
+        batches_by_medicine = _lock_sellable_batches(medicine_ids)
+    
+    for medicine_id in medicine_ids:
+        if available(batches_by_medicine[medicine_id]) < requested[medicine_id]:
+            raise ValueError(f"Stok tidak mencukupi untuk {medicines[medicine_id].name}")
+    
+    allocations = []
+    for medicine_id, quantity in lines:
+        slices, _ = split_quantity_fefo(batches_by_medicine[medicine_id], quantity)
+        for batch, take in slices:
+            batch.quantity -= take
+        allocations.append((medicines[medicine_id], slices))
+    
+    adjust_medicines_stock({medicine_id: -quantity for medicine_id, quantity in requested.items()})
+    
+    return allocations
+
 def get_expiring_medicines(days_ahead=14):
-    """Dapatkan obat yang akan kadaluwarsa dalam waktu tertentu"""
+    """Dapatkan obat yang akan kadaluwarsa dalam waktu tertentu.
+    
+    Hasil berupa list dict berisi 'medicine', 'batches' dan 'total_quantity'.
+    Selama days_ahead tercakup EXPIRY_BUCKET_DAYS, obat kandidat dibaca dari
+    medicine_expiry_buckets dan batch hanya dimuat untuk obat tersebut,
+    sehingga tabel batch tidak dipindai penuh.
+    """
+    from sqlalchemy.orm import contains_eager
+    
     cutoff_date = datetime.now().date() + timedelta(days=days_ahead)
+    days = min((bucket for bucket in EXPIRY_BUCKET_DAYS if bucket >= days_ahead), default=None)
     
-    expiring_batches = MedicineBatch.query.filter(
+    query = MedicineBatch.query.join(
+        Medicine, Medicine.id == MedicineBatch.medicine_id
+    ).filter(
+        Medicine.active == True,
         MedicineBatch.expiry_date <= cutoff_date,
         MedicineBatch.quantity > 0
-    ).all()
+    )
+    if days is not None:
+        bucket_column = getattr(MedicineExpiryBucket, f'expiring_{days}d')
+        query = query.filter(MedicineBatch.medicine_id.in_(
+            db.select(MedicineExpiryBucket.medicine_id).where(bucket_column > 0)
+        ))
+    expiring_batches = query.options(
+        contains_eager(MedicineBatch.medicine_ref)
+    ).order_by(MedicineBatch.expiry_date, MedicineBatch.id).all()
     
     medicines = {}
     for batch in expiring_batches:
@@ -376,16 +936,184 @@ def get_expiring_medicines(days_ahead=14):
     
     return list(medicines.values())
 
+def get_recent_write_offs(days=30):
+    """Ringkasan write-off dalam days hari terakhir: (jumlah unit, nilai beli)"""
+    from sqlalchemy import func
+    
+    since = datetime.utcnow() - timedelta(days=days)
+    quantity, value = db.session.query(
+        func.coalesce(func.sum(StockWriteOff.quantity), 0),
+        func.coalesce(func.sum(StockWriteOff.quantity * StockWriteOff.purchase_price), 0)
+    ).filter(StockWriteOff.created_at >= since).one()
+    return {'quantity': quantity, 'value': value}
+
 def get_low_stock_medicines():
-    """Dapatkan obat dengan stok rendah"""
-    medicines = Medicine.query.filter(Medicine.active == True).all()
-    low_stock = []
+    """Dapatkan obat dengan stok rendah (satu query berdasarkan stock_quantity)"""
+    from sqlalchemy.orm import joinedload
     
-    for medicine in medicines:
-        if medicine.is_low_stock:
-            low_stock.append(medicine)
+    return Medicine.query.options(
+        joinedload(Medicine.category_ref)
+    ).filter(
+        Medicine.active == True,
+        Medicine.is_low_stock
+    ).order_by(Medicine.id).all()
+
+def encode_cursor(*values):
+    """Encode nilai kolom keyset menjadi cursor string yang aman untuk URL"""
+    import base64
+    import json
+    
+    payload = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+def decode_cursor(cursor):
+    """Kebalikan encode_cursor; None jika cursor kosong atau tidak valid"""
+    import base64
+    import json
+    
+    if not cursor:
+        return None
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+    except (ValueError, TypeError):
+        return None
+    return values if isinstance(values, list) else None
+
+def get_inventory_page(cursor=None, limit=25, category_id=None, status=None, search=None, expiring_days=14):
+    """Satu halaman inventory dengan keyset pagination pada (name, id).
+    
+    status: 'low', 'normal', 'expiring' atau None untuk semua; 'expiring'
+    dibaca dari medicine_expiry_buckets sehingga expiring_days harus salah
+    satu nilai EXPIRY_BUCKET_DAYS.
+    Mengembalikan (list obat, cursor halaman berikutnya atau None).
+    """
+    from sqlalchemy import or_, select, tuple_
+    from sqlalchemy.orm import joinedload
+    
+    query = Medicine.query.options(
+        joinedload(Medicine.category_ref)
+    ).filter(Medicine.active == True)
+    
+    if category_id:
+        query = query.filter(Medicine.category_id == category_id)
+    
+    if status == 'low':
+        query = query.filter(Medicine.is_low_stock)
+    elif status == 'normal':
+        query = query.filter(~Medicine.is_low_stock)
+    elif status == 'expiring':
+        bucket_column = getattr(MedicineExpiryBucket, f'expiring_{expiring_days}d')
+        query = query.filter(Medicine.id.in_(
+            select(MedicineExpiryBucket.medicine_id).where(bucket_column > 0)
+        ))
+    
+    if search:
+        query = query.filter(or_(
+            Medicine.name.ilike(f'%{search}%'),
+            Medicine.generic_name.ilike(f'%{search}%'),
+            Medicine.barcode_id.ilike(f'%{search}%')
+        ))
+    
+    after = decode_cursor(cursor)
+    if after and len(after) == 2:
+        query = query.filter(tuple_(Medicine.name, Medicine.id) > tuple(after))
+    
+    medicines = query.order_by(Medicine.name, Medicine.id).limit(limit + 1).all()
+    
+    next_cursor = None
+    if len(medicines) > limit:
+        medicines = medicines[:limit]
+        next_cursor = encode_cursor(medicines[-1].name, medicines[-1].id)
+    
+    return medicines, next_cursor
+
+def paginate_newest_first(query, sort_column, id_column, cursor=None, limit=50):
+    """Keyset pagination pada (sort_column, id) menurun: terbaru dulu.
+    
+    Halaman berikutnya dimulai setelah baris terakhir (sort_column, id) < cursor,
+    sehingga biaya per halaman konstan berapa pun jumlah baris.
+    Mengembalikan (list baris, cursor halaman berikutnya atau None).
+    """
+    from sqlalchemy import tuple_
+    
+    after = decode_cursor(cursor)
+    if after and len(after) == 2:
+        try:
+            after_value = datetime.fromisoformat(after[0])
+        except (TypeError, ValueError):
+            after_value = None
+        if after_value is not None:
+            query = query.filter(tuple_(sort_column, id_column) < (after_value, after[1]))
+    
+    rows = query.order_by(sort_column.desc(), id_column.desc()).limit(limit + 1).all()
+    
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(getattr(last, sort_column.key), getattr(last, id_column.key))
+    
+    return rows, next_cursor
+
+def get_customers_page(cursor=None, limit=50, search=None, gender=None):
+    """Satu halaman daftar pelanggan, terbaru dulu, dengan filter nama/NIK dan jenis kelamin"""
+    from sqlalchemy import or_
+    
+    query = Customer.query.filter(Customer.created_at.isnot(None))
+    if search:
+        query = query.filter(or_(
+            Customer.name.ilike(f'%{search}%'),
+            Customer.nik.startswith(search)
+        ))
+    if gender:
+        query = query.filter(Customer.gender == gender)
+    
+    return paginate_newest_first(query, Customer.created_at, Customer.id, cursor, limit)
+
+def get_doctors_page(cursor=None, limit=50, search=None, specialization=None):
+    """Satu halaman daftar dokter, terbaru dulu, dengan filter nama/NIK/STR dan spesialisasi"""
+    from sqlalchemy import or_
+    
+    query = Doctor.query.filter(Doctor.created_at.isnot(None))
+    if search:
+        query = query.filter(or_(
+            Doctor.name.ilike(f'%{search}%'),
+            Doctor.nik.startswith(search),
+            Doctor.str_number.startswith(search)
+        ))
+    if specialization:
+        query = query.filter(Doctor.specialization.ilike(f'%{specialization}%'))
+    
+    return paginate_newest_first(query, Doctor.created_at, Doctor.id, cursor, limit)
+
+def get_prescriptions_page(cursor=None, limit=50, search=None, status=None):
+    """Satu halaman daftar resep, terbaru dulu, dengan filter nomor resep/pelanggan dan status"""
+    query = Prescription.query.options(*loader_options('prescription_list')).filter(
+        Prescription.uploaded_at.isnot(None)
+    )
+    if search:
+        query = query.filter(prescription_search_condition(search))
+    if status:
+        query = query.filter(Prescription.status == status)
     
-    return low_stock
+    return paginate_newest_first(query, Prescription.uploaded_at, Prescription.id, cursor, limit)
+
+def get_inventory_summary():
+    """Ringkasan kartu inventory (total, stok normal, stok rendah, kategori) dalam satu query"""
+    from sqlalchemy import func, case
+    
+    total, low_stock, categories = db.session.query(
+        func.count(Medicine.id),
+        func.coalesce(func.sum(case((Medicine.is_low_stock, 1), else_=0)), 0),
+        func.count(func.distinct(Medicine.category_id))
+    ).filter(Medicine.active == True).one()
+    
+    return {
+        'total': total,
+        'low_stock': low_stock,
+        'normal': total - low_stock,
+        'categories': categories
+    }
 
 def get_top_selling_medicines(days=30, limit=10):
     """Dapatkan obat terlaris dalam periode tertentu"""
@@ -413,68 +1141,70 @@ def get_top_selling_medicines(days=30, limit=10):
     return top_selling
 
 def get_alternative_medicines(medicine_id):
-    """Dapatkan rekomendasi obat alternatif berdasarkan kategori dan kapasitas"""
+    """Dapatkan rekomendasi obat alternatif berdasarkan kategori dan kapasitas
+    
+    Keempat prioritas dihitung dalam satu query dengan kolom peringkat (tier),
+    lalu hanya obat dari tier terbaik yang tersedia yang dikembalikan.
+    """
+    from sqlalchemy import case, or_, false
+    from sqlalchemy.orm import joinedload
+    
     medicine = Medicine.query.get(medicine_id)
     if not medicine:
         return []
     
-    # Prioritas 1: Kategori sama, kapasitas sama
-    exact_alternatives = Medicine.query.filter(
-        Medicine.id != medicine_id,
-        Medicine.category_id == medicine.category_id,
-        Medicine.capacity == medicine.capacity,
-        Medicine.active == True,
-        Medicine.total_quantity > 0
-    ).all()
+    same_category = Medicine.category_id == medicine.category_id
     
-    if exact_alternatives:
-        return exact_alternatives
+    # Prioritas 1: Kategori sama, kapasitas sama
+    exact_match = same_category & (Medicine.capacity == medicine.capacity)
     
     # Prioritas 2: Kategori sama, kapasitas numerik mirip (±20%)
+    similar_match = false()
     if medicine.capacity_numeric:
         tolerance = medicine.capacity_numeric * 0.2
-        min_capacity = medicine.capacity_numeric - tolerance
-        max_capacity = medicine.capacity_numeric + tolerance
-        
-        similar_alternatives = Medicine.query.filter(
-            Medicine.id != medicine_id,
-            Medicine.category_id == medicine.category_id,
-            Medicine.capacity_numeric.between(min_capacity, max_capacity),
-            Medicine.capacity_unit == medicine.capacity_unit,
-            Medicine.active == True,
-            Medicine.total_quantity > 0
-        ).all()
-        
-        if similar_alternatives:
-            return similar_alternatives
+        similar_match = same_category & Medicine.capacity_numeric.between(
+            medicine.capacity_numeric - tolerance,
+            medicine.capacity_numeric + tolerance
+        ) & (Medicine.capacity_unit == medicine.capacity_unit)
     
-    # Prioritas 3: Kategori sama, generic name sama
+    # Prioritas 3: Generic name sama
+    generic_match = false()
     if medicine.generic_name:
-        generic_alternatives = Medicine.query.filter(
-            Medicine.id != medicine_id,
-            Medicine.generic_name.ilike(f'%{medicine.generic_name}%'),
-            Medicine.active == True,
-            Medicine.total_quantity > 0
-        ).all()
-        
-        if generic_alternatives:
-            return generic_alternatives
+        generic_match = Medicine.generic_name.ilike(f'%{medicine.generic_name}%')
     
     # Prioritas 4: Kategori sama saja
-    category_alternatives = Medicine.query.filter(
+    tier = case(
+        (exact_match, 1),
+        (similar_match, 2),
+        (generic_match, 3),
+        else_=4
+    ).label('tier')
+    
+    rows = db.session.query(Medicine, tier).options(
+        joinedload(Medicine.category_ref)
+    ).filter(
         Medicine.id != medicine_id,
-        Medicine.category_id == medicine.category_id,
         Medicine.active == True,
-        Medicine.total_quantity > 0
-    ).limit(10).all()
+        Medicine.total_quantity > 0,
+        or_(exact_match, similar_match, generic_match, same_category)
+    ).order_by(tier, Medicine.name).all()
+    
+    if not rows:
+        return []
     
-    return category_alternatives
+    best_tier = rows[0].tier
+    alternatives = [row.Medicine for row in rows if row.tier == best_tier]
+    
+    return alternatives[:10] if best_tier == 4 else alternatives
 
 def search_alternative_medicines(query, category_id=None):
     """Pencarian obat alternatif berdasarkan query dan kategori"""
     from sqlalchemy import or_
+    from sqlalchemy.orm import joinedload
     
-    base_query = Medicine.query.filter(
+    base_query = Medicine.query.options(
+        joinedload(Medicine.category_ref)
+    ).filter(
         Medicine.active == True,
         Medicine.total_quantity > 0
     )
@@ -494,152 +1224,404 @@ def search_alternative_medicines(query, category_id=None):
     return base_query.order_by(Medicine.name).limit(20).all()
 
 def get_out_of_stock_medicines():
-    """Dapatkan obat yang habis stok"""
-    medicines = Medicine.query.filter(Medicine.active == True).all()
-    out_of_stock = []
-    
-    for medicine in medicines:
-        if medicine.total_quantity == 0:
-            out_of_stock.append(medicine)
+    """Dapatkan obat yang habis stok (satu query berdasarkan stock_quantity)"""
+    from sqlalchemy.orm import joinedload
     
-    return out_of_stock
+    return Medicine.query.options(
+        joinedload(Medicine.category_ref)
+    ).filter(
+        Medicine.active == True,
+        Medicine.total_quantity == 0
+    ).order_by(Medicine.id).all()
 
-def search_medicines_advanced(query, search_type='all'):
+def search_medicines_advanced(query, search_type='all', limit=20):
     """Pencarian obat canggih berdasarkan berbagai kriteria"""
-    from sqlalchemy import or_, and_
-    
     base_query = Medicine.query.filter(Medicine.active == True)
     
     if not query:
-        return base_query.limit(20).all()
+        return base_query.limit(limit).all()
     
     query = query.strip()
     
     if search_type == 'barcode_id':
         # Pencarian berdasarkan barcode ID
-        return base_query.filter(Medicine.barcode_id.ilike(f'%{query}%')).all()
+        condition = Medicine.barcode_id.ilike(f'%{query}%')
     
     elif search_type == 'barcode':
         # Pencarian berdasarkan barcode legacy
-        return base_query.filter(Medicine.barcode.ilike(f'%{query}%')).all()
+        condition = Medicine.barcode.ilike(f'%{query}%')
     
     elif search_type == 'capacity':
         # Pencarian berdasarkan kapasitas
-        try:
-            import re
-            # Extract numeric value from query
-            match = re.match(r'(\d+(?:\.\d+)?)', query)
-            if match:
-                numeric_value = float(match.group(1))
-                return base_query.filter(Medicine.capacity_numeric == numeric_value).all()
-            else:
-                return base_query.filter(Medicine.capacity.ilike(f'%{query}%')).all()
-        except:
-            return base_query.filter(Medicine.capacity.ilike(f'%{query}%')).all()
+        import re
+        # Extract numeric value from query
+        match = re.match(r'(\d+(?:\.\d+)?)', query)
+        if match:
+            condition = Medicine.capacity_numeric == float(match.group(1))
+        else:
+            condition = Medicine.capacity.ilike(f'%{query}%')
     
     else:
         # Pencarian umum (nama, barcode_id, barcode, capacity)
-        search_conditions = [
-            Medicine.name.ilike(f'%{query}%'),
-            Medicine.generic_name.ilike(f'%{query}%'),
-            Medicine.barcode_id.ilike(f'%{query}%'),
-            Medicine.barcode.ilike(f'%{query}%'),
-            Medicine.capacity.ilike(f'%{query}%'),
-            Medicine.manufacturer.ilike(f'%{query}%')
-        ]
-        
-        return base_query.filter(or_(*search_conditions)).limit(20).all()
+        return _search_medicines_ranked(query, limit)
+    
+    return base_query.filter(condition).order_by(Medicine.name).limit(limit).all()
+
+# Jumlah kandidat yang diurutkan di Python jika pg_trgm tidak tersedia (SQLite)
+SEARCH_CANDIDATE_LIMIT = 200
+
+def _is_postgresql():
+    return db.engine.dialect.name == 'postgresql'
 
-def search_customers(query):
-    """Pencarian pelanggan berdasarkan nama atau NIK"""
+def _trigrams(text):
+    """Himpunan trigram per kata, mengikuti cara pg_trgm memecah teks"""
+    import re
+    grams = set()
+    for word in re.findall(r'\w+', (text or '').lower()):
+        padded = f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+def trigram_similarity(text, query):
+    """Padanan Python untuk similarity() pg_trgm"""
+    text_grams, query_grams = _trigrams(text), _trigrams(query)
+    if not text_grams or not query_grams:
+        return 0.0
+    return len(text_grams & query_grams) / len(text_grams | query_grams)
+
+def _search_medicines_ranked(query, limit=20):
+    """Pencarian umum obat dengan urutan relevansi.
+    
+    Di PostgreSQL, ILIKE '%q%' dilayani oleh indeks GIN pg_trgm (lihat
+    migrate_search_indexes.py) dan hasil diurutkan dengan similarity().
+    Di database lain (SQLite untuk testing), kandidat diurutkan di Python
+    dengan trigram_similarity().
+    """
+    from sqlalchemy import or_, case, func
+    from sqlalchemy.orm import joinedload
+    
+    search_conditions = [
+        Medicine.name.ilike(f'%{query}%'),
+        Medicine.generic_name.ilike(f'%{query}%'),
+        Medicine.barcode_id.ilike(f'%{query}%'),
+        Medicine.barcode.ilike(f'%{query}%'),
+        Medicine.capacity.ilike(f'%{query}%'),
+        Medicine.manufacturer.ilike(f'%{query}%')
+    ]
+    
+    # 0: barcode/nama persis, 1: awalan nama, 2: awalan nama generik, 3: lainnya
+    lowered = query.lower()
+    match_rank = case(
+        (or_(
+            func.lower(Medicine.barcode_id) == lowered,
+            func.lower(Medicine.barcode) == lowered,
+            func.lower(Medicine.name) == lowered
+        ), 0),
+        (Medicine.name.ilike(f'{query}%'), 1),
+        (Medicine.generic_name.ilike(f'{query}%'), 2),
+        else_=3
+    ).label('match_rank')
+    
+    ranked_query = db.session.query(Medicine, match_rank).options(
+        joinedload(Medicine.category_ref)
+    ).filter(
+        Medicine.active == True,
+        or_(*search_conditions)
+    )
+    
+    if _is_postgresql():
+        similarity = func.greatest(
+            func.similarity(Medicine.name, query),
+            func.similarity(func.coalesce(Medicine.generic_name, ''), query)
+        )
+        rows = ranked_query.order_by(match_rank, similarity.desc(), Medicine.name).limit(limit).all()
+        return [row.Medicine for row in rows]
+    
+    rows = ranked_query.order_by(match_rank, Medicine.name).limit(SEARCH_CANDIDATE_LIMIT).all()
+    rows.sort(key=lambda row: (
+        row.match_rank,
+        -max(trigram_similarity(row.Medicine.name, query),
+             trigram_similarity(row.Medicine.generic_name, query)),
+        row.Medicine.name
+    ))
+    return [row.Medicine for row in rows[:limit]]
+
+# Panjang NIK; NIK lengkap dicari persis lewat indeks unik customers.nik
+NIK_LENGTH = 16
+
+# Nama dengan panjang di bawah ini dicari lewat awalan saja: pg_trgm tidak
+# punya trigram utuh untuk dipakai indeks GIN pada query sependek itu
+NAME_TRIGRAM_MIN_LENGTH = 3
+
+def _looks_like_identifier(query):
+    """Input berbentuk nomor identitas (NIK, STR): satu token yang memuat angka"""
+    import re
+    return bool(re.fullmatch(r'[\w./-]*\d[\w./-]*', query))
+
+def _search_identifier(model, query, columns, limit, substring_columns=()):
+    """Pencarian kolom identitas: kecocokan persis, lalu awalan, lalu substring.
+    
+    columns berisi pasangan (ekspresi kolom, nilai yang sudah dinormalisasi).
+    Persis dan awalan dilayani indeks btree (text_pattern_ops untuk LIKE 'q%',
+    lihat migrate_search_indexes.py). Substring (mis. 12345 pada STR-12345-2023)
+    hanya dicari pada substring_columns, yang ekspresinya harus sama persis
+    dengan indeks GIN trigram, dan hanya jika dua tahap pertama belum
+    memenuhi limit.
+    """
     from sqlalchemy import or_
     
+    stages = [
+        [column == value for column, value in columns],
+        [column.startswith(value, autoescape=True) for column, value in columns],
+        [column.contains(value, autoescape=True) for column, value in substring_columns
+         if len(value) >= NAME_TRIGRAM_MIN_LENGTH]
+    ]
+    
+    results = []
+    for conditions in stages:
+        if not conditions:
+            continue
+        found_ids = [row.id for row in results]
+        results += model.query.filter(
+            or_(*conditions),
+            ~model.id.in_(found_ids)
+        ).order_by(columns[0][0]).limit(limit - len(results)).all()
+        if len(results) >= limit:
+            break
+    return results
+
+def _search_names_ranked(model, query, columns, limit):
+    """Pencarian nama dengan urutan relevansi: awalan nama dulu, lalu kemiripan trigram.
+    
+    Kolom pertama adalah nama utama. Di PostgreSQL, ILIKE '%q%' dan operator %
+    (mirip, toleran salah ketik) dilayani indeks GIN pg_trgm dan hasil diurutkan
+    dengan similarity(); di database lain kandidat diurutkan di Python dengan
+    trigram_similarity(). Input di bawah NAME_TRIGRAM_MIN_LENGTH mencocokkan
+    awalan nama dan substring kolom lainnya.
+    """
+    from sqlalchemy import or_, case, func
+    
+    name_column = columns[0]
+    lowered = query.lower()
+    name_prefix = func.lower(name_column).startswith(lowered, autoescape=True)
+    
+    match_rank = case((name_prefix, 0), else_=1)
+    
+    if len(query) < NAME_TRIGRAM_MIN_LENGTH:
+        # Nama lewat indeks awalan; kolom lain (mis. spesialisasi) tetap substring
+        conditions = [name_prefix] + [column.icontains(query, autoescape=True) for column in columns[1:]]
+        return model.query.filter(or_(*conditions)).order_by(
+            match_rank, name_column, model.id
+        ).limit(limit).all()
+    
+    conditions = [column.ilike(f'%{query}%') for column in columns]
+    
+    if _is_postgresql():
+        conditions += [column.op('%')(query) for column in columns]
+        similarity = func.greatest(*[
+            func.similarity(func.coalesce(column, ''), query) for column in columns
+        ])
+        return model.query.filter(or_(*conditions)).order_by(
+            match_rank, similarity.desc(), name_column
+        ).limit(limit).all()
+    
+    candidates = model.query.filter(or_(*conditions)).order_by(
+        match_rank, name_column
+    ).limit(SEARCH_CANDIDATE_LIMIT).all()
+    candidates.sort(key=lambda row: (
+        not (getattr(row, name_column.key) or '').lower().startswith(lowered),
+        -max(trigram_similarity(getattr(row, column.key), query) for column in columns),
+        getattr(row, name_column.key)
+    ))
+    return candidates[:limit]
+
+def search_customers(query, limit=10):
+    """Pencarian pelanggan untuk typeahead (mis. kasir saat checkout).
+    
+    Input berupa angka dianggap NIK: NIK lengkap dicari persis, NIK sebagian
+    dicari lewat awalan. Input lain dicari pada nama dengan urutan relevansi.
+    """
     if not query:
         return []
     
     query = query.strip()
     
-    search_conditions = [
-        Customer.name.ilike(f'%{query}%'),
-        Customer.nik.ilike(f'%{query}%')
-    ]
+    if query.isdigit() and len(query) >= NIK_LENGTH:
+        return Customer.query.filter(Customer.nik == query).limit(1).all()
+    if query.isdigit():
+        return _search_identifier(Customer, query, [(Customer.nik, query)], limit)
     
-    return Customer.query.filter(or_(*search_conditions)).order_by(Customer.name).limit(10).all()
+    return _search_names_ranked(Customer, query, [Customer.name], limit)
 
-def search_doctors(query):
-    """Pencarian dokter berdasarkan nama atau nomor STR"""
-    from sqlalchemy import or_
+def search_doctors(query, limit=10):
+    """Pencarian dokter untuk typeahead.
+    
+    Input berbentuk nomor identitas dicari persis/awalan pada NIK dan nomor STR,
+    lalu substring pada upper(str_number) (indeks trigram); input lain dicari
+    pada nama, spesialisasi dan nomor STR dengan urutan relevansi.
+    """
+    from sqlalchemy import func
     
     if not query:
         return []
     
     query = query.strip()
     
-    search_conditions = [
-        Doctor.name.ilike(f'%{query}%'),
-        Doctor.str_number.ilike(f'%{query}%'),
-        Doctor.specialization.ilike(f'%{query}%')
-    ]
+    if _looks_like_identifier(query):
+        str_number = (func.upper(Doctor.str_number), query.upper())
+        return _search_identifier(Doctor, query, [(Doctor.nik, query), str_number], limit,
+                                  substring_columns=[str_number])
+    
+    return _search_names_ranked(Doctor, query, [Doctor.name, Doctor.specialization, Doctor.str_number], limit)
+
+def prescription_search_condition(search):
+    """Kondisi pencarian resep berdasarkan nomor resep atau nama pelanggan.
+    
+    Nomor resep (RX-YYYYMMDD-XXXXXXXX, atau tanggalnya saja) dicari lewat
+    awalan yang dilayani indeks text_pattern_ops; selain itu dicari pada nama
+    pelanggan lewat indeks trigram (lihat migrate_search_indexes.py).
+    """
+    from sqlalchemy import func
+    
+    search = search.strip()
+    number = search.upper()
+    if number.isdigit():
+        number = f'RX-{number}'
+    if number.startswith('RX'):
+        return Prescription.prescription_number.startswith(number, autoescape=True)
+    
+    if len(search) < NAME_TRIGRAM_MIN_LENGTH:
+        name_condition = func.lower(Customer.name).startswith(search.lower(), autoescape=True)
+    else:
+        name_condition = Customer.name.ilike(f'%{search}%')
+    return Prescription.customer_id.in_(db.select(Customer.id).where(name_condition))
+
+def search_prescriptions(query=None, status=None, date_from=None, date_to=None, limit=10):
+    """Pencarian resep terbaru dulu, hanya kolom yang ditampilkan (tanpa objek ORM).
+    
+    Filter status dan rentang tanggal upload dilayani indeks
+    (status, uploaded_at); date_to inklusif.
+    """
+    select = db.select(
+        Prescription.id,
+        Prescription.prescription_number,
+        Prescription.status,
+        Prescription.prescription_date,
+        Prescription.uploaded_at,
+        Customer.name.label('customer_name'),
+        Doctor.name.label('doctor_name')
+    ).join(Customer, Prescription.customer_id == Customer.id).join(
+        Doctor, Prescription.doctor_id == Doctor.id
+    )
     
-    return Doctor.query.filter(or_(*search_conditions)).order_by(Doctor.name).limit(10).all()
+    if query:
+        select = select.where(prescription_search_condition(query))
+    if status:
+        select = select.where(Prescription.status == status)
+    if date_from:
+        select = select.where(Prescription.uploaded_at >= datetime.combine(date_from, datetime.min.time()))
+    if date_to:
+        select = select.where(Prescription.uploaded_at < datetime.combine(date_to + timedelta(days=1), datetime.min.time()))
+    
+    return db.session.execute(
+        select.order_by(Prescription.uploaded_at.desc(), Prescription.id.desc()).limit(limit)
+    ).all()
+
+def _restock_notification_row(medicine, user_id, created_at):
+    """Baris insert notifikasi stok rendah untuk satu user"""
+    return {
+        'title': f'Perlu Restock: {medicine.name}',
+        'message': f'Obat {medicine.name} stok rendah (sisa: {medicine.stock_quantity or 0}). Minimum stok: {medicine.minimum_stock}',
+        'type': 'low_stock',
+        'is_read': False,
+        'user_id': user_id,
+        'medicine_id': medicine.id,
+        'priority': 'high',
+        'created_at': created_at
+    }
+
+def _restock_recipient_ids():
+    """Id user admin dan restoker penerima notifikasi stok rendah"""
+    return db.session.execute(
+        db.select(User.id).where(User.role.in_(['admin', 'restoker']))
+    ).scalars().all()
 
 def create_restock_notification(medicine_id):
-    """Buat notifikasi restock untuk obat tertentu"""
-    medicine = Medicine.query.get(medicine_id)
+    """Buat notifikasi restock untuk obat tertentu (commit dilakukan pemanggil)"""
+    from sqlalchemy import insert
+    
+    medicine = db.session.get(Medicine, medicine_id)
     if not medicine:
         return
     
-    # Buat notifikasi untuk admin dan restoker
-    from models import User
-    admin_restoker_users = User.query.filter(User.role.in_(['admin', 'restoker'])).all()
-    
-    for user in admin_restoker_users:
-        notification = Notification(
-            title=f'Perlu Restock: {medicine.name}',
-            message=f'Obat {medicine.name} stok rendah (sisa: {medicine.total_quantity}). Minimum stok: {medicine.minimum_stock}',
-            type='low_stock',
-            user_id=user.id,
-            medicine_id=medicine_id,
-            priority='high'
-        )
-        db.session.add(notification)
+    # Satu insert executemany untuk semua admin dan restoker
+    now = datetime.utcnow()
+    rows = [_restock_notification_row(medicine, user_id, now) for user_id in _restock_recipient_ids()]
+    if rows:
+        db.session.execute(insert(Notification), rows)
+
+def create_low_stock_notifications(medicine_ids=None, since_hours=24):
+    """Buat notifikasi stok rendah secara bulk (commit dilakukan pemanggil).
     
-    db.session.commit()
+    Obat stok rendah dan obat yang sudah dinotifikasi dalam since_hours terakhir
+    masing-masing diambil dengan satu query, lalu notifikasi untuk semua
+    admin/restoker disisipkan dengan satu insert executemany. medicine_ids
+    membatasi pemeriksaan ke obat tertentu. Mengembalikan id obat yang dinotifikasi.
+    """
+    from sqlalchemy import insert
+    
+    if medicine_ids is not None and not medicine_ids:
+        return []
+    
+    query = db.session.query(
+        Medicine.id, Medicine.name, Medicine.stock_quantity, Medicine.minimum_stock
+    ).filter(
+        Medicine.active == True,
+        Medicine.is_low_stock
+    )
+    if medicine_ids is not None:
+        query = query.filter(Medicine.id.in_(medicine_ids))
+    low_stock_medicines = query.order_by(Medicine.id).all()
+    if not low_stock_medicines:
+        return []
+    
+    notified_ids = set(db.session.execute(
+        db.select(Notification.medicine_id).where(
+            Notification.type == 'low_stock',
+            Notification.medicine_id.isnot(None),
+            Notification.created_at >= datetime.utcnow() - timedelta(hours=since_hours)
+        ).distinct()
+    ).scalars())
+    
+    medicines = [medicine for medicine in low_stock_medicines if medicine.id not in notified_ids]
+    user_ids = _restock_recipient_ids() if medicines else []
+    if not user_ids:
+        return []
+    
+    now = datetime.utcnow()
+    db.session.execute(insert(Notification), [
+        _restock_notification_row(medicine, user_id, now)
+        for medicine in medicines
+        for user_id in user_ids
+    ])
+    return [medicine.id for medicine in medicines]
 
 def notify_customers_restock(medicine_id, quantity_restocked):
-    """Notifikasi pelanggan yang ada di waitlist ketika obat direstock"""
-    waitlist_customers = CustomerWaitlist.query.filter(
-        CustomerWaitlist.medicine_id == medicine_id,
-        CustomerWaitlist.is_notified == False
-    ).all()
+    """Notifikasi pelanggan yang ada di waitlist ketika obat direstock.
     
-    medicine = Medicine.query.get(medicine_id)
-    if not medicine:
-        return
+    Event ditulis ke outbox dalam transaksi pemanggil (tanpa commit); pesan
+    WhatsApp dan status waitlist diperbarui oleh worker outbox.
+    """
+    from outbox import publish
     
-    for waitlist_item in waitlist_customers:
-        customer = waitlist_item.customer
-        
-        # Buat notifikasi sistem
-        notification = Notification(
-            title=f'Obat {medicine.name} Tersedia Kembali!',
-            message=f'Obat {medicine.name} yang Anda tunggu sudah tersedia kembali di apotek kami. Stok: {medicine.total_quantity} unit.',
-            type='customer_notification',
-            customer_id=customer.id,
-            medicine_id=medicine_id,
-            priority='normal'
-        )
-        db.session.add(notification)
-        
-        # Update waitlist status
-        waitlist_item.is_notified = True
-        waitlist_item.notified_at = datetime.utcnow()
-        
-        # Log for WhatsApp/SMS integration (placeholder for future implementation)
-        print(f"SEND WhatsApp to {customer.whatsapp}: Obat {medicine.name} sudah tersedia kembali!")
+    waitlist_count = CustomerWaitlist.query.filter(
+        CustomerWaitlist.medicine_id == medicine_id,
+        CustomerWaitlist.is_notified == False
+    ).count()
     
-    db.session.commit()
-    return len(waitlist_customers)
+    if waitlist_count:
+        publish('medicine_restocked', {'medicine_id': medicine_id, 'quantity_restocked': quantity_restocked})
+    return waitlist_count
 
 def add_customer_to_waitlist(customer_id, medicine_id, quantity_needed, notes=None):
     """Tambah pelanggan ke waitlist untuk obat yang habis"""
@@ -670,20 +1652,81 @@ def add_customer_to_waitlist(customer_id, medicine_id, quantity_needed, notes=No
     db.session.commit()
     return waitlist_item
 
+def create_expiry_notifications(days_ahead=14, since_hours=24):
+    """Buat notifikasi obat yang akan/sudah kadaluwarsa secara bulk (commit dilakukan pemanggil).
+    
+    Sama seperti create_low_stock_notifications: satu query agregat batch per
+    obat, satu query obat yang sudah dinotifikasi, lalu satu insert executemany.
+    Mengembalikan id obat yang dinotifikasi.
+    """
+    from sqlalchemy import insert, func, case
+    
+    today = datetime.now().date()
+    cutoff_date = today + timedelta(days=days_ahead)
+    expiring = db.session.query(
+        Medicine.id,
+        Medicine.name,
+        func.min(MedicineBatch.expiry_date).label('earliest_expiry'),
+        func.sum(MedicineBatch.quantity).label('quantity'),
+        func.sum(case((MedicineBatch.expiry_date <= today, MedicineBatch.quantity), else_=0)).label('expired_quantity')
+    ).join(
+        MedicineBatch, MedicineBatch.medicine_id == Medicine.id
+    ).filter(
+        Medicine.active == True,
+        MedicineBatch.expiry_date <= cutoff_date,
+        MedicineBatch.quantity > 0
+    ).group_by(Medicine.id, Medicine.name).order_by(Medicine.id).all()
+    if not expiring:
+        return []
+    
+    notified_ids = set(db.session.execute(
+        db.select(Notification.medicine_id).where(
+            Notification.type == 'expiry',
+            Notification.medicine_id.isnot(None),
+            Notification.created_at >= datetime.utcnow() - timedelta(hours=since_hours)
+        ).distinct()
+    ).scalars())
+    
+    medicines = [medicine for medicine in expiring if medicine.id not in notified_ids]
+    user_ids = _restock_recipient_ids() if medicines else []
+    if not user_ids:
+        return []
+    
+    now = datetime.utcnow()
+    rows = []
+    for medicine in medicines:
+        expiring_quantity = medicine.quantity - medicine.expired_quantity
+        parts = []
+        if medicine.expired_quantity:
+            parts.append(f'{medicine.expired_quantity} unit sudah kadaluwarsa')
+        if expiring_quantity:
+            parts.append(f'{expiring_quantity} unit kadaluwarsa sebelum {cutoff_date.strftime("%d/%m/%Y")}')
+        message = f'Obat {medicine.name}: {", ".join(parts)} (batch terdekat {medicine.earliest_expiry.strftime("%d/%m/%Y")})'
+        for user_id in user_ids:
+            rows.append({
+                'title': f'Segera Kadaluwarsa: {medicine.name}',
+                'message': message,
+                'type': 'expiry',
+                'is_read': False,
+                'user_id': user_id,
+                'medicine_id': medicine.id,
+                'priority': 'high' if medicine.earliest_expiry <= today + timedelta(days=7) else 'normal',
+                'created_at': now
+            })
+    db.session.execute(insert(Notification), rows)
+    return [medicine.id for medicine in medicines]
+
+def check_and_create_expiry_notifications(days_ahead=14):
+    """Periksa obat yang akan kadaluwarsa dan buat notifikasi"""
+    notified_ids = create_expiry_notifications(days_ahead)
+    db.session.commit()
+    return notified_ids
+
 def check_and_create_low_stock_notifications():
     """Periksa obat dengan stok rendah dan buat notifikasi"""
-    low_stock_medicines = get_low_stock_medicines()
-    
-    for medicine in low_stock_medicines:
-        # Check if notification already exists for this medicine in the last 24 hours
-        existing_notification = Notification.query.filter(
-            Notification.medicine_id == medicine.id,
-            Notification.type == 'low_stock',
-            Notification.created_at >= datetime.utcnow() - timedelta(hours=24)
-        ).first()
-        
-        if not existing_notification:
-            create_restock_notification(medicine.id)
+    notified_ids = create_low_stock_notifications()
+    db.session.commit()
+    return notified_ids
 
 def get_customer_waitlist_summary():
     """Dapatkan ringkasan waitlist pelanggan"""
@@ -0,0 +1,132 @@
+"""
+Transactional outbox: event ditulis bersama perubahan stok, diproses worker terpisah
+"""
+import json
+from datetime import datetime, timedelta
+
+from database import db
+
+# Registry handler: event_type -> fungsi(payload) yang hanya menulis ke database
+OUTBOX_HANDLERS = {}
+
+def outbox_handler(event_type):
+    """Daftarkan handler untuk satu jenis event outbox"""
+    def decorator(func):
+        OUTBOX_HANDLERS[event_type] = func
+        return func
+    return decorator
+
+def publish(event_type, payload):
+    """Tambahkan event ke outbox dalam transaksi yang sedang berjalan (tanpa commit)"""
+    from models import OutboxEvent
+
+    if event_type not in OUTBOX_HANDLERS:
+        raise ValueError(f'Event outbox tidak dikenal: {event_type}')
+
+    event = OutboxEvent(event_type=event_type, payload=json.dumps(payload), status='pending')
+    db.session.add(event)
+    return event
+
+@outbox_handler('medicine_restocked')
+def _handle_medicine_restocked(payload):
+    """Antrikan pesan WhatsApp untuk pelanggan di waitlist obat yang direstock"""
+    from whatsapp_service import whatsapp_service
+    queued, skipped = whatsapp_service.enqueue_restock_notifications(payload['medicine_id'])
+    return queued
+
+@outbox_handler('waitlist_notify')
+def _handle_waitlist_notify(payload):
+    """Antrikan pesan WhatsApp untuk satu entri waitlist"""
+    from models import CustomerWaitlist
+    from whatsapp_service import whatsapp_service
+
+    waitlist = db.session.get(CustomerWaitlist, payload['waitlist_id'])
+    if not waitlist or waitlist.is_notified:
+        return 0
+    queued, skipped = whatsapp_service.enqueue_restock_notifications(
+        waitlist.medicine_id, waitlist_ids=[waitlist.id]
+    )
+    return queued
+
+@outbox_handler('stock_decreased')
+def _handle_stock_decreased(payload):
+    """Perbarui bucket kadaluwarsa dan buat notifikasi stok rendah untuk obat yang baru saja terjual"""
+    from models import create_low_stock_notifications, refresh_expiry_buckets
+    refresh_expiry_buckets(payload['medicine_ids'])
+    create_low_stock_notifications(payload['medicine_ids'])
+    return 0
+
+class OutboxProcessor:
+    """Memproses outbox_events secara batch.
+
+    Satu batch diambil dengan FOR UPDATE SKIP LOCKED (PostgreSQL) sehingga
+    beberapa worker tidak memproses event yang sama. Setiap handler berjalan
+    dalam savepoint; efeknya di-commit bersama status 'processed' sehingga
+    event tidak diproses dua kali. Event gagal dicoba ulang dengan backoff.
+    """
+
+    def __init__(self, batch_size=100, max_attempts=5, backoff_seconds=30):
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+
+    def drain_batch(self):
+        """Proses satu batch event; mengembalikan (jumlah event, jumlah pesan diantrikan)"""
+        from models import OutboxEvent
+
+        now = datetime.utcnow()
+        events = OutboxEvent.query.filter(
+            OutboxEvent.status == 'pending',
+            OutboxEvent.available_at <= now
+        ).order_by(OutboxEvent.id).limit(self.batch_size).with_for_update(skip_locked=True).all()
+
+        queued_messages = 0
+        for event in events:
+            event.attempts += 1
+            try:
+                with db.session.begin_nested():
+                    queued_messages += OUTBOX_HANDLERS[event.event_type](json.loads(event.payload)) or 0
+                event.status = 'processed'
+                event.processed_at = now
+                event.last_error = None
+            except Exception as e:
+                event.last_error = str(e)
+                if event.attempts >= self.max_attempts:
+                    event.status = 'failed'
+                else:
+                    event.available_at = now + timedelta(seconds=self.backoff_seconds * 2 ** (event.attempts - 1))
+                print(f"Outbox event {event.id} ({event.event_type}) gagal: {str(e)}")
+
+        db.session.commit()
+        return len(events), queued_messages
+
+    def drain(self):
+        """Proses semua event jatuh tempo, lalu kirim pesan WhatsApp yang diantrikan"""
+        from whatsapp_dispatcher import whatsapp_dispatcher
+
+        processed = queued_messages = 0
+        while True:
+            count, queued = self.drain_batch()
+            processed += count
+            queued_messages += queued
+            if count < self.batch_size:
+                break
+
+        if queued_messages:
+            whatsapp_dispatcher.dispatch_pending()
+        return processed
+
+    def cleanup(self, retention_days=7):
+        """Hapus event yang sudah diproses lebih dari retention_days"""
+        from models import OutboxEvent
+
+        cutoff = datetime.utcnow() - timedelta(days=retention_days)
+        deleted = OutboxEvent.query.filter(
+            OutboxEvent.status == 'processed',
+            OutboxEvent.processed_at < cutoff
+        ).delete(synchronize_session=False)
+        db.session.commit()
+        return deleted
+
+# Instance global untuk digunakan di seluruh aplikasi
+outbox_processor = OutboxProcessor()
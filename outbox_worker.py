@@ -0,0 +1,48 @@
+"""
+Worker outbox terpisah dari proses web.
+
+Memproses outbox_events (notifikasi restock, stok rendah) lalu mengirim pesan
+WhatsApp yang diantrikan. Beberapa worker boleh berjalan bersamaan karena
+event diklaim dengan FOR UPDATE SKIP LOCKED.
+
+Contoh:
+    python outbox_worker.py --interval 5
+    python outbox_worker.py --once
+"""
+import argparse
+import os
+import time
+
+# Job periodik dijalankan proses web; worker ini tidak memulai scheduler sendiri
+os.environ.setdefault('RUN_SCHEDULER', '0')
+
+from main import app
+from database import db
+from outbox import outbox_processor
+
+def main():
+    parser = argparse.ArgumentParser(description='Worker pemroses outbox notifikasi')
+    parser.add_argument('--interval', type=float, default=5.0, help='Jeda antar polling (detik)')
+    parser.add_argument('--once', action='store_true', help='Proses event yang ada lalu keluar')
+    args = parser.parse_args()
+
+    print(f"Outbox worker berjalan (interval {args.interval} detik)")
+    while True:
+        with app.app_context():
+            try:
+                processed = outbox_processor.drain()
+                if processed:
+                    print(f"{processed} event outbox diproses")
+            except Exception as e:
+                db.session.rollback()
+                print(f"Outbox worker error: {str(e)}")
+        if args.once:
+            break
+        try:
+            time.sleep(args.interval)
+        except KeyboardInterrupt:
+            print("Outbox worker dihentikan")
+            break
+
+if __name__ == '__main__':
+    main()
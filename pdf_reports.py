@@ -0,0 +1,267 @@
+"""
+Pembuatan laporan PDF (reportlab) yang dipakai route dan job export
+"""
+import copy
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from io import BytesIO
+
+try:
+    from reportlab.lib.pagesizes import A4, letter
+    from reportlab.lib.units import inch
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Image
+    from reportlab.lib import colors
+    REPORTLAB_AVAILABLE = True
+except ImportError:
+    REPORTLAB_AVAILABLE = False
+
+def get_shortage_items(prescription):
+    """Item resep yang tidak tersedia atau stoknya kurang"""
+    shortage_items = []
+    for item in prescription.prescription_items:
+        available_qty = item.medicine.total_quantity if item.medicine else 0
+        if not item.is_available or (item.medicine and available_qty < item.quantity):
+            shortage_items.append({
+                'medicine_name': item.medicine_name,
+                'requested_quantity': item.quantity,
+                'available_quantity': available_qty,
+                'shortage_quantity': item.quantity - available_qty,
+                'dosage': item.dosage,
+                'instructions': item.instructions
+            })
+    return shortage_items
+
+def build_shortage_report_pdf(output, prescription, profile):
+    """Tulis laporan kekurangan obat resep ke output (path atau file object)"""
+    doc = SimpleDocTemplate(output, pagesize=A4)
+    styles = getSampleStyleSheet()
+    story = []
+
+    # Header
+    if profile:
+        story.append(Paragraph(f"<b>{profile.name}</b>", styles['Title']))
+        story.append(Paragraph(profile.address, styles['Normal']))
+    else:
+        story.append(Paragraph("<b>APOTEK MANAGEMENT</b>", styles['Title']))
+    story.append(Spacer(1, 20))
+
+    # Report title
+    story.append(Paragraph("<b>LAPORAN KEKURANGAN OBAT RESEP</b>", styles['Heading2']))
+    story.append(Spacer(1, 10))
+
+    # Prescription info
+    info_data = [
+        ['No. Resep:', prescription.prescription_number],
+        ['Tanggal:', prescription.prescription_date.strftime('%d/%m/%Y')],
+        ['Pasien:', prescription.customer.name],
+        ['Dokter:', prescription.doctor.name],
+        ['Diagnosis:', prescription.diagnosis or '-']
+    ]
+
+    info_table = Table(info_data, colWidths=[2*inch, 4*inch])
+    info_table.setStyle(TableStyle([
+        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 10),
+    ]))
+    story.append(info_table)
+    story.append(Spacer(1, 20))
+
+    # Shortage items table
+    shortage_data = [['Obat', 'Diminta', 'Tersedia', 'Kurang', 'Dosis', 'Instruksi']]
+    for item in get_shortage_items(prescription):
+        shortage_data.append([
+            item['medicine_name'],
+            str(item['requested_quantity']),
+            str(item['available_quantity']),
+            str(item['shortage_quantity']),
+            item['dosage'] or '-',
+            item['instructions'] or '-'
+        ])
+
+    if len(shortage_data) > 1:
+        shortage_table = Table(shortage_data, colWidths=[2*inch, 0.8*inch, 0.8*inch, 0.8*inch, 1*inch, 1.5*inch])
+        shortage_table.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (1, 1), (3, -1), 'CENTER'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, -1), 9),
+            ('GRID', (0, 0), (-1, -1), 1, colors.black),
+        ]))
+        story.append(shortage_table)
+    else:
+        story.append(Paragraph("Tidak ada kekurangan obat untuk resep ini.", styles['Normal']))
+
+    story.append(Spacer(1, 30))
+
+    # Footer
+    footer = Paragraph(f"<i>Laporan dibuat pada: {datetime.now().strftime('%d/%m/%Y %H:%M')}</i>", styles['Normal'])
+    story.append(footer)
+
+    doc.build(story)
+
+class ReceiptRenderer:
+    """Render struk PDF ke memori dengan cache.
+
+    Stylesheet dan flowable header (nama, alamat, logo apotek) disiapkan sekali
+    per versi PharmacyProfile (updated_at). PDF yang sudah jadi disimpan dalam
+    LRU dengan kunci (sale_id, profile.updated_at) sehingga cetak ulang tidak
+    merender ulang; perubahan profil otomatis menghasilkan kunci baru.
+    """
+
+    def __init__(self, max_entries=128):
+        self.max_entries = max_entries
+        self._receipts = OrderedDict()
+        self._template_version = None
+        self._template = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def profile_version(profile):
+        return (profile.id, profile.updated_at) if profile else None
+
+    def _logo_path(self, profile, static_folder):
+        if not profile or not profile.logo_url or not profile.logo_url.startswith('/static/'):
+            return None
+        path = os.path.join(static_folder, profile.logo_url[len('/static/'):])
+        return path if os.path.exists(path) else None
+
+    def _build_template(self, profile, static_folder):
+        """Stylesheet dan flowable header untuk satu versi profil"""
+        styles = getSampleStyleSheet()
+        header = []
+
+        logo_path = self._logo_path(profile, static_folder)
+        if logo_path:
+            try:
+                header.append(Image(logo_path, width=0.8*inch, height=0.8*inch, kind='proportional'))
+            except Exception as e:
+                print(f"Logo apotek tidak dapat dimuat: {str(e)}")
+
+        if profile:
+            header.append(Paragraph(f"<b>{profile.name}</b>", styles['Title']))
+            header.append(Paragraph(profile.address, styles['Normal']))
+            header.append(Paragraph(f"Telp: {profile.phone} | Email: {profile.email}", styles['Normal']))
+            header.append(Paragraph(f"SIPA: {profile.license_number}", styles['Normal']))
+        else:
+            header.append(Paragraph("<b>APOTEK MANAGEMENT</b>", styles['Title']))
+        header.append(Spacer(1, 20))
+
+        return styles, header
+
+    def _get_template(self, profile, static_folder):
+        version = self.profile_version(profile)
+        with self._lock:
+            if self._template is None or self._template_version != version:
+                self._template = self._build_template(profile, static_folder)
+                self._template_version = version
+            return self._template
+
+    def render(self, sale, profile, static_folder):
+        """Render struk penjualan ke bytes PDF (tanpa file sementara)"""
+        styles, header = self._get_template(profile, static_folder)
+
+        buffer = BytesIO()
+        doc = SimpleDocTemplate(buffer, pagesize=letter)
+
+        # Salinan dangkal: markup header tidak di-parse ulang, state layout per dokumen
+        story = [copy.copy(flowable) for flowable in header]
+
+        # Receipt title
+        story.append(Paragraph("<b>STRUK PEMBAYARAN</b>", styles['Heading2']))
+        story.append(Spacer(1, 10))
+
+        # Transaction info
+        info_data = [
+            ['No. Invoice:', sale.invoice_number],
+            ['Tanggal:', sale.created_at.strftime('%d/%m/%Y %H:%M')],
+            ['Pelanggan:', sale.customer_name or 'Umum'],
+            ['Kasir:', sale.cashier.full_name],
+            ['Pembayaran:', (sale.payment_method or 'cash').replace('_', ' ').title()]
+        ]
+
+        # Add cash payment details if applicable
+        if sale.payment_method == 'cash' and sale.cash_amount:
+            info_data.extend([
+                ['Jumlah Bayar:', f'Rp {float(sale.cash_amount):,.0f}'],
+                ['Kembalian:', f'Rp {float(sale.change_amount or 0):,.0f}']
+            ])
+
+        info_table = Table(info_data, colWidths=[2*inch, 4*inch])
+        info_table.setStyle(TableStyle([
+            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, -1), 10),
+        ]))
+        story.append(info_table)
+        story.append(Spacer(1, 20))
+
+        # Items table
+        item_data = [['Item', 'Qty', 'Harga', 'Total']]
+        total_amount = 0
+
+        for item in sale.receipt_items:
+            item_data.append([
+                item.medicine_ref.name,
+                str(item.quantity),
+                f"Rp {item.unit_price:,.0f}",
+                f"Rp {item.total_price:,.0f}"
+            ])
+            total_amount += float(item.total_price)
+
+        # Add total row
+        item_data.append(['', '', 'TOTAL:', f"Rp {total_amount:,.0f}"])
+
+        items_table = Table(item_data, colWidths=[3*inch, 0.7*inch, 1.2*inch, 1.5*inch])
+        items_table.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (1, 1), (-1, -1), 'RIGHT'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, -1), 9),
+            ('GRID', (0, 0), (-1, -2), 1, colors.black),
+            ('LINEABOVE', (0, -1), (-1, -1), 2, colors.black),
+            ('BACKGROUND', (0, -1), (-1, -1), colors.lightgrey),
+        ]))
+        story.append(items_table)
+        story.append(Spacer(1, 30))
+
+        # Footer
+        footer = Paragraph("<i>Terima kasih atas kunjungan Anda!<br/>Barang yang sudah dibeli tidak dapat dikembalikan</i>", styles['Normal'])
+        story.append(footer)
+
+        doc.build(story)
+        return buffer.getvalue()
+
+    def get_cached(self, sale_id, profile):
+        key = (sale_id, self.profile_version(profile))
+        with self._lock:
+            receipt = self._receipts.get(key)
+            if receipt is not None:
+                self._receipts.move_to_end(key)
+            return receipt
+
+    def store(self, sale_id, profile, receipt):
+        key = (sale_id, self.profile_version(profile))
+        with self._lock:
+            self._receipts[key] = receipt
+            self._receipts.move_to_end(key)
+            while len(self._receipts) > self.max_entries:
+                self._receipts.popitem(last=False)
+
+    def get_receipt_pdf(self, sale_id, load_sale, profile, static_folder):
+        """(invoice_number, bytes PDF) dari cache, atau dirender dari load_sale() jika belum ada"""
+        receipt = self.get_cached(sale_id, profile)
+        if receipt is None:
+            sale = load_sale()
+            receipt = (sale.invoice_number, self.render(sale, profile, static_folder))
+            self.store(sale_id, profile, receipt)
+        return receipt
+
+# Instance global untuk digunakan di seluruh aplikasi
+receipt_renderer = ReceiptRenderer()
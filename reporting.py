@@ -0,0 +1,84 @@
+"""
+Fungsi laporan penjualan berbasis agregasi SQL
+"""
+from datetime import datetime
+
+from sqlalchemy import func
+
+from database import db
+
+def month_range(day=None):
+    """Rentang [awal bulan, awal bulan berikutnya) untuk tanggal tertentu"""
+    day = day or datetime.now().date()
+    start = datetime(day.year, day.month, 1)
+    if day.month == 12:
+        end = datetime(day.year + 1, 1, 1)
+    else:
+        end = datetime(day.year, day.month + 1, 1)
+    return start, end
+
+def get_sales_summary(start, end):
+    """Jumlah transaksi, total dan rata-rata penjualan dalam rentang [start, end)"""
+    from models import Sale
+
+    count, total, average = db.session.query(
+        func.count(Sale.id),
+        func.coalesce(func.sum(Sale.total_amount), 0),
+        func.coalesce(func.avg(Sale.total_amount), 0)
+    ).filter(
+        Sale.created_at >= start,
+        Sale.created_at < end
+    ).one()
+
+    return {
+        'count': count,
+        'total': float(total),
+        'average': float(average)
+    }
+
+def get_daily_sales(start, end):
+    """Jumlah transaksi dan total penjualan per hari"""
+    from models import Sale
+
+    day = func.date(Sale.created_at)
+    rows = db.session.query(
+        day.label('day'),
+        func.count(Sale.id).label('count'),
+        func.coalesce(func.sum(Sale.total_amount), 0).label('total')
+    ).filter(
+        Sale.created_at >= start,
+        Sale.created_at < end
+    ).group_by(day).order_by(day).all()
+
+    return [{'day': str(row.day), 'count': row.count, 'total': float(row.total)} for row in rows]
+
+def get_payment_method_breakdown(start, end):
+    """Jumlah transaksi dan total penjualan per metode pembayaran"""
+    from models import Sale
+
+    rows = db.session.query(
+        Sale.payment_method,
+        func.count(Sale.id).label('count'),
+        func.coalesce(func.sum(Sale.total_amount), 0).label('total')
+    ).filter(
+        Sale.created_at >= start,
+        Sale.created_at < end
+    ).group_by(Sale.payment_method).order_by(func.count(Sale.id).desc()).all()
+
+    return [{
+        'payment_method': row.payment_method or 'cash',
+        'count': row.count,
+        'total': float(row.total)
+    } for row in rows]
+
+def get_recent_sales(start, end, limit=10):
+    """Transaksi terbaru dalam rentang, dengan data kasir dimuat sekaligus"""
+    from sqlalchemy.orm import joinedload
+    from models import Sale
+
+    return Sale.query.options(
+        joinedload(Sale.cashier)
+    ).filter(
+        Sale.created_at >= start,
+        Sale.created_at < end
+    ).order_by(Sale.created_at.desc(), Sale.id.desc()).limit(limit).all()
@@ -4,7 +4,6 @@ Route handlers untuk aplikasi manajemen apotek
 from flask import render_template, request, redirect, url_for, flash, jsonify, send_file
 from flask_login import login_required, current_user
 from datetime import datetime, timedelta
-import openpyxl
 from io import BytesIO
 import os
 from werkzeug.utils import secure_filename
@@ -18,14 +17,55 @@ def register_routes(app):
     @app.route('/customers')
     @login_required
     def customers():
-        """Halaman manajemen pelanggan"""
-        from models import Customer
+        """Halaman manajemen pelanggan (keyset pagination, terbaru dulu)"""
+        from models import get_customers_page
         if not current_user.can_serve_customers():
             flash('Anda tidak memiliki akses ke halaman ini!', 'error')
             return redirect(url_for('dashboard'))
         
-        customers = Customer.query.order_by(Customer.created_at.desc()).all()
-        return render_template('customers.html', customers=customers)
+        filters = {
+            'q': request.args.get('q', '').strip(),
+            'gender': request.args.get('gender', '')
+        }
+        customers, next_cursor = get_customers_page(
+            cursor=request.args.get('cursor'),
+            search=filters['q'] or None,
+            gender=filters['gender'] or None
+        )
+        return render_template('customers.html', customers=customers, next_cursor=next_cursor,
+                               filters=filters, is_first_page=not request.args.get('cursor'))
+    
+    @app.route('/api/customers')
+    @login_required
+    def api_customers():
+        """API daftar pelanggan dengan keyset pagination dan filter"""
+        from models import get_customers_page
+        if not current_user.can_serve_customers():
+            return jsonify({'success': False, 'message': 'Akses ditolak'}), 403
+        
+        limit = max(1, min(request.args.get('limit', 50, type=int), 100))
+        customers, next_cursor = get_customers_page(
+            cursor=request.args.get('cursor'),
+            limit=limit,
+            search=request.args.get('q', '').strip() or None,
+            gender=request.args.get('gender') or None
+        )
+        
+        return jsonify({
+            'items': [{
+                'id': customer.id,
+                'nik': customer.nik,
+                'name': customer.name,
+                'age': customer.age,
+                'gender': customer.gender,
+                'phone': customer.phone,
+                'whatsapp': customer.whatsapp,
+                'email': customer.email,
+                'created_at': customer.created_at.isoformat(),
+                'edit_url': url_for('edit_customer', customer_id=customer.id)
+            } for customer in customers],
+            'next_cursor': next_cursor
+        })
     
     @app.route('/customers/add', methods=['GET', 'POST'])
     @login_required
@@ -102,14 +142,56 @@ def register_routes(app):
     @app.route('/doctors')
     @login_required
     def doctors():
-        """Halaman manajemen dokter"""
-        from models import Doctor
+        """Halaman manajemen dokter (keyset pagination, terbaru dulu)"""
+        from models import get_doctors_page
         if not current_user.can_serve_customers():
             flash('Anda tidak memiliki akses ke halaman ini!', 'error')
             return redirect(url_for('dashboard'))
         
-        doctors = Doctor.query.order_by(Doctor.created_at.desc()).all()
-        return render_template('doctors.html', doctors=doctors)
+        filters = {
+            'q': request.args.get('q', '').strip(),
+            'specialization': request.args.get('specialization', '').strip()
+        }
+        doctors, next_cursor = get_doctors_page(
+            cursor=request.args.get('cursor'),
+            search=filters['q'] or None,
+            specialization=filters['specialization'] or None
+        )
+        return render_template('doctors.html', doctors=doctors, next_cursor=next_cursor,
+                               filters=filters, is_first_page=not request.args.get('cursor'))
+    
+    @app.route('/api/doctors')
+    @login_required
+    def api_doctors():
+        """API daftar dokter dengan keyset pagination dan filter"""
+        from models import get_doctors_page
+        if not current_user.can_serve_customers():
+            return jsonify({'success': False, 'message': 'Akses ditolak'}), 403
+        
+        limit = max(1, min(request.args.get('limit', 50, type=int), 100))
+        doctors, next_cursor = get_doctors_page(
+            cursor=request.args.get('cursor'),
+            limit=limit,
+            search=request.args.get('q', '').strip() or None,
+            specialization=request.args.get('specialization', '').strip() or None
+        )
+        
+        return jsonify({
+            'items': [{
+                'id': doctor.id,
+                'nik': doctor.nik,
+                'str_number': doctor.str_number,
+                'name': doctor.name,
+                'specialization': doctor.specialization,
+                'phone': doctor.phone,
+                'whatsapp': doctor.whatsapp,
+                'hospital_clinic': doctor.hospital_clinic,
+                'license_expiry_date': doctor.license_expiry_date.isoformat() if doctor.license_expiry_date else None,
+                'created_at': doctor.created_at.isoformat(),
+                'edit_url': url_for('edit_doctor', doctor_id=doctor.id)
+            } for doctor in doctors],
+            'next_cursor': next_cursor
+        })
     
     @app.route('/doctors/add', methods=['GET', 'POST'])
     @login_required
@@ -188,11 +270,48 @@ def register_routes(app):
     @app.route('/inventory')
     @login_required
     def inventory():
-        """Halaman manajemen inventory obat"""
-        from models import Medicine, Category
-        medicines = Medicine.query.filter_by(active=True).all()
-        categories = Category.query.all()
-        return render_template('inventory.html', medicines=medicines, categories=categories)
+        """Halaman manajemen inventory obat (daftar obat dimuat per halaman via /api/inventory)"""
+        from models import Category, get_inventory_summary
+        summary = get_inventory_summary()
+        categories = Category.query.order_by(Category.name).all()
+        return render_template('inventory.html', summary=summary, categories=categories)
+
+    @app.route('/api/inventory')
+    @login_required
+    def api_inventory():
+        """API daftar inventory dengan keyset pagination dan filter kategori/status/pencarian"""
+        from models import get_inventory_page
+        limit = max(1, min(request.args.get('limit', 25, type=int), 100))
+        
+        medicines, next_cursor = get_inventory_page(
+            cursor=request.args.get('cursor'),
+            limit=limit,
+            category_id=request.args.get('category_id', type=int),
+            status=request.args.get('status') or None,
+            search=request.args.get('q', '').strip() or None
+        )
+        
+        results = []
+        for medicine in medicines:
+            results.append({
+                'id': medicine.id,
+                'barcode_id': medicine.barcode_id,
+                'name': medicine.name,
+                'image_url': medicine.image_url,
+                'storage_location': medicine.storage_location,
+                'category': medicine.category_ref.name if medicine.category_ref else None,
+                'stock': medicine.total_quantity,
+                'minimum_stock': medicine.minimum_stock,
+                'unit': medicine.unit,
+                'price': float(medicine.selling_price),
+                'is_low_stock': medicine.is_low_stock,
+                'add_batch_url': url_for('add_batch', medicine_id=medicine.id)
+            })
+        
+        return jsonify({
+            'items': results,
+            'next_cursor': next_cursor
+        })
 
     @app.route('/inventory/add', methods=['GET', 'POST'])
     @login_required
@@ -256,8 +375,8 @@ def register_routes(app):
     @login_required
     def add_batch(medicine_id):
         """Tambah batch obat"""
-        from models import Medicine, MedicineBatch, CustomerWaitlist
-        from whatsapp_service import whatsapp_service
+        from models import Medicine, MedicineBatch, CustomerWaitlist, adjust_medicine_stock, notify_customers_restock, refresh_expiry_buckets
+        from summary_service import summary_service
         
         medicine = Medicine.query.get_or_404(medicine_id)
         
@@ -276,24 +395,24 @@ def register_routes(app):
                     received_date=datetime.strptime(request.form['received_date'], '%Y-%m-%d').date()
                 )
                 db.session.add(batch)
-                db.session.commit()
                 
-                # Cek apakah ada pelanggan di waitlist
-                waitlist_count = CustomerWaitlist.query.filter_by(
-                    medicine_id=medicine_id, 
-                    is_notified=False
-                ).count()
+                # Batch yang belum kadaluwarsa langsung masuk stok siap jual
+                sellable = batch.expiry_date > datetime.now().date() and batch.quantity > 0
+                if sellable:
+                    adjust_medicine_stock(medicine_id, batch.quantity)
+                    refresh_expiry_buckets([medicine_id])
+                
+                # Auto-trigger WhatsApp notifications jika obat sebelumnya habis:
+                # event outbox ditulis dalam transaksi yang sama dengan batch
+                waitlist_count = 0
+                if sellable and old_stock == 0:
+                    waitlist_count = notify_customers_restock(medicine_id, batch.quantity)
                 
-                if waitlist_count > 0 and old_stock == 0:
-                    # Auto-trigger WhatsApp notifications jika obat sebelumnya habis
-                    success_count, failed_count = whatsapp_service.send_bulk_notifications(medicine_id)
-                    
-                    if success_count > 0:
-                        flash(f'Batch obat berhasil ditambahkan! {success_count} pelanggan telah diberitahu via WhatsApp.', 'success')
-                    else:
-                        flash('Batch obat berhasil ditambahkan!', 'success')
-                        if waitlist_count > 0:
-                            flash(f'Ada {waitlist_count} pelanggan di waitlist. Silakan kirim notifikasi manual jika diperlukan.', 'info')
+                db.session.commit()
+                summary_service.invalidate()
+                
+                if waitlist_count > 0:
+                    flash(f'Batch obat berhasil ditambahkan! {waitlist_count} pelanggan di waitlist akan diberitahu via WhatsApp.', 'success')
                 else:
                     flash('Batch obat berhasil ditambahkan!', 'success')
                 
@@ -314,13 +433,15 @@ def register_routes(app):
     @login_required
     def notifications():
         """Halaman notifikasi"""
-        from models import get_expiring_medicines, get_low_stock_medicines
+        from models import get_expiring_medicines, get_low_stock_medicines, get_recent_write_offs
         expiring_medicines = get_expiring_medicines()
         low_stock_medicines = get_low_stock_medicines()
+        write_offs = get_recent_write_offs()
         
         return render_template('notifications.html', 
                              expiring_medicines=expiring_medicines,
-                             low_stock_medicines=low_stock_medicines)
+                             low_stock_medicines=low_stock_medicines,
+                             write_offs=write_offs)
 
     @app.route('/restock')
     @login_required
@@ -340,59 +461,162 @@ def register_routes(app):
     @login_required
     def reports():
         """Halaman laporan"""
-        from models import get_top_selling_medicines, Sale
+        from models import get_top_selling_medicines
+        import reporting
         # Top selling medicines in last 30 days
         top_selling = get_top_selling_medicines(days=30, limit=10)
         
-        # Sales summary
-        today = datetime.now().date()
-        monthly_sales = Sale.query.filter(
-            Sale.created_at >= datetime(today.year, today.month, 1)
-        ).all()
+        # Sales summary bulan ini (agregasi SQL)
+        start, end = reporting.month_range()
+        sales_summary = reporting.get_sales_summary(start, end)
+        daily_sales = reporting.get_daily_sales(start, end)
+        payment_breakdown = reporting.get_payment_method_breakdown(start, end)
+        recent_sales = reporting.get_recent_sales(start, end, limit=10)
         
         return render_template('reports.html', 
                              top_selling=top_selling,
-                             monthly_sales=monthly_sales)
+                             sales_summary=sales_summary,
+                             daily_sales=daily_sales,
+                             payment_breakdown=payment_breakdown,
+                             recent_sales=recent_sales)
 
     @app.route('/export/inventory')
     @login_required
     def export_inventory():
-        """Export inventory ke Excel"""
-        from models import Medicine
-        wb = openpyxl.Workbook()
-        ws = wb.active
-        ws.title = "Inventory Report"
-        
-        # Headers
-        headers = ['Nama Obat', 'Kategori', 'Stok', 'Stok Minimum', 'Harga Beli', 'Harga Jual', 'Status']
-        ws.append(headers)
-        
-        # Data
-        medicines = Medicine.query.filter_by(active=True).all()
-        for medicine in medicines:
-            status = 'Stok Rendah' if medicine.is_low_stock else 'Normal'
-            ws.append([
-                medicine.name,
-                medicine.category_ref.name if medicine.category_ref else '',
-                medicine.total_quantity,
-                medicine.minimum_stock,
-                float(medicine.purchase_price),
-                float(medicine.selling_price),
-                status
-            ])
+        """Export inventory ke Excel (default) atau CSV secara streaming"""
+        from flask import Response, stream_with_context
+        import exports
+        import tempfile
+        
+        export_format = request.args.get('format', 'xlsx')
+        filename = f'inventory_report_{datetime.now().strftime("%Y%m%d")}'
+        
+        if export_format == 'csv':
+            return Response(
+                stream_with_context(exports.stream_csv(exports.INVENTORY_HEADERS, exports.iter_inventory_rows())),
+                mimetype='text/csv',
+                headers={'Content-Disposition': f'attachment; filename={filename}.csv'}
+            )
         
-        # Save to memory
-        file_stream = BytesIO()
-        wb.save(file_stream)
+        # Workbook write-only ditulis ke file sementara (dihapus otomatis setelah dikirim)
+        file_stream = tempfile.TemporaryFile(suffix='.xlsx')
+        exports.write_xlsx(file_stream, "Inventory Report", exports.INVENTORY_HEADERS, exports.iter_inventory_rows())
         file_stream.seek(0)
         
         return send_file(
             file_stream,
             as_attachment=True,
-            download_name=f'inventory_report_{datetime.now().strftime("%Y%m%d")}.xlsx',
+            download_name=f'{filename}.xlsx',
             mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
         )
 
+    @app.route('/export/sales')
+    @login_required
+    def export_sales():
+        """Export item penjualan dalam rentang tanggal ke CSV (default), Excel atau Parquet"""
+        from flask import Response, stream_with_context
+        import exports
+        import tempfile
+        
+        export_format = request.args.get('format', 'csv')
+        try:
+            start, end = exports.parse_date_range(request.args.get('start'), request.args.get('end'))
+        except ValueError as e:
+            flash(str(e), 'error')
+            return redirect(url_for('reports'))
+        
+        filename = f'sales_{start.strftime("%Y%m%d")}_{(end - timedelta(days=1)).strftime("%Y%m%d")}'
+        
+        if export_format == 'csv':
+            return Response(
+                stream_with_context(exports.stream_csv(exports.SALES_HEADERS, exports.iter_sales_rows(start, end))),
+                mimetype='text/csv',
+                headers={'Content-Disposition': f'attachment; filename={filename}.csv'}
+            )
+        
+        file_stream = tempfile.TemporaryFile()
+        if export_format == 'xlsx':
+            exports.write_xlsx(file_stream, "Sales Report", exports.SALES_HEADERS, exports.iter_sales_rows(start, end))
+            download_name = f'{filename}.xlsx'
+        elif export_format == 'parquet':
+            try:
+                exports.write_sales_parquet(file_stream, exports.iter_sales_rows(start, end))
+            except ImportError:
+                file_stream.close()
+                flash('Export Parquet membutuhkan paket pyarrow', 'error')
+                return redirect(url_for('reports'))
+            download_name = f'{filename}.parquet'
+        else:
+            file_stream.close()
+            flash('Format export tidak dikenal', 'error')
+            return redirect(url_for('reports'))
+        file_stream.seek(0)
+        
+        return send_file(file_stream, as_attachment=True, download_name=download_name)
+
+    @app.route('/api/exports', methods=['POST'])
+    @login_required
+    def api_create_export_job():
+        """Antrikan export/laporan untuk dibuat di background"""
+        from export_jobs import export_job_manager
+
+        data = request.get_json(silent=True) or request.form
+        kind = data.get('kind', '')
+        params = {}
+
+        if kind == 'shortage_report':
+            if not current_user.can_serve_customers():
+                return jsonify({'success': False, 'message': 'Anda tidak memiliki akses untuk laporan ini'}), 403
+            try:
+                params['prescription_id'] = int(data.get('prescription_id'))
+            except (TypeError, ValueError):
+                return jsonify({'success': False, 'message': 'prescription_id tidak valid'}), 400
+        elif kind.startswith('sales_'):
+            import exports
+            try:
+                start, end = exports.parse_date_range(data.get('start'), data.get('end'))
+            except ValueError as e:
+                return jsonify({'success': False, 'message': str(e)}), 400
+            params['start'] = start.isoformat()
+            params['end'] = end.isoformat()
+
+        try:
+            job = export_job_manager.submit(kind, params, current_user.id)
+        except ValueError as e:
+            return jsonify({'success': False, 'message': str(e)}), 400
+
+        return jsonify({'success': True, 'job': export_job_manager.to_dict(job)}), 202
+
+    @app.route('/api/exports/<job_id>')
+    @login_required
+    def api_export_job_status(job_id):
+        """Status job export"""
+        from models import ExportJob
+        from export_jobs import export_job_manager
+
+        job = ExportJob.query.get_or_404(job_id)
+        if job.created_by != current_user.id and not current_user.is_admin():
+            return jsonify({'success': False, 'message': 'Job tidak ditemukan'}), 404
+
+        return jsonify({'success': True, 'job': export_job_manager.to_dict(job)})
+
+    @app.route('/exports/<job_id>/download')
+    @login_required
+    def download_export_job(job_id):
+        """Unduh artifact job export yang sudah selesai"""
+        from models import ExportJob
+
+        job = ExportJob.query.get_or_404(job_id)
+        if job.created_by != current_user.id and not current_user.is_admin():
+            flash('File export tidak ditemukan!', 'error')
+            return redirect(url_for('reports'))
+
+        if job.status != 'done' or not job.file_path or not os.path.exists(job.file_path):
+            flash('File export belum siap atau sudah dihapus', 'warning')
+            return redirect(url_for('reports'))
+
+        return send_file(job.file_path, as_attachment=True, download_name=job.filename)
+
     @app.route('/profile')
     @login_required
     def pharmacy_profile():
@@ -471,13 +695,21 @@ def register_routes(app):
     def api_search_medicines():
         """API untuk mencari obat dengan fitur advanced search"""
         from models import search_medicines_advanced
+        from barcode_index import barcode_index
         query = request.args.get('q', '')
         search_type = request.args.get('type', 'all')
+        limit = max(1, min(request.args.get('limit', 20, type=int), 50))
         
         if len(query) < 1:
             return jsonify([])
         
-        medicines = search_medicines_advanced(query, search_type)
+        # Fast path untuk hasil scan barcode: kode persis (beserta stok) dari indeks in-memory
+        if search_type in ('all', 'barcode_id', 'barcode'):
+            entry = barcode_index.lookup(query)
+            if entry:
+                return jsonify([entry])
+        
+        medicines = search_medicines_advanced(query, search_type, limit)
         
         results = []
         for medicine in medicines:
@@ -692,29 +924,22 @@ def register_routes(app):
     @login_required
     def get_notification_count():
         """Get count of notifications for navbar badge"""
-        from models import get_expiring_medicines, get_low_stock_medicines
+        from summary_service import summary_service
         
-        expiring_count = len(get_expiring_medicines())
-        low_stock_count = len(get_low_stock_medicines())
-        total_notifications = expiring_count + low_stock_count
-        
-        return jsonify({
-            'total': total_notifications,
-            'expiring': expiring_count,
-            'low_stock': low_stock_count
-        })
+        return jsonify(summary_service.get_notification_counts())
 
     @app.route('/api/search/customers')
     @login_required
     def api_search_customers():
         """API untuk mencari pelanggan"""
-        from models import search_customers, Customer
+        from models import search_customers
         query = request.args.get('q', '')
+        limit = max(1, min(request.args.get('limit', 10, type=int), 20))
         
         if len(query) < 2:
             return jsonify([])
         
-        customers = search_customers(query)
+        customers = search_customers(query, limit)
         
         results = []
         for customer in customers:
@@ -732,13 +957,14 @@ def register_routes(app):
     @login_required
     def api_search_doctors():
         """API untuk mencari dokter"""
-        from models import search_doctors, Doctor
+        from models import search_doctors
         query = request.args.get('q', '')
+        limit = max(1, min(request.args.get('limit', 10, type=int), 20))
         
         if len(query) < 2:
             return jsonify([])
         
-        doctors = search_doctors(query)
+        doctors = search_doctors(query, limit)
         
         results = []
         for doctor in doctors:
@@ -758,7 +984,11 @@ def register_routes(app):
     @login_required
     def create_sale():
         """Create new sale transaction"""
-        from models import Sale, SaleItem, Medicine, MedicineBatch, Customer, Doctor
+        from models import (Sale, SaleItem, Customer, Doctor, allocate_sale_lines, parse_sale_items,
+                            split_line_total)
+        from summary_service import summary_service
+        from sqlalchemy import insert
+        from outbox import publish
         import uuid
         
         try:
@@ -771,6 +1001,15 @@ def register_routes(app):
                     'message': 'Nama dan NIK pelanggan wajib diisi'
                 }), 400
             
+            # Validasi keranjang sebelum data pelanggan atau stok disentuh
+            try:
+                items = parse_sale_items(data.get('items'))
+            except ValueError as e:
+                return jsonify({
+                    'success': False,
+                    'message': str(e)
+                }), 400
+            
             # Generate invoice number
             invoice_number = f"INV-{datetime.now().strftime('%Y%m%d')}-{str(uuid.uuid4())[:8].upper()}"
             
@@ -828,35 +1067,33 @@ def register_routes(app):
             db.session.flush()  # Get sale ID
             
             # Add sale items and update stock
-            for item_data in data.get('items', []):
-                medicine = Medicine.query.get(item_data['medicine_id'])
-                if not medicine:
-                    raise ValueError(f"Medicine with ID {item_data['medicine_id']} not found")
-                
-                # Get available batch with oldest expiry date (FIFO)
-                available_batch = MedicineBatch.query.filter(
-                    MedicineBatch.medicine_id == item_data['medicine_id'],
-                    MedicineBatch.quantity >= item_data['quantity'],
-                    MedicineBatch.expiry_date > datetime.now().date()
-                ).order_by(MedicineBatch.expiry_date.asc()).first()
-                
-                if not available_batch:
-                    raise ValueError(f"Stok tidak mencukupi untuk {medicine.name}")
-                
-                sale_item = SaleItem(
-                    sale_id=sale.id,
-                    medicine_id=item_data['medicine_id'],
-                    batch_id=available_batch.id,
-                    quantity=item_data['quantity'],
-                    unit_price=item_data['unit_price'],
-                    total_price=item_data['total_price']
-                )
-                db.session.add(sale_item)
-                
-                # Update batch stock
-                available_batch.quantity -= item_data['quantity']
+            # Semua obat dan batch dimuat sekaligus, alokasi FEFO dilakukan di memori
+            allocations = allocate_sale_lines([
+                (item['medicine_id'], item['quantity']) for item in items
+            ])
+            
+            # Satu SaleItem per potongan batch; total_price dibagi sebanding jumlah
+            sale_item_rows = []
+            for item_data, (medicine, slices) in zip(items, allocations):
+                slice_totals = split_line_total(item_data['total_price'], slices)
+                for (batch, slice_quantity), slice_total in zip(slices, slice_totals):
+                    sale_item_rows.append({
+                        'sale_id': sale.id,
+                        'medicine_id': medicine.id,
+                        'batch_id': batch.id,
+                        'quantity': slice_quantity,
+                        'unit_price': item_data['unit_price'],
+                        'total_price': slice_total
+                    })
+            
+            if sale_item_rows:
+                db.session.execute(insert(SaleItem), sale_item_rows)
+            
+            # Cek stok rendah dilakukan worker outbox, bukan di request kasir
+            publish('stock_decreased', {'medicine_ids': sorted({medicine.id for medicine, _ in allocations})})
             
             db.session.commit()
+            summary_service.invalidate()
             
             return jsonify({
                 'success': True,
@@ -876,54 +1113,107 @@ def register_routes(app):
     @login_required
     def generate_receipt_pdf(sale_id):
         """Generate PDF receipt untuk transaksi"""
-        from models import Sale, PharmacyProfile
-        try:
-            from reportlab.lib.pagesizes import A4, letter
-            from reportlab.pdfgen import canvas
-            from reportlab.lib.units import inch
-            from reportlab.lib.styles import getSampleStyleSheet
-            from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
-            from reportlab.lib import colors
-            import tempfile
-            import os
-        except ImportError:
-            # Fallback to simple text-based PDF if reportlab not available
-            from flask import Response
+        from models import Sale, PharmacyProfile, loader_options
+        from pdf_reports import REPORTLAB_AVAILABLE, receipt_renderer
+        from flask import Response
+        
+        profile = PharmacyProfile.query.first()
+        
+        if not REPORTLAB_AVAILABLE:
+            # Fallback to simple text-based receipt if reportlab not available
             sale = Sale.query.get_or_404(sale_id)
-            profile = PharmacyProfile.query.first()
-            
-            # Create simple text receipt
             receipt_text = f"""
 APOTEK MANAGEMENT SYSTEM
 {profile.name if profile else 'Apotek'}
 {profile.address if profile else ''}
 """
-            
             return Response(receipt_text, mimetype='text/plain')
+        
+        invoice_number, pdf = receipt_renderer.get_receipt_pdf(
+            sale_id,
+            lambda: Sale.query.options(*loader_options('receipt')).get_or_404(sale_id),
+            profile,
+            app.static_folder
+        )
+        
+        return Response(
+            pdf,
+            mimetype='application/pdf',
+            headers={'Content-Disposition': f'attachment; filename=receipt_{invoice_number}.pdf'}
+        )
+
+    @app.route('/api/sale/<int:sale_id>/receipt/thermal')
+    @login_required
+    def generate_receipt_thermal(sale_id):
+        """Struk printer thermal: ?format=escpos|text&paper_width=58|80"""
+        from flask import Response
+        from models import Sale, PharmacyProfile, loader_options
+        import thermal_receipt
+
+        receipt_format = request.args.get('format', 'text')
+        paper_width = request.args.get('paper_width', 58, type=int)
+        if receipt_format not in thermal_receipt.RECEIPT_FORMATS:
+            return jsonify({'success': False, 'message': 'Format struk tidak dikenal'}), 400
+
+        sale = Sale.query.options(*loader_options('receipt')).get_or_404(sale_id)
+        data = thermal_receipt.render_receipt(sale, PharmacyProfile.query.first(), receipt_format, paper_width)
+
+        if receipt_format == 'text':
+            return Response(data, mimetype='text/plain; charset=utf-8')
+        return Response(
+            data,
+            mimetype='application/octet-stream',
+            headers={'Content-Disposition': f'attachment; filename=receipt_{sale.invoice_number}.bin'}
+        )
+
+    @app.route('/api/receipt/terminals')
+    @login_required
+    def api_receipt_terminals():
+        """Daftar terminal kasir yang memiliki printer thermal"""
+        import thermal_receipt
+
+        terminals = thermal_receipt.load_terminals()
+        return jsonify([{
+            'name': name,
+            'format': config['format'],
+            'paper_width': config['paper_width']
+        } for name, config in terminals.items()])
+
+    @app.route('/api/sale/<int:sale_id>/receipt/print', methods=['POST'])
+    @login_required
+    def print_receipt_thermal(sale_id):
+        """Cetak struk langsung ke printer thermal milik terminal kasir"""
+        from models import Sale, PharmacyProfile, loader_options
+        import thermal_receipt
+
+        data = request.get_json(silent=True) or request.form
+        terminal = thermal_receipt.load_terminals().get(data.get('terminal', ''))
+        if not terminal or not terminal.get('target'):
+            return jsonify({'success': False, 'message': 'Terminal printer tidak dikenal'}), 400
+
+        sale = Sale.query.options(*loader_options('receipt')).get_or_404(sale_id)
+        try:
+            receipt = thermal_receipt.render_receipt(
+                sale, PharmacyProfile.query.first(), terminal['format'], terminal['paper_width']
+            )
+            thermal_receipt.send_to_printer(receipt, terminal['target'])
+        except (OSError, ValueError) as e:
+            return jsonify({'success': False, 'message': f'Gagal mencetak struk: {str(e)}'}), 502
+
+        return jsonify({'success': True, 'message': f'Struk dikirim ke printer {terminal["name"]}'})
 
     @app.route('/prescriptions/shortage-report/<int:prescription_id>')
     @login_required
     def prescription_shortage_report(prescription_id):
         """Generate shortage report for prescription"""
-        from models import Prescription, PrescriptionItem
+        from models import Prescription, loader_options
+        from pdf_reports import get_shortage_items
         if not current_user.can_serve_customers():
             flash('Anda tidak memiliki akses ke halaman ini!', 'error')
             return redirect(url_for('dashboard'))
         
-        prescription = Prescription.query.get_or_404(prescription_id)
-        shortage_items = []
-        
-        for item in prescription.prescription_items:
-            if not item.is_available or (item.medicine and item.medicine.total_quantity < item.quantity):
-                shortage_info = {
-                    'medicine_name': item.medicine_name,
-                    'requested_quantity': item.quantity,
-                    'available_quantity': item.medicine.total_quantity if item.medicine else 0,
-                    'shortage_quantity': item.quantity - (item.medicine.total_quantity if item.medicine else 0),
-                    'dosage': item.dosage,
-                    'instructions': item.instructions
-                }
-                shortage_items.append(shortage_info)
+        prescription = Prescription.query.options(*loader_options('shortage_report')).get_or_404(prescription_id)
+        shortage_items = get_shortage_items(prescription)
         
         return render_template('prescription_shortage_report.html', 
                              prescription=prescription, 
@@ -933,238 +1223,84 @@ APOTEK MANAGEMENT SYSTEM
     @login_required
     def print_prescription_shortage_report(prescription_id):
         """Print prescription shortage report as PDF"""
-        from models import Prescription, PrescriptionItem, PharmacyProfile
-        try:
-            from reportlab.lib.pagesizes import A4
-            from reportlab.pdfgen import canvas
-            from reportlab.lib.units import inch
-            from reportlab.lib.styles import getSampleStyleSheet
-            from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
-            from reportlab.lib import colors
-            import tempfile
-        except ImportError:
+        from models import Prescription, PharmacyProfile, loader_options
+        from pdf_reports import REPORTLAB_AVAILABLE, build_shortage_report_pdf
+        if not REPORTLAB_AVAILABLE:
             flash('Library untuk PDF tidak tersedia', 'error')
             return redirect(url_for('prescriptions'))
         
-        prescription = Prescription.query.get_or_404(prescription_id)
+        prescription = Prescription.query.options(*loader_options('shortage_report')).get_or_404(prescription_id)
         profile = PharmacyProfile.query.first()
         
-        # Create temporary file
-        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.pdf')
-        
-        # Create PDF document
-        doc = SimpleDocTemplate(temp_file.name, pagesize=A4)
-        styles = getSampleStyleSheet()
-        story = []
-        
-        # Header
-        if profile:
-            title = Paragraph(f"<b>{profile.name}</b>", styles['Title'])
-            address = Paragraph(profile.address, styles['Normal'])
-        else:
-            title = Paragraph("<b>APOTEK MANAGEMENT</b>", styles['Title'])
-            address = Paragraph("", styles['Normal'])
-        
-        story.append(title)
-        if profile:
-            story.append(address)
-        story.append(Spacer(1, 20))
-        
-        # Report title
-        report_title = Paragraph("<b>LAPORAN KEKURANGAN OBAT RESEP</b>", styles['Heading2'])
-        story.append(report_title)
-        story.append(Spacer(1, 10))
-        
-        # Prescription info
-        info_data = [
-            ['No. Resep:', prescription.prescription_number],
-            ['Tanggal:', prescription.prescription_date.strftime('%d/%m/%Y')],
-            ['Pasien:', prescription.customer.name],
-            ['Dokter:', prescription.doctor.name],
-            ['Diagnosis:', prescription.diagnosis or '-']
-        ]
-        
-        info_table = Table(info_data, colWidths=[2*inch, 4*inch])
-        info_table.setStyle(TableStyle([
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, -1), 10),
-        ]))
-        story.append(info_table)
-        story.append(Spacer(1, 20))
-        
-        # Shortage items table
-        shortage_data = [['Obat', 'Diminta', 'Tersedia', 'Kurang', 'Dosis', 'Instruksi']]
-        
-        for item in prescription.prescription_items:
-            if not item.is_available or (item.medicine and item.medicine.total_quantity < item.quantity):
-                available_qty = item.medicine.total_quantity if item.medicine else 0
-                shortage_qty = item.quantity - available_qty
-                
-                shortage_data.append([
-                    item.medicine_name,
-                    str(item.quantity),
-                    str(available_qty),
-                    str(shortage_qty),
-                    item.dosage or '-',
-                    item.instructions or '-'
-                ])
-        
-        if len(shortage_data) > 1:
-            shortage_table = Table(shortage_data, colWidths=[2*inch, 0.8*inch, 0.8*inch, 0.8*inch, 1*inch, 1.5*inch])
-            shortage_table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (1, 1), (3, -1), 'CENTER'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, -1), 9),
-                ('GRID', (0, 0), (-1, -1), 1, colors.black),
-            ]))
-            story.append(shortage_table)
-        else:
-            story.append(Paragraph("Tidak ada kekurangan obat untuk resep ini.", styles['Normal']))
-        
-        story.append(Spacer(1, 30))
-        
-        # Footer
-        footer = Paragraph(f"<i>Laporan dibuat pada: {datetime.now().strftime('%d/%m/%Y %H:%M')}</i>", styles['Normal'])
-        story.append(footer)
-        
-        # Build PDF
-        doc.build(story)
-        temp_file.close()
+        pdf_stream = BytesIO()
+        build_shortage_report_pdf(pdf_stream, prescription, profile)
+        pdf_stream.seek(0)
         
         return send_file(
-            temp_file.name,
+            pdf_stream,
             as_attachment=True,
             download_name=f'shortage_report_{prescription.prescription_number}.pdf',
             mimetype='application/pdf'
         )
-        
-        sale = Sale.query.get_or_404(sale_id)
-        profile = PharmacyProfile.query.first()
-        
-        # Create temporary file
-        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.pdf')
-        
-        # Create PDF document
-        doc = SimpleDocTemplate(temp_file.name, pagesize=letter)
-        styles = getSampleStyleSheet()
-        story = []
-        
-        # Header
-        if profile:
-            title = Paragraph(f"<b>{profile.name}</b>", styles['Title'])
-            address = Paragraph(profile.address, styles['Normal'])
-            contact = Paragraph(f"Telp: {profile.phone} | Email: {profile.email}", styles['Normal'])
-            license_info = Paragraph(f"SIPA: {profile.license_number}", styles['Normal'])
-        else:
-            title = Paragraph("<b>APOTEK MANAGEMENT</b>", styles['Title'])
-            address = Paragraph("", styles['Normal'])
-            contact = Paragraph("", styles['Normal'])
-            license_info = Paragraph("", styles['Normal'])
-        
-        story.append(title)
-        if profile:
-            story.append(address)
-            story.append(contact)
-            story.append(license_info)
-        story.append(Spacer(1, 20))
-        
-        # Receipt title
-        receipt_title = Paragraph("<b>STRUK PEMBAYARAN</b>", styles['Heading2'])
-        story.append(receipt_title)
-        story.append(Spacer(1, 10))
-        
-        # Transaction info
-        info_data = [
-            ['No. Invoice:', sale.invoice_number],
-            ['Tanggal:', sale.created_at.strftime('%d/%m/%Y %H:%M')],
-            ['Pelanggan:', sale.customer_name or 'Umum'],
-            ['Kasir:', sale.cashier.full_name],
-            ['Pembayaran:', sale.payment_method.replace('_', ' ').title()]
-        ]
-        
-        # Add cash payment details if applicable
-        if sale.payment_method == 'cash' and sale.cash_amount:
-            info_data.extend([
-                ['Jumlah Bayar:', f'Rp {float(sale.cash_amount):,.0f}'],
-                ['Kembalian:', f'Rp {float(sale.change_amount or 0):,.0f}']
-            ])
-        
-        info_table = Table(info_data, colWidths=[2*inch, 4*inch])
-        info_table.setStyle(TableStyle([
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, -1), 10),
-        ]))
-        story.append(info_table)
-        story.append(Spacer(1, 20))
-        
-        # Items table
-        item_data = [['Item', 'Qty', 'Harga', 'Total']]
-        total_amount = 0
-        
-        for item in sale.sale_items:
-            item_data.append([
-                item.medicine_ref.name,
-                str(item.quantity),
-                f"Rp {item.unit_price:,.0f}",
-                f"Rp {item.total_price:,.0f}"
-            ])
-            total_amount += float(item.total_price)
-        
-        # Add total row
-        item_data.append(['', '', 'TOTAL:', f"Rp {total_amount:,.0f}"])
-        
-        items_table = Table(item_data, colWidths=[3*inch, 0.7*inch, 1.2*inch, 1.5*inch])
-        items_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (1, 1), (-1, -1), 'RIGHT'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, -1), 9),
-            ('GRID', (0, 0), (-1, -2), 1, colors.black),
-            ('LINEABOVE', (0, -1), (-1, -1), 2, colors.black),
-            ('BACKGROUND', (0, -1), (-1, -1), colors.lightgrey),
-        ]))
-        story.append(items_table)
-        story.append(Spacer(1, 30))
-        
-        # Footer
-        footer = Paragraph("<i>Terima kasih atas kunjungan Anda!<br/>Barang yang sudah dibeli tidak dapat dikembalikan</i>", styles['Normal'])
-        story.append(footer)
-        
-        # Build PDF
-        doc.build(story)
-        temp_file.close()
-        
-        return send_file(
-            temp_file.name,
-            as_attachment=True,
-            download_name=f'receipt_{sale.invoice_number}.pdf',
-            mimetype='application/pdf'
-        )
 
     # Prescription Management Routes
     @app.route('/prescriptions')
     @login_required
     def prescriptions():
-        """Halaman manajemen resep dokter"""
-        from models import Prescription
+        """Halaman manajemen resep dokter (keyset pagination, terbaru dulu)"""
+        from models import get_prescriptions_page
         if not current_user.can_serve_customers():
             flash('Anda tidak memiliki akses ke halaman ini!', 'error')
             return redirect(url_for('dashboard'))
         
-        prescriptions = Prescription.query.order_by(Prescription.uploaded_at.desc()).all()
-        return render_template('prescriptions.html', prescriptions=prescriptions)
+        filters = {
+            'q': request.args.get('q', '').strip(),
+            'status': request.args.get('status', '')
+        }
+        prescriptions, next_cursor = get_prescriptions_page(
+            cursor=request.args.get('cursor'),
+            search=filters['q'] or None,
+            status=filters['status'] or None
+        )
+        return render_template('prescriptions.html', prescriptions=prescriptions, next_cursor=next_cursor,
+                               filters=filters, is_first_page=not request.args.get('cursor'))
+
+    @app.route('/api/prescriptions')
+    @login_required
+    def api_prescriptions():
+        """API daftar resep dengan keyset pagination dan filter"""
+        from models import get_prescriptions_page
+        if not current_user.can_serve_customers():
+            return jsonify({'success': False, 'message': 'Akses ditolak'}), 403
+        
+        limit = max(1, min(request.args.get('limit', 50, type=int), 100))
+        prescriptions, next_cursor = get_prescriptions_page(
+            cursor=request.args.get('cursor'),
+            limit=limit,
+            search=request.args.get('q', '').strip() or None,
+            status=request.args.get('status') or None
+        )
+        
+        return jsonify({
+            'items': [{
+                'id': prescription.id,
+                'prescription_number': prescription.prescription_number,
+                'prescription_date': prescription.prescription_date.strftime('%Y-%m-%d'),
+                'customer_name': prescription.customer.name,
+                'doctor_name': prescription.doctor.name,
+                'uploaded_by': prescription.uploader.full_name,
+                'status': prescription.status,
+                'uploaded_at': prescription.uploaded_at.isoformat(),
+                'view_url': url_for('view_prescription', prescription_id=prescription.id)
+            } for prescription in prescriptions],
+            'next_cursor': next_cursor
+        })
 
     @app.route('/prescriptions/upload', methods=['GET', 'POST'])
     @login_required
     def upload_prescription():
         """Upload resep dokter baru"""
-        from models import Prescription, Customer, Doctor
+        from models import Prescription
         if not current_user.can_serve_customers():
             flash('Anda tidak memiliki akses ke halaman ini!', 'error')
             return redirect(url_for('dashboard'))
@@ -1225,32 +1361,31 @@ APOTEK MANAGEMENT SYSTEM
                 db.session.rollback()
                 flash(f'Error uploading prescription: {str(e)}', 'error')
         
-        customers = Customer.query.order_by(Customer.name).all()
-        doctors = Doctor.query.order_by(Doctor.name).all()
-        return render_template('upload_prescription.html', customers=customers, doctors=doctors)
+        # Pelanggan dan dokter dipilih lewat typeahead /api/search/customers dan /api/search/doctors
+        return render_template('upload_prescription.html')
 
     @app.route('/prescriptions/view/<int:prescription_id>')
     @login_required
     def view_prescription(prescription_id):
         """Lihat detail resep"""
-        from models import Prescription
+        from models import Prescription, loader_options
         if not current_user.can_serve_customers():
             flash('Anda tidak memiliki akses ke halaman ini!', 'error')
             return redirect(url_for('dashboard'))
         
-        prescription = Prescription.query.get_or_404(prescription_id)
+        prescription = Prescription.query.options(*loader_options('prescription_detail')).get_or_404(prescription_id)
         return render_template('view_prescription.html', prescription=prescription)
 
     @app.route('/prescriptions/process/<int:prescription_id>', methods=['GET', 'POST'])
     @login_required
     def process_prescription(prescription_id):
         """Proses resep dokter"""
-        from models import Prescription, PrescriptionItem, Medicine
+        from models import Prescription, PrescriptionItem, Medicine, loader_options
         if not current_user.can_serve_customers():
             flash('Anda tidak memiliki akses ke halaman ini!', 'error')
             return redirect(url_for('dashboard'))
         
-        prescription = Prescription.query.get_or_404(prescription_id)
+        prescription = Prescription.query.options(*loader_options('prescription_detail')).get_or_404(prescription_id)
         
         if request.method == 'POST':
             try:
@@ -1261,16 +1396,28 @@ APOTEK MANAGEMENT SYSTEM
                 
                 # Process prescription items from form
                 medicine_names = request.form.getlist('medicine_name[]')
+                medicine_ids = request.form.getlist('medicine_id[]')
                 dosages = request.form.getlist('dosage[]')
                 quantities = request.form.getlist('quantity[]')
                 instructions = request.form.getlist('instructions[]')
                 
+                # Obat yang dipilih dari typeahead dimuat sekaligus berdasarkan id
+                selected_ids = {int(medicine_id) for medicine_id in medicine_ids if medicine_id.isdigit()}
+                selected_medicines = {
+                    medicine.id: medicine
+                    for medicine in Medicine.query.filter(Medicine.id.in_(selected_ids)).all()
+                } if selected_ids else {}
+                
                 for i in range(len(medicine_names)):
                     if medicine_names[i]:  # Skip empty entries
-                        # Try to find medicine in inventory
-                        medicine = Medicine.query.filter(
-                            Medicine.name.ilike(f'%{medicine_names[i]}%')
-                        ).first()
+                        medicine_id = medicine_ids[i] if i < len(medicine_ids) else ''
+                        if medicine_id.isdigit():
+                            medicine = selected_medicines.get(int(medicine_id))
+                        else:
+                            # Nama diketik manual: coba cocokkan dengan inventory
+                            medicine = Medicine.query.filter(
+                                Medicine.name.ilike(f'%{medicine_names[i]}%')
+                            ).first()
                         
                         prescription_item = PrescriptionItem(
                             prescription_id=prescription.id,
@@ -1300,8 +1447,8 @@ APOTEK MANAGEMENT SYSTEM
                 db.session.rollback()
                 flash(f'Error processing prescription: {str(e)}', 'error')
         
-        medicines = Medicine.query.filter_by(active=True).order_by(Medicine.name).all()
-        return render_template('process_prescription.html', prescription=prescription, medicines=medicines)
+        # Obat dipilih lewat typeahead /api/search/medicines
+        return render_template('process_prescription.html', prescription=prescription)
 
     # Waitlist Management Routes
     @app.route('/waitlist')
@@ -1347,7 +1494,7 @@ APOTEK MANAGEMENT SYSTEM
     @login_required
     def notify_waitlist_customers(medicine_id):
         """Notifikasi pelanggan di waitlist bahwa obat sudah tersedia"""
-        from models import notify_customers_restock, Medicine
+        from models import Medicine
         from whatsapp_service import whatsapp_service
         
         if not current_user.can_manage_inventory() and not current_user.can_serve_customers():
@@ -1357,17 +1504,17 @@ APOTEK MANAGEMENT SYSTEM
         try:
             medicine = Medicine.query.get_or_404(medicine_id)
             
-            # Kirim notifikasi WhatsApp ke semua pelanggan di waitlist
-            success_count, failed_count = whatsapp_service.send_bulk_notifications(medicine_id)
+            # Jadwalkan notifikasi WhatsApp ke semua pelanggan di waitlist (dikirim worker outbox)
+            waitlist_count = whatsapp_service.send_bulk_notifications(medicine_id)
+            db.session.commit()
             
-            if success_count > 0:
-                flash(f'Berhasil mengirim {success_count} notifikasi WhatsApp untuk {medicine.name}!', 'success')
-                if failed_count > 0:
-                    flash(f'{failed_count} notifikasi gagal dikirim.', 'warning')
+            if waitlist_count > 0:
+                flash(f'{waitlist_count} notifikasi WhatsApp untuk {medicine.name} dijadwalkan untuk dikirim!', 'success')
             else:
-                flash('Tidak ada pelanggan di waitlist atau semua gagal dikirim.', 'info')
+                flash('Tidak ada pelanggan di waitlist yang perlu diberitahu.', 'info')
                 
         except Exception as e:
+            db.session.rollback()
             flash(f'Error notifying customers: {str(e)}', 'error')
         
         return redirect(url_for('customer_waitlist'))
@@ -1397,11 +1544,13 @@ APOTEK MANAGEMENT SYSTEM
             )
             
             if success:
-                flash(f'Notifikasi berhasil dikirim ke {waitlist.customer.name}!', 'success')
+                db.session.commit()
+                flash(f'Notifikasi untuk {waitlist.customer.name} dijadwalkan untuk dikirim!', 'success')
             else:
                 flash(f'Gagal mengirim notifikasi: {message}', 'error')
                 
         except Exception as e:
+            db.session.rollback()
             flash(f'Error: {str(e)}', 'error')
         
         return redirect(url_for('customer_waitlist'))
@@ -1410,33 +1559,34 @@ APOTEK MANAGEMENT SYSTEM
     @app.route('/api/prescriptions/search')
     @login_required
     def api_search_prescriptions():
-        """API untuk mencari resep berdasarkan nomor atau nama pelanggan"""
-        from models import Prescription
+        """API untuk mencari resep berdasarkan nomor atau nama pelanggan, dengan filter status dan tanggal upload"""
+        from models import search_prescriptions
         query = request.args.get('q', '').strip()
+        status = request.args.get('status') or None
         
-        if len(query) < 2:
+        try:
+            date_from, date_to = [
+                datetime.strptime(request.args[key], '%Y-%m-%d').date() if request.args.get(key) else None
+                for key in ('date_from', 'date_to')
+            ]
+        except ValueError:
+            return jsonify({'success': False, 'message': 'Format tanggal harus YYYY-MM-DD'}), 400
+        
+        if len(query) < 2 and not (status or date_from or date_to):
             return jsonify([])
         
-        prescriptions = Prescription.query.join(Customer).filter(
-            db.or_(
-                Prescription.prescription_number.ilike(f'%{query}%'),
-                Customer.name.ilike(f'%{query}%')
-            )
-        ).limit(10).all()
-        
-        results = []
-        for prescription in prescriptions:
-            results.append({
-                'id': prescription.id,
-                'prescription_number': prescription.prescription_number,
-                'customer_name': prescription.customer.name,
-                'doctor_name': prescription.doctor.name,
-                'status': prescription.status,
-                'prescription_date': prescription.prescription_date.strftime('%Y-%m-%d'),
-                'uploaded_at': prescription.uploaded_at.strftime('%Y-%m-%d %H:%M')
-            })
-        
-        return jsonify(results)
+        limit = max(1, min(request.args.get('limit', 10, type=int), 50))
+        rows = search_prescriptions(query or None, status, date_from, date_to, limit)
+        
+        return jsonify([{
+            'id': row.id,
+            'prescription_number': row.prescription_number,
+            'customer_name': row.customer_name,
+            'doctor_name': row.doctor_name,
+            'status': row.status,
+            'prescription_date': row.prescription_date.strftime('%Y-%m-%d'),
+            'uploaded_at': row.uploaded_at.strftime('%Y-%m-%d %H:%M')
+        } for row in rows])
 
     # WhatsApp API Routes
     @app.route('/api/whatsapp/test', methods=['POST'])
@@ -1501,4 +1651,15 @@ APOTEK MANAGEMENT SYSTEM
         return jsonify({
             'pending_count': pending_notifications,
             'has_pending': pending_notifications > 0
-        })
\ No newline at end of file
+        })
+
+    @app.route('/api/scheduler/status')
+    @login_required
+    def scheduler_status():
+        """Status job periodik dan metrik durasi di proses ini"""
+        from scheduler_service import scheduler_service
+        
+        if not current_user.is_admin():
+            return jsonify({'success': False, 'message': 'Hanya admin yang dapat melihat status scheduler'}), 403
+        
+        return jsonify({'success': True, 'scheduler': scheduler_service.status()})
@@ -10,7 +10,7 @@ from main import app
 def create_sample_data():
     """Buat data sample untuk testing"""
     with app.app_context():
-        from models import Category, Medicine, MedicineBatch, User
+        from models import Category, Medicine, MedicineBatch, User, refresh_medicine_stock, refresh_expiry_buckets
         
         # Create categories
         categories_data = [
@@ -301,6 +301,9 @@ def create_sample_data():
                 )
                 db.session.add(batch)
         
+        db.session.flush()
+        refresh_medicine_stock()
+        refresh_expiry_buckets()
         db.session.commit()
         print("Sample data berhasil ditambahkan!")
 
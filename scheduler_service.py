@@ -0,0 +1,301 @@
+"""
+Job periodik (APScheduler) dengan satu leader di antara banyak proses worker
+"""
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+from apscheduler.schedulers.background import BackgroundScheduler
+from sqlalchemy import text
+
+from database import db
+
+try:
+    import fcntl
+except ImportError:  # Windows: tidak ada flock, anggap hanya satu proses
+    fcntl = None
+
+# Registry job: job_id -> (fungsi, trigger, argumen trigger, leader_only)
+SCHEDULED_JOBS = {}
+
+def scheduled_job(job_id, trigger, leader_only=True, **trigger_args):
+    """Daftarkan fungsi sebagai job periodik.
+
+    Job leader_only hanya dijalankan proses yang memegang lock leader; job lain
+    (mis. warmup cache in-memory) berjalan di setiap proses.
+    """
+    def decorator(func):
+        SCHEDULED_JOBS[job_id] = (func, trigger, trigger_args, leader_only)
+        return func
+    return decorator
+
+@scheduled_job('low_stock_scan', 'interval', minutes=15)
+def _low_stock_scan():
+    from models import check_and_create_low_stock_notifications
+    return len(check_and_create_low_stock_notifications())
+
+@scheduled_job('expiry_scan', 'cron', hour=6, minute=0)
+def _expiry_scan():
+    from models import check_and_create_expiry_notifications
+    return len(check_and_create_expiry_notifications())
+
+@scheduled_job('expiry_rollover', 'cron', hour=0, minute=5)
+def _expiry_rollover():
+    """Keluarkan batch kadaluwarsa dari stok siap jual"""
+    from models import rollover_expired_stock
+    from summary_service import summary_service
+    count = rollover_expired_stock()
+    summary_service.invalidate()
+    return count
+
+@scheduled_job('outbox_drain', 'interval', seconds=30)
+def _outbox_drain():
+    """Proses event outbox (notifikasi restock dan stok rendah)"""
+    from outbox import outbox_processor
+    return outbox_processor.drain()
+
+@scheduled_job('whatsapp_dispatch', 'interval', minutes=1)
+def _whatsapp_dispatch():
+    """Kirim pesan WhatsApp yang jatuh tempo (termasuk retry)"""
+    from whatsapp_dispatcher import whatsapp_dispatcher
+    sent, failed = whatsapp_dispatcher.dispatch_pending()
+    return sent
+
+@scheduled_job('outbox_cleanup', 'cron', hour=1, minute=0)
+def _outbox_cleanup():
+    from outbox import outbox_processor
+    return outbox_processor.cleanup()
+
+@scheduled_job('export_cleanup', 'interval', hours=1)
+def _export_cleanup():
+    """Hapus file export yang melewati masa retensi"""
+    from export_jobs import export_job_manager
+    return export_job_manager.cleanup()
+
+@scheduled_job('cache_warmup', 'interval', seconds=50, leader_only=False)
+def _cache_warmup():
+    """Isi ulang ringkasan dashboard dan indeks barcode sebelum diminta halaman"""
+    from summary_service import summary_service
+    from barcode_index import barcode_index
+    warmed = summary_service.warm() is not None
+    barcode_index.refresh_if_stale()
+    return int(warmed)
+
+class LeaderLock:
+    """Lock leader: advisory lock PostgreSQL, atau flock pada file untuk database lain.
+
+    Advisory lock dipegang oleh satu koneksi khusus selama proses hidup; jika
+    koneksi putus, lock otomatis dilepas server dan proses lain mengambil alih
+    pada percobaan berikutnya.
+    """
+
+    def __init__(self, lock_key=7315001, lock_file=None):
+        self.lock_key = lock_key
+        self.lock_file = lock_file
+        self._connection = None
+        self._file = None
+
+    @property
+    def held(self):
+        return self._connection is not None or self._file is not None
+
+    def acquire(self, engine):
+        """Coba ambil lock tanpa menunggu; True jika proses ini leader"""
+        if self.held:
+            return self._verify()
+        if engine.dialect.name == 'postgresql':
+            return self._acquire_advisory(engine)
+        return self._acquire_file()
+
+    def _acquire_advisory(self, engine):
+        connection = engine.connect()
+        try:
+            locked = connection.execute(
+                text('SELECT pg_try_advisory_lock(:key)'), {'key': self.lock_key}
+            ).scalar()
+            connection.commit()
+        except Exception:
+            connection.close()
+            raise
+        if not locked:
+            connection.close()
+            return False
+        self._connection = connection
+        return True
+
+    def _acquire_file(self):
+        if fcntl is None:
+            self._file = True
+            return True
+        handle = open(self.lock_file, 'a+')
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            handle.close()
+            return False
+        handle.seek(0)
+        handle.truncate()
+        handle.write(str(os.getpid()))
+        handle.flush()
+        self._file = handle
+        return True
+
+    def _verify(self):
+        """Pastikan koneksi pemegang advisory lock masih hidup"""
+        if self._connection is None:
+            return True
+        try:
+            self._connection.execute(text('SELECT 1'))
+            self._connection.commit()
+            return True
+        except Exception:
+            self.release()
+            return False
+
+    def release(self):
+        if self._connection is not None:
+            try:
+                self._connection.execute(text('SELECT pg_advisory_unlock(:key)'), {'key': self.lock_key})
+                self._connection.commit()
+            except Exception:
+                pass
+            self._connection.close()
+            self._connection = None
+        if self._file is not None:
+            if self._file is not True:
+                fcntl.flock(self._file, fcntl.LOCK_UN)
+                self._file.close()
+            self._file = None
+
+class JobMetrics:
+    """Statistik eksekusi per job (in-process): jumlah, durasi, error terakhir"""
+
+    def __init__(self):
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def record(self, job_id, started_at, duration, result=None, error=None):
+        with self._lock:
+            stats = self._jobs.setdefault(job_id, {
+                'runs': 0,
+                'failures': 0,
+                'total_ms': 0.0,
+                'max_ms': 0.0
+            })
+            duration_ms = duration * 1000
+            stats['runs'] += 1
+            stats['total_ms'] += duration_ms
+            stats['max_ms'] = max(stats['max_ms'], duration_ms)
+            stats['last_started_at'] = started_at.isoformat()
+            stats['last_duration_ms'] = round(duration_ms, 1)
+            stats['last_result'] = result
+            if error is not None:
+                stats['failures'] += 1
+                stats['last_error'] = error
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                job_id: dict(stats, avg_ms=round(stats['total_ms'] / stats['runs'], 1),
+                             total_ms=round(stats['total_ms'], 1), max_ms=round(stats['max_ms'], 1))
+                for job_id, stats in self._jobs.items()
+            }
+
+class SchedulerService:
+    """Menjalankan SCHEDULED_JOBS di BackgroundScheduler setiap proses.
+
+    Setiap proses (mis. worker gunicorn) mencoba menjadi leader secara berkala;
+    job leader_only dilewati di proses yang bukan leader sehingga tepat satu
+    proses menjalankannya. Jika leader mati, proses lain mengambil alih.
+    RUN_SCHEDULER=0 mematikan scheduler (mis. untuk outbox_worker.py).
+    """
+
+    def __init__(self, leader_check_seconds=30):
+        self.leader_check_seconds = leader_check_seconds
+        self.app = None
+        self.scheduler = None
+        self.leader_lock = None
+        self.is_leader = False
+        self.metrics = JobMetrics()
+
+    def init_app(self, app):
+        self.app = app
+        if os.environ.get('RUN_SCHEDULER', '1') == '0':
+            return
+
+        self.leader_lock = LeaderLock(
+            lock_key=int(os.environ.get('SCHEDULER_LOCK_KEY', 7315001)),
+            lock_file=os.environ.get('SCHEDULER_LOCK_FILE',
+                                     os.path.join(tempfile.gettempdir(), 'apotek_scheduler.lock'))
+        )
+        self.scheduler = BackgroundScheduler()
+        self.scheduler.add_job(self.check_leader, 'interval', seconds=self.leader_check_seconds,
+                               id='leader_check', replace_existing=True,
+                               next_run_time=datetime.now())
+        for job_id, (func, trigger, trigger_args, leader_only) in SCHEDULED_JOBS.items():
+            self.scheduler.add_job(self.run_job, trigger, args=[job_id], id=job_id,
+                                   replace_existing=True, coalesce=True, max_instances=1,
+                                   **trigger_args)
+        self.scheduler.start()
+
+    def check_leader(self):
+        """Ambil atau pertahankan lock leader"""
+        with self.app.app_context():
+            try:
+                is_leader = self.leader_lock.acquire(db.engine)
+            except Exception as e:
+                is_leader = False
+                print(f"Scheduler leader check error: {str(e)}")
+        if is_leader != self.is_leader:
+            print(f"Scheduler proses {os.getpid()} {'menjadi' if is_leader else 'bukan lagi'} leader")
+        self.is_leader = is_leader
+
+    def run_job(self, job_id):
+        """Jalankan satu job dalam app context dan catat durasinya"""
+        func, trigger, trigger_args, leader_only = SCHEDULED_JOBS[job_id]
+        if leader_only and not self.is_leader:
+            return None
+
+        started_at = datetime.now()
+        start = time.perf_counter()
+        result = error = None
+        with self.app.app_context():
+            try:
+                result = func()
+            except Exception as e:
+                db.session.rollback()
+                error = str(e) or e.__class__.__name__
+                print(f"Scheduler job {job_id} gagal: {error}")
+        self.metrics.record(job_id, started_at, time.perf_counter() - start, result, error)
+        return result
+
+    def status(self):
+        """Status scheduler di proses ini untuk endpoint monitoring"""
+        jobs = []
+        metrics = self.metrics.snapshot()
+        for job_id, (func, trigger, trigger_args, leader_only) in SCHEDULED_JOBS.items():
+            job = self.scheduler.get_job(job_id) if self.scheduler else None
+            jobs.append({
+                'id': job_id,
+                'leader_only': leader_only,
+                'next_run_at': job.next_run_time.isoformat() if job and job.next_run_time else None,
+                'metrics': metrics.get(job_id)
+            })
+        return {
+            'running': bool(self.scheduler and self.scheduler.running),
+            'pid': os.getpid(),
+            'is_leader': self.is_leader,
+            'jobs': jobs
+        }
+
+    def shutdown(self):
+        if self.scheduler and self.scheduler.running:
+            self.scheduler.shutdown(wait=False)
+        if self.leader_lock:
+            self.leader_lock.release()
+        self.is_leader = False
+
+# Instance global untuk digunakan di seluruh aplikasi
+scheduler_service = SchedulerService()
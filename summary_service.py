@@ -0,0 +1,152 @@
+"""
+Dashboard summary service dengan cache berumur pendek (TTL)
+"""
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+from database import db
+
+class LocalCacheBackend:
+    """Cache per-proses (dict) dengan TTL"""
+
+    def __init__(self):
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._values.get(key)
+            if not item:
+                return None
+            value, expires_at = item
+            if time.monotonic() >= expires_at:
+                del self._values[key]
+                return None
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._values[key] = (value, time.monotonic() + ttl)
+
+    def delete(self, key):
+        with self._lock:
+            self._values.pop(key, None)
+
+class RedisCacheBackend:
+    """Cache yang dibagi antar worker lewat Redis (opsional, butuh paket redis)"""
+
+    def __init__(self, url):
+        import redis
+        self._client = redis.Redis.from_url(url)
+
+    def get(self, key):
+        raw = self._client.get(key)
+        return json.loads(raw) if raw else None
+
+    def set(self, key, value, ttl):
+        self._client.setex(key, ttl, json.dumps(value))
+
+    def delete(self, key):
+        self._client.delete(key)
+
+def _create_backend():
+    redis_url = os.environ.get("SUMMARY_CACHE_REDIS_URL")
+    if redis_url:
+        try:
+            return RedisCacheBackend(redis_url)
+        except ImportError:
+            print("SUMMARY_CACHE_REDIS_URL diset tetapi paket redis tidak tersedia, memakai cache lokal")
+    return LocalCacheBackend()
+
+class SummaryService:
+    """Ringkasan dashboard dan badge notifikasi, dihitung dalam satu query lalu di-cache.
+
+    Cache di-invalidate secara eksplisit setelah transaksi penjualan atau
+    penambahan batch di-commit; TTL membatasi data basi dari worker lain.
+    warm() hanya menghitung ulang entri yang hilang selama ringkasan masih
+    diminta dalam warm_idle_seconds terakhir, sehingga saat idle tidak ada query.
+    """
+
+    CACHE_KEY = 'apotek:dashboard_summary'
+
+    def __init__(self, ttl=60, backend=None, warm_idle_seconds=120):
+        self.ttl = ttl
+        self.backend = backend or _create_backend()
+        self.warm_idle_seconds = warm_idle_seconds
+        self._last_requested_at = None
+
+    def compute(self, expiring_days=14, recent_sales_days=7):
+        """Hitung semua angka ringkasan dalam satu round trip (scalar subquery)"""
+        from sqlalchemy import select, func
+        from models import Medicine, MedicineExpiryBucket, Sale
+
+        week_ago = datetime.now() - timedelta(days=recent_sales_days)
+
+        total_medicines = select(func.count(Medicine.id)).scalar_subquery()
+        # Dibaca dari bucket kadaluwarsa yang dipelihara job rollover harian;
+        # hanya obat aktif, sama seperti get_expiring_medicines()
+        expiring_soon = select(func.count()).select_from(MedicineExpiryBucket).join(
+            Medicine, Medicine.id == MedicineExpiryBucket.medicine_id
+        ).where(
+            Medicine.active == True,
+            getattr(MedicineExpiryBucket, f'expiring_{expiring_days}d') > 0
+        ).scalar_subquery()
+        low_stock = select(func.count(Medicine.id)).where(
+            Medicine.active == True,
+            Medicine.is_low_stock
+        ).scalar_subquery()
+        recent_sales = select(func.count(Sale.id)).where(
+            Sale.created_at >= week_ago
+        ).scalar_subquery()
+
+        row = db.session.execute(
+            select(total_medicines, expiring_soon, low_stock, recent_sales)
+        ).one()
+
+        return {
+            'total_medicines': row[0],
+            'expiring_soon': row[1],
+            'low_stock': row[2],
+            'recent_sales': row[3]
+        }
+
+    def get_summary(self):
+        """Ringkasan dari cache, dihitung ulang jika kosong atau kadaluwarsa"""
+        self._last_requested_at = time.monotonic()
+        summary = self.backend.get(self.CACHE_KEY)
+        if summary is None:
+            summary = self.compute()
+            self.backend.set(self.CACHE_KEY, summary, self.ttl)
+        return summary
+
+    def get_notification_counts(self):
+        summary = self.get_summary()
+        return {
+            'total': summary['expiring_soon'] + summary['low_stock'],
+            'expiring': summary['expiring_soon'],
+            'low_stock': summary['low_stock']
+        }
+
+    def warm(self):
+        """Isi ulang cache yang kadaluwarsa/di-invalidate (dipanggil job scheduler).
+
+        Dilewati (None) jika entri cache masih ada atau ringkasan tidak diminta
+        di proses ini selama warm_idle_seconds terakhir.
+        """
+        if (self._last_requested_at is None or
+                time.monotonic() - self._last_requested_at > self.warm_idle_seconds):
+            return None
+        if self.backend.get(self.CACHE_KEY) is not None:
+            return None
+        summary = self.compute()
+        self.backend.set(self.CACHE_KEY, summary, self.ttl)
+        return summary
+
+    def invalidate(self):
+        self.backend.delete(self.CACHE_KEY)
+
+# Instance global untuk digunakan di seluruh aplikasi
+summary_service = SummaryService()
@@ -0,0 +1,159 @@
+"""
+Batas jumlah query SQL untuk view struk, daftar resep dan laporan kekurangan resep
+
+Menjalankan route asli lewat Flask test client terhadap database SQLite
+sementara, sehingga regresi N+1 (query per item) langsung membuat test gagal.
+
+Usage:
+    python -m pytest tests
+"""
+import os
+import sys
+from datetime import date
+
+import pytest
+from sqlalchemy import event
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SALE_ITEMS = 12
+PRESCRIPTIONS = 15
+PRESCRIPTION_ITEMS = 8
+
+
+@pytest.fixture(scope='module')
+def app(tmp_path_factory):
+    """App utama (main.py) dengan database SQLite sementara berisi data contoh"""
+    os.environ['DATABASE_URL'] = f"sqlite:///{tmp_path_factory.mktemp('db') / 'apotek.db'}"
+    os.environ['RUN_SCHEDULER'] = '0'
+    os.environ.setdefault('EXPORT_STORAGE_DIR', str(tmp_path_factory.mktemp('exports')))
+
+    from main import app
+    from database import db
+
+    app.config['TESTING'] = True
+    with app.app_context():
+        seed(db)
+    return app
+
+
+@pytest.fixture(scope='module')
+def ids(app):
+    """Id penjualan dan resep contoh, diambil sebelum penghitungan query dimulai"""
+    from models import Sale, Prescription
+
+    with app.app_context():
+        return {'sale': _first_id(Sale), 'prescription': _first_id(Prescription)}
+
+
+def seed(db):
+    from models import (User, Category, Medicine, MedicineBatch, Customer, Doctor, Sale, SaleItem,
+                        Prescription, PrescriptionItem)
+
+    admin = User(username='admin', email='admin@apotek.test', full_name='Admin', role='admin')
+    admin.set_password('admin')
+    category = Category(name='Analgesik')
+    db.session.add_all([admin, category])
+    db.session.flush()
+
+    medicines = []
+    for i in range(SALE_ITEMS):
+        medicine = Medicine(name=f'Obat {i}', category_id=category.id, unit='tablet', capacity='500mg',
+                            minimum_stock=10, purchase_price=1000, selling_price=1500)
+        medicine.batches.append(MedicineBatch(batch_number=f'B{i}', expiry_date=date(2030, 1, 1),
+                                              quantity=5, purchase_price=1000))
+        medicines.append(medicine)
+    db.session.add_all(medicines)
+    db.session.flush()
+
+    sale = Sale(invoice_number='INV-TEST-1', total_amount=1500 * SALE_ITEMS, cashier_id=admin.id)
+    sale.sale_items = [SaleItem(medicine_id=medicine.id, batch_id=medicine.batches[0].id, quantity=1,
+                                unit_price=1500, total_price=1500) for medicine in medicines]
+    db.session.add(sale)
+
+    for i in range(PRESCRIPTIONS):
+        prescription = Prescription(
+            prescription_number=f'RX-TEST-{i:04d}',
+            customer=Customer(name=f'Pelanggan {i}', nik=f'{3201000000000000 + i:016d}'),
+            doctor=Doctor(name=f'dr. Dokter {i}', nik=f'{3301000000000000 + i:016d}', str_number=f'STR-{i}'),
+            uploaded_by=admin.id,
+            image_filename='resep.png',
+            image_path='static/receive_dokter/resep.png',
+            prescription_date=date.today(),
+            status='processed'
+        )
+        prescription.prescription_items = [PrescriptionItem(medicine_id=medicine.id, medicine_name=medicine.name,
+                                               quantity=30, is_available=False)
+                              for medicine in medicines[:PRESCRIPTION_ITEMS]]
+        db.session.add(prescription)
+    db.session.commit()
+
+
+@pytest.fixture
+def client(app):
+    client = app.test_client()
+    client.post('/login', data={'username': 'admin', 'password': 'admin'})
+    return client
+
+
+@pytest.fixture
+def query_count(app):
+    """Hitung statement SQL yang dieksekusi engine selama test"""
+    from database import db
+
+    statements = []
+
+    def on_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', on_execute)
+    yield statements
+    event.remove(engine, 'before_cursor_execute', on_execute)
+
+
+def _first_id(model):
+    from database import db
+
+    return db.session.execute(db.select(model.id).order_by(model.id)).scalars().first()
+
+
+def test_receipt_pdf_query_budget(ids, client, query_count):
+    pytest.importorskip('reportlab')
+
+    response = client.get(f"/api/sale/{ids['sale']}/receipt/pdf")
+
+    assert response.status_code == 200
+    assert response.mimetype == 'application/pdf'
+    # user login, profil apotek, penjualan + kasir, item + obat
+    assert len(query_count) <= 4, query_count
+
+
+def test_prescriptions_page_query_budget(client, query_count):
+    response = client.get('/prescriptions')
+
+    assert response.status_code == 200
+    assert b'RX-TEST-0000' in response.data
+    # user login, profil apotek (layout), halaman resep beserta pelanggan, dokter dan pengunggah
+    assert len(query_count) <= 3, query_count
+
+
+def test_prescriptions_page_model_query_budget(app, query_count):
+    from models import get_prescriptions_page
+
+    with app.app_context():
+        prescriptions, next_cursor = get_prescriptions_page()
+        rows = [(p.customer.name, p.doctor.name, p.uploader.full_name) for p in prescriptions]
+
+    assert len(rows) == PRESCRIPTIONS
+    assert len(query_count) <= 1, query_count
+
+
+def test_shortage_report_query_budget(ids, client, query_count):
+    response = client.get(f"/prescriptions/shortage-report/{ids['prescription']}")
+
+    assert response.status_code == 200
+    assert b'Obat 0' in response.data
+    # user login, profil apotek (layout), resep + pelanggan + dokter, item + obat
+    assert len(query_count) <= 4, query_count
@@ -0,0 +1,59 @@
+"""
+Printer thermal tiruan (port 9100) untuk menguji cetak struk ESC/POS tanpa hardware.
+
+Setiap koneksi disimpan sebagai file .bin di direktori output dan isinya
+ditampilkan sebagai teks (perintah ESC/POS dibuang).
+
+Contoh:
+    python thermal_printer_stub.py --port 9100 --output printer_output
+    RECEIPT_TERMINALS='{"kasir1": {"format": "escpos", "paper_width": 58, "target": "tcp://127.0.0.1:9100"}}'
+"""
+import argparse
+import os
+import re
+import socketserver
+from datetime import datetime
+
+# ESC/GS diikuti perintah dan parameternya (cukup untuk perintah yang dipakai thermal_receipt)
+ESCPOS_COMMAND = re.compile(rb'\x1b[@]|\x1b[aE!].|\x1dV..|\x1d[!V].')
+
+def escpos_to_text(data):
+    return ESCPOS_COMMAND.sub(b'', data).decode('ascii', errors='replace')
+
+class PrinterHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        data = self.rfile.read()
+        filename = os.path.join(
+            self.server.output_dir,
+            f"receipt_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}.bin"
+        )
+        with open(filename, 'wb') as fileobj:
+            fileobj.write(data)
+
+        print(f"=== {len(data)} bytes dari {self.client_address[0]} -> {filename}")
+        print(escpos_to_text(data))
+
+class PrinterServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+
+    def __init__(self, address, output_dir):
+        self.output_dir = output_dir
+        os.makedirs(output_dir, exist_ok=True)
+        super().__init__(address, PrinterHandler)
+
+def main():
+    parser = argparse.ArgumentParser(description='Printer thermal tiruan untuk pengujian')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=9100)
+    parser.add_argument('--output', default='printer_output')
+    args = parser.parse_args()
+
+    with PrinterServer((args.host, args.port), args.output) as server:
+        print(f"Printer tiruan mendengarkan di {args.host}:{args.port}, output ke {args.output}/")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            print("Printer tiruan dihentikan")
+
+if __name__ == '__main__':
+    main()
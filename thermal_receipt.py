@@ -0,0 +1,189 @@
+"""
+Struk untuk printer thermal 58/80mm: ESC/POS mentah dan teks polos
+"""
+import json
+import os
+import socket
+
+# Perintah ESC/POS
+ESC = b'\x1b'
+GS = b'\x1d'
+INIT = ESC + b'@'
+ALIGN_LEFT = ESC + b'a\x00'
+ALIGN_CENTER = ESC + b'a\x01'
+BOLD_ON = ESC + b'E\x01'
+BOLD_OFF = ESC + b'E\x00'
+DOUBLE_ON = GS + b'!\x11'
+DOUBLE_OFF = GS + b'!\x00'
+CUT = GS + b'V\x42\x00'  # Feed lalu partial cut
+
+# Jumlah karakter per baris (font A) untuk lebar kertas dalam mm
+PAPER_COLUMNS = {58: 32, 80: 48}
+
+RECEIPT_FORMATS = ('escpos', 'text')
+
+def load_terminals():
+    """Konfigurasi printer per terminal kasir dari env RECEIPT_TERMINALS (JSON).
+
+    Contoh: {"kasir1": {"format": "escpos", "paper_width": 58, "target": "tcp://192.168.1.50:9100"}}
+    target berupa tcp://host:port (printer jaringan) atau file:///path (untuk pengujian).
+    """
+    raw = os.environ.get('RECEIPT_TERMINALS')
+    if not raw:
+        return {}
+    try:
+        terminals = json.loads(raw)
+    except ValueError:
+        print("RECEIPT_TERMINALS bukan JSON yang valid, printer thermal dinonaktifkan")
+        return {}
+
+    for name, config in terminals.items():
+        config.setdefault('format', 'escpos')
+        config.setdefault('paper_width', 58)
+        config['name'] = name
+    return terminals
+
+def _money(value):
+    return f"Rp {float(value):,.0f}"
+
+def _two_columns(left, right, columns):
+    """Teks kiri dan kanan rata kanan; mengembalikan daftar baris.
+
+    Jika tidak muat dalam satu baris, teks kiri dibungkus (indentasi awal
+    dipertahankan) dan teks kanan ditaruh rata kanan di baris sesudahnya,
+    dibungkus juga jika lebih lebar dari kertas. Tidak ada teks yang dibuang.
+    """
+    if len(left) + 1 + len(right) <= columns:
+        return [f"{left:<{columns - len(right) - 1}} {right}"]
+
+    indent = left[:len(left) - len(left.lstrip())]
+    lines = [indent + line for line in _wrap(left, max(columns - len(indent), 1))]
+    right_lines = _wrap(right, columns)
+    if lines and len(right_lines) == 1 and len(lines[-1]) + 1 + len(right) <= columns:
+        lines[-1] = f"{lines[-1]:<{columns - len(right) - 1}} {right}"
+    else:
+        lines.extend(line.rjust(columns) for line in right_lines)
+    return lines
+
+def _wrap(text, columns):
+    words = (text or '').split()
+    lines, current = [], ''
+    for word in words:
+        while len(word) > columns:
+            if current:
+                lines.append(current)
+                current = ''
+            lines.append(word[:columns])
+            word = word[columns:]
+        if not current:
+            current = word
+        elif len(current) + 1 + len(word) <= columns:
+            current = f"{current} {word}"
+        else:
+            lines.append(current)
+            current = word
+    if current:
+        lines.append(current)
+    return lines
+
+def receipt_lines(sale, profile, columns):
+    """Isi struk sebagai daftar (gaya, teks); gaya: title, center, bold, normal.
+
+    Baris title/center dibungkus oleh renderer sesuai lebar hurufnya.
+    """
+    lines = []
+    separator = '-' * columns
+
+    lines.append(('title', profile.name if profile else 'APOTEK'))
+    if profile:
+        lines.append(('center', profile.address))
+        lines.append(('center', f"Telp: {profile.phone}"))
+        lines.append(('center', f"SIPA: {profile.license_number}"))
+    lines.append(('normal', separator))
+
+    lines.append(('normal', sale.invoice_number))
+    for text in _two_columns(sale.created_at.strftime('%d/%m/%Y %H:%M'), sale.cashier.full_name, columns):
+        lines.append(('normal', text))
+    for text in _wrap(f"Pelanggan: {sale.customer_name or 'Umum'}", columns):
+        lines.append(('normal', text))
+    lines.append(('normal', separator))
+
+    total_amount = 0
+    for item in sale.receipt_items:
+        for text in _wrap(item.medicine_ref.name, columns):
+            lines.append(('normal', text))
+        for text in _two_columns(f"  {item.quantity} x {_money(item.unit_price)}", _money(item.total_price), columns):
+            lines.append(('normal', text))
+        total_amount += float(item.total_price)
+
+    lines.append(('normal', separator))
+    lines.extend(('bold', text) for text in _two_columns('TOTAL', _money(total_amount), columns))
+
+    payment_method = (sale.payment_method or 'cash').replace('_', ' ').title()
+    summary = [('Pembayaran', payment_method)]
+    if sale.payment_method == 'cash' and sale.cash_amount:
+        summary += [('Bayar', _money(sale.cash_amount)), ('Kembali', _money(sale.change_amount or 0))]
+    for label, value in summary:
+        lines.extend(('normal', text) for text in _two_columns(label, value, columns))
+
+    lines.append(('normal', separator))
+    lines.append(('center', 'Terima kasih atas kunjungan Anda!'))
+    lines.append(('center', 'Barang yang sudah dibeli tidak dapat dikembalikan'))
+    return lines
+
+def render_text(sale, profile, paper_width=58):
+    """Struk teks polos (untuk printer tanpa ESC/POS atau pratinjau)"""
+    columns = PAPER_COLUMNS.get(int(paper_width), PAPER_COLUMNS[58])
+    output = []
+    for style, text in receipt_lines(sale, profile, columns):
+        if style in ('title', 'center'):
+            output.extend(line.center(columns).rstrip() for line in _wrap(text, columns))
+        else:
+            output.append(text)
+    return '\n'.join(output) + '\n'
+
+def render_escpos(sale, profile, paper_width=58, cut=True):
+    """Struk sebagai byte stream ESC/POS mentah"""
+    columns = PAPER_COLUMNS.get(int(paper_width), PAPER_COLUMNS[58])
+    output = bytearray(INIT)
+
+    for style, text in receipt_lines(sale, profile, columns):
+        data = text.encode('ascii', errors='replace')
+        if style == 'title':
+            # Huruf dobel: muat setengah jumlah kolom
+            for line in _wrap(text, columns // 2):
+                output += ALIGN_CENTER + BOLD_ON + DOUBLE_ON + line.encode('ascii', errors='replace') + DOUBLE_OFF + BOLD_OFF + b'\n'
+            output += ALIGN_LEFT
+        elif style == 'center':
+            for line in _wrap(text, columns):
+                output += ALIGN_CENTER + line.encode('ascii', errors='replace') + b'\n'
+            output += ALIGN_LEFT
+        elif style == 'bold':
+            output += BOLD_ON + data + BOLD_OFF + b'\n'
+        else:
+            output += data + b'\n'
+
+    output += b'\n\n\n'
+    if cut:
+        output += CUT
+    return bytes(output)
+
+def render_receipt(sale, profile, receipt_format='escpos', paper_width=58):
+    """Render struk sesuai format; mengembalikan bytes"""
+    if receipt_format == 'text':
+        return render_text(sale, profile, paper_width).encode('utf-8')
+    if receipt_format == 'escpos':
+        return render_escpos(sale, profile, paper_width)
+    raise ValueError(f'Format struk tidak dikenal: {receipt_format}')
+
+def send_to_printer(data, target, timeout=5):
+    """Kirim byte struk ke target printer: tcp://host:port atau file:///path"""
+    if target.startswith('tcp://'):
+        host, _, port = target[len('tcp://'):].partition(':')
+        with socket.create_connection((host, int(port or 9100)), timeout=timeout) as conn:
+            conn.sendall(data)
+    elif target.startswith('file://'):
+        with open(target[len('file://'):], 'ab') as fileobj:
+            fileobj.write(data)
+    else:
+        raise ValueError(f'Target printer tidak didukung: {target}')
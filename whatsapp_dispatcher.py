@@ -0,0 +1,188 @@
+"""
+Dispatcher antrian pesan WhatsApp: pengiriman paralel, rate limit, retry dengan backoff
+"""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from database import db
+
+class RateLimiter:
+    """Token bucket: maksimal `rate` pesan per detik dengan burst `capacity`"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity or rate)
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+                self._updated_at = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+class WhatsAppDispatcher:
+    """Mengirim pesan dari tabel outbound_messages secara batch.
+
+    Pesan jatuh tempo diklaim (status 'sending' dengan lease) agar tidak dikirim
+    ganda oleh worker lain, dikirim paralel lewat session HTTP yang dipakai ulang
+    dengan rate limit per provider, lalu semua hasil (status pesan, waitlist dan
+    log notifikasi) disimpan dalam satu commit. Pesan gagal dijadwalkan ulang
+    dengan backoff eksponensial sampai max_attempts.
+    """
+
+    def __init__(self, batch_size=100, max_workers=4, max_attempts=5,
+                 backoff_seconds=30, lease_seconds=300):
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        self.lease_seconds = lease_seconds
+        self.app = None
+        self._rate_limiters = {}
+        self._dispatch_lock = threading.Lock()
+
+    def init_app(self, app):
+        self.app = app
+        self.max_workers = int(os.environ.get('WHATSAPP_MAX_WORKERS', self.max_workers))
+        self._rate_limiters['whatsapp'] = RateLimiter(float(os.environ.get('WHATSAPP_RATE_LIMIT', 5)))
+
+    def _rate_limiter(self, provider):
+        if provider not in self._rate_limiters:
+            self._rate_limiters[provider] = RateLimiter(5)
+        return self._rate_limiters[provider]
+
+    def backoff(self, attempts):
+        """Jeda sebelum percobaan berikutnya: 30s, 60s, 120s, ... maksimal 1 jam"""
+        return timedelta(seconds=min(self.backoff_seconds * 2 ** (attempts - 1), 3600))
+
+    def _claim_batch(self):
+        """Ambil pesan jatuh tempo dan tandai 'sending' (lease) dalam transaksi singkat"""
+        from sqlalchemy.orm import joinedload
+        from models import OutboundMessage
+
+        now = datetime.utcnow()
+        messages = OutboundMessage.query.options(
+            joinedload(OutboundMessage.customer),
+            joinedload(OutboundMessage.medicine)
+        ).filter(
+            OutboundMessage.status.in_(['pending', 'sending']),
+            OutboundMessage.next_attempt_at <= now
+        ).order_by(
+            OutboundMessage.next_attempt_at, OutboundMessage.id
+        ).limit(self.batch_size).with_for_update(skip_locked=True, of=OutboundMessage).all()
+
+        claimed = []
+        for message in messages:
+            message.status = 'sending'
+            message.next_attempt_at = now + timedelta(seconds=self.lease_seconds)
+            claimed.append({
+                'id': message.id,
+                'provider': message.provider,
+                'phone': message.phone,
+                'body': message.body,
+                'attempts': message.attempts,
+                'waitlist_id': message.waitlist_id,
+                'customer_id': message.customer_id,
+                'customer_name': message.customer.name if message.customer else message.phone,
+                'medicine_id': message.medicine_id,
+                'medicine_name': message.medicine.name if message.medicine else ''
+            })
+        db.session.commit()
+        return claimed
+
+    def _send(self, provider, phone, body):
+        from whatsapp_service import whatsapp_service
+
+        self._rate_limiter(provider).acquire()
+        try:
+            whatsapp_service.deliver(phone, body)
+            return None
+        except Exception as e:
+            return str(e) or e.__class__.__name__
+
+    def _record_results(self, claimed, errors):
+        """Simpan hasil satu batch: update pesan, waitlist dan log notifikasi, satu commit"""
+        from sqlalchemy import update, insert
+        from models import OutboundMessage, CustomerWaitlist, Notification
+
+        now = datetime.utcnow()
+        message_updates = []
+        notified_waitlist_ids = []
+        notifications = []
+
+        for message, error in zip(claimed, errors):
+            message_id = message['id']
+            attempts = message['attempts'] + 1
+            if error is None:
+                message_updates.append({'id': message_id, 'status': 'sent', 'attempts': attempts,
+                                        'sent_at': now, 'last_error': None})
+                if message['waitlist_id']:
+                    notified_waitlist_ids.append(message['waitlist_id'])
+                notifications.append({
+                    'title': f"WhatsApp Terkirim: {message['medicine_name']}",
+                    'message': f"Notifikasi restock berhasil dikirim ke {message['customer_name']} ({message['phone']})",
+                    'type': 'customer_notification',
+                    'is_read': False,
+                    'customer_id': message['customer_id'],
+                    'medicine_id': message['medicine_id'],
+                    'priority': 'normal',
+                    'created_at': now
+                })
+            elif attempts >= self.max_attempts:
+                message_updates.append({'id': message_id, 'status': 'failed', 'attempts': attempts,
+                                        'last_error': error})
+            else:
+                message_updates.append({'id': message_id, 'status': 'pending', 'attempts': attempts,
+                                        'next_attempt_at': now + self.backoff(attempts), 'last_error': error})
+
+        # Kelompokkan per set kolom agar executemany bisa dipakai
+        for keys in {tuple(sorted(row)) for row in message_updates}:
+            rows = [row for row in message_updates if tuple(sorted(row)) == keys]
+            db.session.execute(update(OutboundMessage), rows)
+
+        if notified_waitlist_ids:
+            db.session.execute(
+                update(CustomerWaitlist).where(
+                    CustomerWaitlist.id.in_(notified_waitlist_ids)
+                ).values(is_notified=True, notified_at=now)
+            )
+        if notifications:
+            db.session.execute(insert(Notification), notifications)
+
+        db.session.commit()
+
+    def dispatch_pending(self):
+        """Kirim semua pesan jatuh tempo batch demi batch; mengembalikan (sent, failed)"""
+        sent = failed = 0
+        with self._dispatch_lock:
+            with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='whatsapp-send') as pool:
+                while True:
+                    claimed = self._claim_batch()
+                    if not claimed:
+                        break
+
+                    errors = list(pool.map(
+                        lambda message: self._send(message['provider'], message['phone'], message['body']),
+                        claimed
+                    ))
+                    self._record_results(claimed, errors)
+
+                    sent += sum(1 for error in errors if error is None)
+                    failed += sum(1 for error in errors if error is not None)
+                    if len(claimed) < self.batch_size:
+                        break
+        return sent, failed
+
+# Instance global untuk digunakan di seluruh aplikasi
+whatsapp_dispatcher = WhatsAppDispatcher()
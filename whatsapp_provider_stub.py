@@ -0,0 +1,70 @@
+"""
+Provider WhatsApp tiruan (HTTP) untuk menguji dispatcher tanpa mengirim pesan sungguhan.
+
+Menerima POST JSON {"to": ..., "message": ...}, mencatatnya ke console dan
+membalas 200. --fail-rate mensimulasikan error 503 dari provider.
+
+Contoh:
+    python whatsapp_provider_stub.py --port 8085 --fail-rate 0.2
+    WHATSAPP_API_URL=http://127.0.0.1:8085/send
+"""
+import argparse
+import json
+import random
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class ProviderHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # Keep-alive agar connection pooling bisa diuji
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        payload = json.loads(self.rfile.read(length) or b'{}')
+
+        if random.random() < self.server.fail_rate:
+            self._reply(503, {'success': False, 'error': 'Provider sedang sibuk'})
+            return
+
+        with self.server.lock:
+            self.server.received.append(payload)
+        print(f"[stub] pesan ke {payload.get('to')} ({len(payload.get('message', ''))} karakter)")
+        self._reply(200, {'success': True, 'id': len(self.server.received)})
+
+    def _reply(self, status, body):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+class ProviderServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, fail_rate=0.0):
+        self.fail_rate = fail_rate
+        self.received = []
+        self.lock = threading.Lock()
+        super().__init__(address, ProviderHandler)
+
+def main():
+    parser = argparse.ArgumentParser(description='Provider WhatsApp tiruan untuk pengujian')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8085)
+    parser.add_argument('--fail-rate', type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = ProviderServer((args.host, args.port), args.fail_rate)
+    print(f"Provider tiruan mendengarkan di http://{args.host}:{args.port}/send")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("Provider tiruan dihentikan")
+    finally:
+        server.server_close()
+
+if __name__ == '__main__':
+    main()
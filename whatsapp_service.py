@@ -2,19 +2,39 @@
 """
 WhatsApp notification service untuk sistem reminder apotek
 """
+import os
+import threading
 import requests
-import json
 from datetime import datetime
-from models import Notification, CustomerWaitlist, Medicine, Customer
+from models import CustomerWaitlist, Customer
 from database import db
 
 class WhatsAppService:
     """Service untuk mengirim notifikasi WhatsApp"""
     
-    def __init__(self, api_url=None, api_token=None):
+    def __init__(self, api_url=None, api_token=None, pool_size=10, timeout=10):
         # Konfigurasi API WhatsApp (bisa menggunakan WhatsApp Business API, Twilio, atau layanan lainnya)
-        self.api_url = api_url or "https://api.whatsapp.com/send"  # Default fallback
-        self.api_token = api_token
+        # Tanpa WHATSAPP_API_URL pesan hanya dicetak ke console (mode demo)
+        self.api_url = api_url or os.environ.get("WHATSAPP_API_URL")
+        self.api_token = api_token or os.environ.get("WHATSAPP_API_TOKEN")
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self._session = None
+        self._session_lock = threading.Lock()
+    
+    def _get_session(self):
+        """HTTP session dengan connection pool yang dipakai ulang antar pesan"""
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    session = requests.Session()
+                    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+                    session.mount('http://', adapter)
+                    session.mount('https://', adapter)
+                    if self.api_token:
+                        session.headers['Authorization'] = f'Bearer {self.api_token}'
+                    self._session = session
+        return self._session
         
     def format_phone_number(self, phone):
         """Format nomor telepon untuk WhatsApp (format internasional)"""
@@ -33,46 +53,24 @@ class WhatsAppService:
         return phone
     
     def send_restock_notification(self, customer_id, medicine_id, waitlist_id):
-        """Kirim notifikasi restock ke pelanggan"""
+        """Jadwalkan notifikasi restock ke satu pelanggan lewat outbox (tanpa commit).
+        
+        Pesan dikirim oleh worker outbox setelah transaksi pemanggil di-commit.
+        """
+        from outbox import publish
         try:
             customer = Customer.query.get(customer_id)
-            medicine = Medicine.query.get(medicine_id)
             waitlist = CustomerWaitlist.query.get(waitlist_id)
             
-            if not customer or not medicine or not waitlist:
+            if not customer or not waitlist or waitlist.medicine_id != medicine_id:
                 return False, "Data tidak lengkap"
             
             # Format nomor WhatsApp
-            whatsapp_number = self.format_phone_number(customer.whatsapp)
-            if not whatsapp_number:
+            if not self.format_phone_number(customer.whatsapp):
                 return False, "Nomor WhatsApp tidak valid"
             
-            # Buat pesan
-            message = self._create_restock_message(customer, medicine, waitlist)
-            
-            # Kirim via WhatsApp (implementasi tergantung provider)
-            success = self._send_whatsapp_message(whatsapp_number, message)
-            
-            if success:
-                # Update status waitlist
-                waitlist.is_notified = True
-                waitlist.notified_at = datetime.utcnow()
-                
-                # Buat log notifikasi
-                notification = Notification(
-                    title=f"WhatsApp Terkirim: {medicine.name}",
-                    message=f"Notifikasi restock berhasil dikirim ke {customer.name} ({customer.whatsapp})",
-                    type='customer_notification',
-                    customer_id=customer_id,
-                    medicine_id=medicine_id,
-                    priority='normal'
-                )
-                db.session.add(notification)
-                db.session.commit()
-                
-                return True, "Notifikasi berhasil dikirim"
-            else:
-                return False, "Gagal mengirim WhatsApp"
+            publish('waitlist_notify', {'waitlist_id': waitlist_id})
+            return True, "Notifikasi masuk antrian pengiriman"
                 
         except Exception as e:
             return False, f"Error: {str(e)}"
@@ -101,63 +99,99 @@ Terima kasih! 🙏"""
         
         return message
     
-    def _send_whatsapp_message(self, phone_number, message):
-        """Kirim pesan WhatsApp (implementasi sesuai provider)"""
-        try:
-            # Untuk demo, kita log pesan ke console
-            # Dalam implementasi nyata, ganti dengan API WhatsApp yang digunakan
-            
+    def deliver(self, phone_number, message):
+        """Kirim satu pesan ke provider; raise exception jika gagal"""
+        if not self.api_url:
+            # Mode demo: log pesan ke console
             print(f"=== WHATSAPP NOTIFICATION ===")
             print(f"To: {phone_number}")
             print(f"Message: {message}")
             print(f"Timestamp: {datetime.now()}")
             print("============================")
-            
-            # Simulasi berhasil kirim
+            return
+        
+        response = self._get_session().post(
+            self.api_url,
+            json={'to': phone_number, 'message': message},
+            timeout=self.timeout
+        )
+        response.raise_for_status()
+    
+    def _send_whatsapp_message(self, phone_number, message):
+        """Kirim pesan WhatsApp (implementasi sesuai provider)"""
+        try:
+            self.deliver(phone_number, message)
             return True
-            
-            # Contoh implementasi dengan API provider:
-            # payload = {
-            #     'to': phone_number,
-            #     'message': message,
-            #     'token': self.api_token
-            # }
-            # response = requests.post(self.api_url, json=payload)
-            # return response.status_code == 200
-            
         except Exception as e:
             print(f"WhatsApp send error: {str(e)}")
             return False
     
+    def enqueue_restock_notifications(self, medicine_id, waitlist_ids=None):
+        """Masukkan pesan restock untuk waitlist obat ke antrian (tanpa commit).
+        
+        Satu query untuk waitlist beserta pelanggan dan obat; waitlist yang sudah
+        punya pesan di antrian tidak dimasukkan lagi. waitlist_ids membatasi ke
+        entri tertentu. Mengembalikan (queued, skipped).
+        """
+        from sqlalchemy.orm import joinedload
+        from models import OutboundMessage
+        
+        pending_message = db.session.query(OutboundMessage.id).filter(
+            OutboundMessage.waitlist_id == CustomerWaitlist.id,
+            OutboundMessage.status.in_(['pending', 'sending'])
+        ).exists()
+        
+        waitlist_query = CustomerWaitlist.query.options(
+            joinedload(CustomerWaitlist.customer),
+            joinedload(CustomerWaitlist.medicine)
+        ).filter(
+            CustomerWaitlist.medicine_id == medicine_id,
+            CustomerWaitlist.is_notified == False,
+            ~pending_message
+        )
+        if waitlist_ids is not None:
+            waitlist_query = waitlist_query.filter(CustomerWaitlist.id.in_(waitlist_ids))
+        waitlist_items = waitlist_query.all()
+        
+        messages = []
+        skipped = 0
+        for item in waitlist_items:
+            whatsapp_number = self.format_phone_number(item.customer.whatsapp)
+            if not whatsapp_number:
+                skipped += 1
+                continue
+            messages.append({
+                'provider': 'whatsapp',
+                'phone': whatsapp_number,
+                'body': self._create_restock_message(item.customer, item.medicine, item),
+                'customer_id': item.customer_id,
+                'medicine_id': item.medicine_id,
+                'waitlist_id': item.id,
+                'status': 'pending',
+                'attempts': 0,
+                'next_attempt_at': datetime.utcnow(),
+                'created_at': datetime.utcnow()
+            })
+        
+        if messages:
+            db.session.execute(OutboundMessage.__table__.insert(), messages)
+        
+        return len(messages), skipped
+    
     def send_bulk_notifications(self, medicine_id):
-        """Kirim notifikasi ke semua pelanggan di waitlist untuk obat tertentu"""
-        try:
-            waitlist_items = CustomerWaitlist.query.filter_by(
-                medicine_id=medicine_id,
-                is_notified=False
-            ).all()
-            
-            success_count = 0
-            failed_count = 0
-            
-            for item in waitlist_items:
-                success, message = self.send_restock_notification(
-                    item.customer_id, 
-                    item.medicine_id, 
-                    item.id
-                )
-                
-                if success:
-                    success_count += 1
-                else:
-                    failed_count += 1
-                    print(f"Failed to send to {item.customer.name}: {message}")
-            
-            return success_count, failed_count
-            
-        except Exception as e:
-            print(f"Bulk notification error: {str(e)}")
-            return 0, 0
+        """Jadwalkan notifikasi ke semua pelanggan di waitlist lewat outbox (tanpa commit).
+        
+        Mengembalikan jumlah pelanggan di waitlist yang belum diberitahu.
+        """
+        from outbox import publish
+        
+        waitlist_count = CustomerWaitlist.query.filter_by(
+            medicine_id=medicine_id,
+            is_notified=False
+        ).count()
+        if waitlist_count:
+            publish('medicine_restocked', {'medicine_id': medicine_id})
+        return waitlist_count
 
 # Instance global untuk digunakan di seluruh aplikasi
 whatsapp_service = WhatsAppService()